@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+离线性能基准
+
+功能：
+1. 启动本地模拟API服务器（mock_server.py），不访问 api.bilibili.com，也不等待真实的请求间隔
+2. 分别测量热门爬虫和分类排行榜爬虫的串行路径与并发路径（预取窗口 / 并发分类、向量化筛选）
+3. 每个场景在独立的子进程中运行，报告 页/秒、行/秒、请求延迟 p50 / p99 和峰值内存，
+   并给出相对串行路径的加速比
+4. --json 保存结果，--baseline 与之前保存的结果对比，吞吐下降超过容差时以非零状态退出
+
+用法：
+    python benchmark.py
+    python benchmark.py --latency 50 --risk-rate 0.05 --scenarios popular-serial popular-window
+    python benchmark.py --json data/bench.json
+    python benchmark.py --baseline data/bench.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不报告峰值内存
+    resource = None
+
+import mock_server
+from config import MAX_CONCURRENCY, POPULAR_PREFETCH_WINDOW, TARGET_COUNT_PER_CATEGORY
+
+# 场景名 -> (爬虫, 是否串行, 是否向量化筛选)；串行场景是同一爬虫加速比的基准
+SCENARIOS = {
+    'popular-serial': ('popular', True, False),
+    'popular-window': ('popular', False, False),
+    'popular-batch': ('popular', False, True),
+    'ranking-serial': ('ranking', True, False),
+    'ranking-concurrent': ('ranking', False, False),
+    'ranking-batch': ('ranking', False, True),
+}
+
+
+def percentile(values, q):
+    """最近秩百分位数，values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class TimedClient:
+    """记录每次 get_json 耗时（含限速等待和重试）的客户端包装，其余属性透传"""
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.failures = 0  # 状态码非200或API返回码非0的请求
+
+    def get_json(self, path, params=None):
+        start = time.perf_counter()
+        try:
+            status_code, data = self._client.get_json(path, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies.append(elapsed)
+        if status_code != 200 or data is None or data.get('code') != 0:
+            with self._lock:
+                self.failures += 1
+        return status_code, data
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _crawl_popular(client, serial, batch_filter, options):
+    from csv_sink import StreamingCSVWriter
+    from dedup_index import DedupIndex
+    from popular_crawler import BilibiliPopularCrawler, VIDEO_FIELDS
+
+    crawler = BilibiliPopularCrawler(client=client, batch_filter=batch_filter)
+    crawler.dedup = DedupIndex()
+    window = 1 if serial else options['concurrency']
+    target = options['pages'] * options['page_size']
+    with StreamingCSVWriter('popular.csv', VIDEO_FIELDS, encoding='utf-8') as sink:
+        return crawler.get_popular_videos(target, max_pages=options['pages'], window=window, sink=sink)
+
+
+def _crawl_ranking(client, serial, batch_filter, options):
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from bilibili_crawler import CATEGORIES, get_bilibili_ranking_data, save_category
+    from config import RANKING_DIR
+
+    os.makedirs(RANKING_DIR, exist_ok=True)
+    workers = 1 if serial else options['concurrency']
+    categories = CATEGORIES * options['rounds']
+    rows = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(get_bilibili_ranking_data, category['tid'], category['name'],
+                                   TARGET_COUNT_PER_CATEGORY, client, None, batch_filter): category
+                   for category in categories}
+        for future in as_completed(futures):
+            data_rows = future.result()
+            if save_category(futures[future]['name'], data_rows):
+                rows += len(data_rows)
+    return rows
+
+
+def run_scenario(name, base_url, options, conn):
+    """
+    在子进程中运行一个场景，结果通过 conn 发回
+
+    工作目录切换到临时目录，爬虫写出的文件不会影响 data/。
+    """
+    import metrics
+    from bili_client import BilibiliClient
+    from rate_limiter import AdaptiveRateController
+
+    metrics.setup_logging('ERROR')
+    crawler, serial, batch_filter = SCENARIOS[name]
+    rate = options['rate']
+    limiter = AdaptiveRateController(rate, max(1, options['concurrency']), max_rate=rate,
+                                     backoff_base=options['backoff'], backoff_max=options['backoff'] * 8)
+    client = TimedClient(BilibiliClient(limiter, pool_size=options['concurrency'],
+                                        base_url=base_url, homepage_url=f"{base_url}/"))
+    client.warm_up()
+
+    with tempfile.TemporaryDirectory(prefix='bili-bench-') as workdir:
+        os.chdir(workdir)
+        start = time.perf_counter()
+        if crawler == 'popular':
+            rows = _crawl_popular(client, serial, batch_filter, options)
+        else:
+            rows = _crawl_ranking(client, serial, batch_filter, options)
+        elapsed = time.perf_counter() - start
+
+    pages = len(client.latencies)
+    conn.send({
+        'scenario': name,
+        'crawler': crawler,
+        'serial': serial,
+        'elapsed': round(elapsed, 3),
+        'pages': pages,
+        'failed_pages': client.failures,
+        'rows': rows,
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed else 0.0,
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(client.latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(client.latencies, 99) * 1000, 1),
+        'peak_rss_mb': _peak_rss_mb(),
+    })
+    conn.close()
+
+
+def benchmark(server, name, options):
+    """在子进程中运行场景，返回结果字典（附带模拟服务器注入的错误数）"""
+    server.reset()
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_scenario, args=(name, server.url, options, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        raise RuntimeError(f"场景 {name} 运行失败（退出码 {process.exitcode}）")
+    result['injected_errors'] = server.errors
+    result['injected_risks'] = server.risks
+    return result
+
+
+def add_speedups(results):
+    """相对同一爬虫串行场景的吞吐加速比"""
+    baselines = {r['crawler']: r['pages_per_sec'] for r in results if r['serial']}
+    for result in results:
+        base = baselines.get(result['crawler'])
+        result['speedup'] = round(result['pages_per_sec'] / base, 2) if base else None
+
+
+def print_table(results):
+    # 表头用 ASCII，避免中文宽度导致列错位
+    header = (f"{'scenario':<20}{'pages':>7}{'rows':>8}{'time(s)':>9}{'pages/s':>9}{'rows/s':>10}"
+              f"{'p50(ms)':>9}{'p99(ms)':>9}{'RSS(MB)':>9}{'speedup':>9}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        rss = '-' if r['peak_rss_mb'] is None else f"{r['peak_rss_mb']:.1f}"
+        speedup = '-' if r['speedup'] is None else f"{r['speedup']:.2f}x"
+        print(f"{r['scenario']:<20}{r['pages']:>7}{r['rows']:>8}{r['elapsed']:>9.2f}{r['pages_per_sec']:>9.1f}"
+              f"{r['rows_per_sec']:>10.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{rss:>9}{speedup:>9}")
+        if r['failed_pages'] or r['injected_errors'] or r['injected_risks']:
+            print(f"{'':<20}  失败页 {r['failed_pages']}，注入 HTTP 500 {r['injected_errors']} 次，"
+                  f"-352 {r['injected_risks']} 次")
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    与之前保存的结果对比页/秒
+
+    Returns:
+        list: 吞吐下降超过容差的场景名
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['scenario']: r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\n📏 与基准 {baseline_path} 对比（容差 {tolerance:.0%}）:")
+    for r in results:
+        old = baseline.get(r['scenario'])
+        if old is None or not old['pages_per_sec']:
+            print(f"  {r['scenario']:<20} 基准中没有该场景")
+            continue
+        change = r['pages_per_sec'] / old['pages_per_sec'] - 1
+        mark = '✅'
+        if change < -tolerance:
+            mark = '❌'
+            regressions.append(r['scenario'])
+        print(f"  {mark} {r['scenario']:<20} {old['pages_per_sec']:.1f} → {r['pages_per_sec']:.1f} 页/秒"
+              f"（{change:+.1%}）")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站爬虫离线性能基准（本地模拟API服务器）")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="要运行的场景（默认全部）")
+    parser.add_argument("-c", "--concurrency", type=int, default=max(MAX_CONCURRENCY, POPULAR_PREFETCH_WINDOW),
+                        help="并发场景的预取窗口 / 并发分类数")
+    parser.add_argument("--rounds", type=int, default=3, help="分类排行榜场景重复爬取全部分类的轮数（默认 3）")
+    parser.add_argument("--rate", type=float, default=1000,
+                        help="客户端限速（次/秒，默认 1000，即基本不限速）")
+    parser.add_argument("--backoff", type=float, default=0.05,
+                        help="被限流后的退避基数（秒，默认 0.05；真实爬取为 config.BACKOFF_BASE）")
+    parser.add_argument("--json", default=None, metavar="PATH", help="把结果保存为 JSON")
+    parser.add_argument("--baseline", default=None, metavar="PATH", help="与之前 --json 保存的结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="页/秒允许下降的比例（默认 0.1）")
+    mock_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    options = {
+        'concurrency': args.concurrency,
+        'rounds': args.rounds,
+        'rate': args.rate,
+        'backoff': args.backoff,
+        'pages': args.pages,
+        'page_size': args.page_size,
+    }
+    with mock_server.server_from_args(args) as server:
+        print(f"🧪 模拟API服务器: {server.url}（延迟 {args.latency:g}+{args.jitter:g} ms，"
+              f"错误率 {args.error_rate:g}，风控率 {args.risk_rate:g}）")
+        results = []
+        for name in args.scenarios:
+            print(f"⏱️  运行场景 {name}...")
+            results.append(benchmark(server, name, options))
+    add_speedups(results)
+
+    print()
+    print_table(results)
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': int(time.time()), 'settings': vars(args), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到 {args.json}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"❌ 吞吐下降超过 {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+B站API客户端
+
+功能：
+1. 全局共享一个 requests.Session，通过连接池复用 keep-alive 连接
+2. 首页 cookie 预热只做一次，且不下载首页正文
+3. API 返回 -352 等风控码时才刷新 cookie 并重试
+4. 可选接入 HostRateLimiter 按主机限速；使用 AdaptiveRateController 时，
+   -352 / 412 / 429 会触发降速和退避，并重试同一请求而不是直接放弃
+5. 可选接入 ResponseCache：有效期内直接返回缓存，离线模式只读缓存
+6. 响应正文由 fast_json 解码：安装了 msgspec / orjson 时使用快速后端，否则使用标准库
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import fast_json
+from config import *
+from rate_limiter import AdaptiveRateController, HostRateLimiter
+from identity_pool import Identity, IdentityScheduler
+from metrics import (API_CODES, CACHE_HITS, REQUEST_SECONDS, REQUESTS, RESPONSE_BYTES, SLEEP_SECONDS,
+                     THROTTLES, span)
+from response_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+# 离线模式下缓存未命中时返回的状态码（对应 HTTP only-if-cached 未命中）
+OFFLINE_MISS_STATUS = 504
+
+
+class BilibiliClient:
+    """线程安全的B站API客户端，分类爬虫和热门爬虫共用"""
+
+    def __init__(self, rate_limiter=None, pool_size=MAX_CONCURRENCY, cache=None, offline=False,
+                 proxy=None, headers=None, max_retries=MAX_THROTTLE_RETRIES, base_url=BASE_URL,
+                 homepage_url=HOMEPAGE_URL):
+        """
+        Args:
+            rate_limiter: 可选的 HostRateLimiter，每次请求前取令牌；
+                          为 AdaptiveRateController 时按响应自动调整速率
+            pool_size: 每个主机保留的 keep-alive 连接数
+            cache: 可选的 ResponseCache，保存成功的原始响应
+            offline: 只从缓存读取，不发网络请求（需要同时传入 cache）
+            proxy: 可选的出口代理地址，如 'http://127.0.0.1:8001'
+            headers: 覆盖默认 HEADERS 的请求头（如不同的 User-Agent）
+            max_retries: 被限流后同一请求的最大重试次数
+            base_url / homepage_url: API 和 cookie 预热地址，可指向本地模拟服务器（mock_server.py）
+        """
+        if offline and cache is None:
+            raise ValueError("离线模式需要提供响应缓存")
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.offline = offline
+        self.max_retries = max_retries
+        self.base_url = base_url
+        self.homepage_url = homepage_url
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+        if proxy:
+            self.session.proxies = {'http': proxy, 'https': proxy}
+
+        # 连接池：只对连接失败做少量重试，HTTP状态码交给调用方处理
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=max(1, pool_size),
+            max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5),
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._cookie_lock = threading.Lock()
+        self._cookie_generation = 0  # 每刷新一次cookie加1
+        self._warmed_up = False
+
+    @property
+    def adaptive(self):
+        """是否由自适应限速器控制请求节奏"""
+        return isinstance(self.rate_limiter, AdaptiveRateController)
+
+    def rate_metrics(self):
+        """自适应限速器的当前速率和退避统计，未启用时为空字典"""
+        return self.rate_limiter.metrics() if self.adaptive else {}
+
+    def print_rate_summary(self):
+        """打印每个主机的自适应限速统计"""
+        for host, m in self.rate_metrics().items():
+            reasons = '，'.join(f"{reason} ×{n}" for reason, n in m['reasons'].items()) or '无'
+            logger.info(f"⏱️  {host}: 当前速率 {m['rate']:.2f} 次/秒，正常响应 {m['successes']} 次，"
+                        f"退避 {m['backoffs']} 次（{reasons}）")
+
+    def _url(self, path):
+        return path if path.startswith('http') else f"{self.base_url}{path}"
+
+    def wait_time(self, path):
+        """请求 path 前还需等待的秒数（退避或令牌），不消耗令牌"""
+        if self.rate_limiter is None:
+            return 0.0
+        return self.rate_limiter.wait_time(self._url(path))
+
+    def _send(self, url, params=None, **kwargs):
+        if self.rate_limiter:
+            waited = self.rate_limiter.acquire(url)
+            if waited:
+                SLEEP_SECONDS.inc(waited, reason='rate_limit')
+        start = time.perf_counter()
+        response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT, **kwargs)
+        REQUEST_SECONDS.observe(time.perf_counter() - start)
+        REQUESTS.inc(status=response.status_code)
+        return response
+
+    def _fetch_cookies(self):
+        """访问首页获取 cookie，调用方需持有 _cookie_lock"""
+        try:
+            # cookie 在响应头里，用 stream 模式只读头部，不下载首页正文
+            response = self._send(self.homepage_url, stream=True)
+            response.close()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"⚠️  cookie预热失败: {e}")
+        self._warmed_up = True
+        self._cookie_generation += 1
+
+    def warm_up(self):
+        """访问首页获取 buvid 等 cookie，整个进程只做一次"""
+        with self._cookie_lock:
+            if not self._warmed_up:
+                self._fetch_cookies()
+
+    def refresh_cookies(self, seen_generation):
+        """
+        清空并重新获取 cookie；多个线程同时触发风控时只刷新一次
+
+        Args:
+            seen_generation: 调用方发请求时看到的 cookie 代数
+        """
+        with self._cookie_lock:
+            if self._cookie_generation != seen_generation:
+                return  # 其他线程已经刷新过
+            logger.warning("🍪 触发风控，刷新cookie后重试")
+            self.session.cookies.clear()
+            self._fetch_cookies()
+
+    def get_json(self, path, params=None):
+        """
+        请求API并解析JSON；配置了缓存时先查缓存
+
+        Args:
+            path: API路径（如 RANKING_API）或完整URL
+            params: 查询参数
+
+        Returns:
+            tuple: (HTTP状态码, JSON数据)，状态码非200时数据为None；
+                   离线模式缓存未命中时状态码为 OFFLINE_MISS_STATUS
+
+        Raises:
+            requests.exceptions.RequestException: 网络错误
+            ValueError: JSON解析失败
+        """
+        url = self._url(path)
+
+        cached = None
+        if self.cache is not None:
+            key = cache_key(url, params)
+            cached = self.cache.get(key)
+            if cached is not None and (self.offline or cached.is_fresh(self.cache.ttl)):
+                CACHE_HITS.inc()
+                with span('decode'):
+                    return 200, fast_json.decode(cached.body, path)
+            if self.offline:
+                return OFFLINE_MISS_STATUS, None
+
+        self.warm_up()
+        data = None
+        for attempt in range(self.max_retries + 1):
+            generation = self._cookie_generation
+            # 缓存过期时带上条件请求头，内容未变化的话服务器只返回 304
+            headers = cached.conditional_headers() if cached is not None else None
+            response = self._send(url, params=params, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                self.cache.touch(key)
+                if self.adaptive:
+                    self.rate_limiter.on_success(url)
+                return 200, fast_json.decode(cached.body, path)
+
+            data = None
+            if response.status_code in THROTTLE_STATUS_CODES:
+                reason = f"HTTP {response.status_code}"
+            elif response.status_code != 200:
+                return response.status_code, None
+            else:
+                RESPONSE_BYTES.inc(len(response.content))
+                with span('decode'):
+                    data = fast_json.decode(response.content, path)
+                code = data.get('code')
+                API_CODES.inc(code=code)
+                reason = f"code {code}" if code in THROTTLE_API_CODES else None
+
+            if reason is None:
+                if self.adaptive:
+                    self.rate_limiter.on_success(url)
+                if self.cache is not None and data.get('code') == 0:
+                    self.cache.put(key, response.content, response.headers.get('ETag'),
+                                   response.headers.get('Last-Modified'))
+                return response.status_code, data
+
+            # 被限流：风控码先刷新一次 cookie；自适应模式下降速、退避后重试
+            THROTTLES.inc(reason=reason)
+            retry = False
+            if data is not None and data.get('code') in COOKIE_REFRESH_CODES and attempt == 0:
+                self.refresh_cookies(generation)
+                retry = True
+            if self.adaptive:
+                self.rate_limiter.on_throttle(url, reason)
+                retry = retry or attempt < self.max_retries
+            if not retry:
+                break
+        return response.status_code, data
+
+
+def create_rate_limiter(adaptive=ADAPTIVE_RATE, bucket_factory=None):
+    """按配置创建限速器：自适应（AIMD）或固定速率令牌桶；bucket_factory 见 HostRateLimiter"""
+    if adaptive:
+        return AdaptiveRateController(REQUESTS_PER_SECOND, RATE_BURST, bucket_factory=bucket_factory)
+    return HostRateLimiter(REQUESTS_PER_SECOND, RATE_BURST, bucket_factory)
+
+
+def _identity_bucket_factory(bucket_factory, name):
+    """每个身份的令牌桶名加上身份名，共享令牌桶时各身份不会占用同一份速率"""
+    def factory(host, rate, burst):
+        return bucket_factory(f"{name}|{host}", rate, burst)
+    return factory
+
+
+def create_client(cache=None, offline=False, identities=IDENTITIES, pool_size=MAX_CONCURRENCY, bucket_factory=None):
+    """
+    按配置创建客户端：没有配置身份时为单个 BilibiliClient，
+    否则为在多个身份之间分配请求的 IdentityScheduler
+
+    Args:
+        cache: ResponseCache，None 表示不缓存
+        offline: 只读缓存，不访问网络
+        identities: 身份配置列表，见 config.IDENTITIES
+        pool_size: 每个主机保留的 keep-alive 连接数，应不小于同时在途的请求数
+        bucket_factory: 可选的令牌桶工厂，见 HostRateLimiter；多个身份时桶名加上身份名，各身份仍分别限速
+    """
+    if not identities:
+        return BilibiliClient(create_rate_limiter(bucket_factory=bucket_factory), pool_size, cache=cache,
+                              offline=offline)
+    pool = []
+    for index, profile in enumerate(identities):
+        name = profile.get('name') or profile.get('proxy') or f"identity-{index}"
+        factory = _identity_bucket_factory(bucket_factory, name) if bucket_factory is not None else None
+        # 每个身份只发一次，被限流时由调度器换身份重试，而不是在原身份上等待退避
+        client = BilibiliClient(create_rate_limiter(bucket_factory=factory), pool_size, cache=cache, offline=offline,
+                                proxy=profile.get('proxy'), headers=profile.get('headers'),
+                                max_retries=0)
+        pool.append(Identity(name, client))
+    return IdentityScheduler(pool)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """获取进程内共享的默认客户端"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = create_client()
+        return _default_client
+
+
+def configure_default_client(cache=None, offline=False, pool_size=MAX_CONCURRENCY, bucket_factory=None):
+    """
+    按命令行参数重新创建默认客户端，需在爬虫创建之前调用
+
+    Args:
+        cache: ResponseCache，None 表示不缓存
+        offline: 只读缓存，不访问网络
+        pool_size: 每个主机保留的 keep-alive 连接数
+        bucket_factory: 可选的令牌桶工厂，见 HostRateLimiter
+    """
+    global _default_client
+    with _default_client_lock:
+        _default_client = create_client(cache, offline, pool_size=pool_size, bucket_factory=bucket_factory)
+        return _default_client
@@ -6,263 +6,665 @@ B站高质量视频爬虫
 2. 计算视频点赞率（点赞数/播放数）
 3. 筛选点赞率>0.1的高质量视频
 4. 保存到CSV文件，支持19个分类
+5. 多个分类并发爬取，按主机令牌桶限速，共享同一个连接池
+6. 可选的详情补充（--enrich）：为高质量视频加上分区、分P数和标签，并刷新统计
+7. 可选的深度翻页（--deep）：按分区翻近期热门和最新投稿列表，每个分类不再限于排行榜的100个，
+   各分类并发翻页、共享限速，达到目标数量即停止
 """
 
-import pandas as pd
 import requests
-import time
-import random
 import os
 import glob
+import time
+import argparse
+import logging
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config import *  # 导入配置文件
+from bili_client import OFFLINE_MISS_STATUS, configure_default_client, get_default_client
+from csv_sink import StreamingCSVWriter
+from checkpoint import CrawlCheckpoint
+from dedup_index import DedupIndex
+from enrichment import EnrichmentCache, VideoEnricher
+from incremental import IncrementalState
+from response_cache import ResponseCache
+from storage import OUTPUT_FORMATS, RANKING_FIELD_MAP, ParquetWriter, SQLiteStatsStore
+from video_record import VideoRecord
+import metrics
+from metrics import ROWS, SLEEP_SECONDS, span
+from quality import passes_quality
+
+logger = logging.getLogger(__name__)
 
-def get_bilibili_ranking_data(tid, category_name, target_count=TARGET_COUNT_PER_CATEGORY):
+# 分类排行榜CSV的列顺序
+RANKING_COLUMNS = ['视频标题', '视频地址', '作者', '播放数', '弹幕数',
+                   '投币数', '点赞数', '分享数', '收藏数', '点赞率']
+RANKING_ENRICH_COLUMNS = ['分区', '分P数', '标签']  # 补充详情（--enrich）时追加的列
+RANKING_FIELDS = [RANKING_FIELD_MAP[column] for column in RANKING_COLUMNS]  # 每列对应的 VideoRecord 字段
+
+# 分类配置 - 根据提供的完整信息扩充
+CATEGORIES = [{
+    "name": "全站",
+    "tid": 0,
+    "slug": "all"
+}, {
+    "name": "国产动画",
+    "type": "bangumi",
+    "tid": 168,
+    "slug": "guochan",
+    "season_type": 4
+}, {
+    "name": "国创相关",
+    "tid": 168,
+    "slug": "guochuang"
+}, {
+    "name": "纪录片",
+    "type": "cinema",
+    "slug": "documentary",
+    "tid": 177,
+    "season_type": 3
+}, {
+    "name": "动画",
+    "tid": 1,
+    "slug": "douga"
+}, {
+    "name": "音乐",
+    "tid": 3,
+    "slug": "music"
+}, {
+    "name": "舞蹈",
+    "tid": 129,
+    "slug": "dance"
+}, {
+    "name": "游戏",
+    "tid": 4,
+    "slug": "game"
+}, {
+    "name": "知识",
+    "tid": 36,
+    "slug": "knowledge"
+}, {
+    "name": "科技",
+    "tid": 188,
+    "slug": "tech"
+}, {
+    "name": "运动",
+    "tid": 234,
+    "slug": "sports"
+}, {
+    "name": "汽车",
+    "tid": 223,
+    "slug": "car"
+}, {
+    "name": "生活",
+    "tid": 160,
+    "slug": "life"
+}, {
+    "name": "美食",
+    "tid": 211,
+    "slug": "food"
+}, {
+    "name": "动物圈",
+    "tid": 217,
+    "slug": "animal"
+}, {
+    "name": "鬼畜",
+    "tid": 119,
+    "slug": "kichiku"
+}, {
+    "name": "时尚",
+    "tid": 155,
+    "slug": "fashion"
+}, {
+    "name": "娱乐",
+    "tid": 5,
+    "slug": "ent"
+}, {
+    "name": "影视",
+    "tid": 181,
+    "slug": "cinephile"
+}]
+
+def parse_ranking_videos(video_list, category_name, target_count, dedup=None):
     """
-    获取B站排行榜数据，只保留点赞率>LIKE_RATE_THRESHOLD的高质量视频
+    逐条解析排行榜视频，计算点赞率并过滤高质量视频
+
+    Returns:
+        list: VideoRecord 列表
     """
-    url = f'{BASE_URL}?rid={tid}&type=all'
+    data_rows = []
+    high_quality_count = 0
     
-    # 更完整的headers，模拟真实浏览器
-    headers = HEADERS.copy()  # 使用配置文件中的headers
+    for video in video_list:
+        bvid = video.get('bvid', '')
+        if dedup is not None and dedup.contains(bvid):
+            ROWS.inc(result='duplicate')
+            continue
+        
+        stat = video.get('stat', {})
+        view_count = stat.get('view', 0)
+        like_count = stat.get('like', 0)
+        coin_count = stat.get('coin', 0)
+        favorite_count = stat.get('favorite', 0)
+        
+        # 只保留点赞率>LIKE_RATE_THRESHOLD的高质量视频（播放数为0时跳过），规则与向量化筛选相同
+        if passes_quality(view_count, like_count, coin_count, favorite_count, LIKE_RATE_THRESHOLD,
+                          MIN_QUALITY_SCORE, strict=True, weights=QUALITY_WEIGHTS):
+            # 并发的分类之间可能同时遇到同一视频，以先收录的那一次为准
+            if dedup is not None and not dedup.add(bvid):
+                ROWS.inc(result='duplicate')
+                continue
+            like_rate = like_count / view_count
+            row = VideoRecord(
+                bvid=bvid,
+                title=video.get('title', ''),
+                author=video.get('owner', {}).get('name', ''),
+                view=view_count,
+                like=like_count,
+                coin=coin_count,
+                favorite=favorite_count,
+                share=stat.get('share', 0),
+                reply=stat.get('reply', 0),
+                danmaku=stat.get('danmaku', 0),
+                like_rate=round(like_rate, 4),  # 保留4位小数
+                duration=video.get('duration', 0),
+                pubdate=video.get('pubdate', 0),
+                pic=video.get('pic', ''),
+                desc=video.get('desc', '').strip()[:200],
+            )
+            data_rows.append(row)
+            high_quality_count += 1
+            ROWS.inc(result='accepted')
+            
+            # 达到目标数量就停止
+            if high_quality_count >= target_count:
+                break
+        else:
+            ROWS.inc(result='rejected')
+    return data_rows
+
+def is_high_quality(record):
+    """按记录当前的统计重新判断，规则与 parse_ranking_videos 相同（详情补充更新统计之后使用）"""
+    return passes_quality(record.view, record.like, record.coin, record.favorite, LIKE_RATE_THRESHOLD,
+                          MIN_QUALITY_SCORE, strict=True, weights=QUALITY_WEIGHTS)
+
+def parse_ranking_videos_batch(video_list, category_name, target_count, dedup=None):
+    """
+    向量化解析排行榜视频：一次算出点赞率和筛选掩码，结果与 parse_ranking_videos 相同
+
+    Returns:
+        list: VideoRecord 列表
+    """
+    # numpy / pandas 只在向量化筛选时才需要，延迟导入
+    from quality import filter_videos
+
+    total = len(video_list)
+    if dedup is not None:
+        video_list = [video for video in video_list if not dedup.contains(video.get('bvid', ''))]
+    df = filter_videos(video_list, LIKE_RATE_THRESHOLD, MIN_QUALITY_SCORE, strict=True, weights=QUALITY_WEIGHTS)
+    ROWS.inc(total - len(video_list), result='duplicate')
+    ROWS.inc(len(video_list) - len(df), result='rejected')
     
-    print(f"正在爬取: {category_name}")
+    data_rows = []
+    columns = [df[field].tolist() for field in ['view', 'like', 'coin', 'favorite', 'share', 'reply', 'danmaku',
+                                                'like_rate', 'duration', 'pubdate']]
+    for pos, view, like, coin, favorite, share, reply, danmaku, like_rate, duration, pubdate in zip(
+            df.index.tolist(), *columns):
+        video = video_list[pos]
+        bvid = video.get('bvid', '')
+        if dedup is not None and not dedup.add(bvid):
+            ROWS.inc(result='duplicate')
+            continue
+        data_rows.append(VideoRecord(
+            bvid=bvid,
+            title=video.get('title', ''),
+            author=video.get('owner', {}).get('name', ''),
+            view=view,
+            like=like,
+            coin=coin,
+            favorite=favorite,
+            share=share,
+            reply=reply,
+            danmaku=danmaku,
+            like_rate=round(like_rate, 4),
+            duration=duration,
+            pubdate=pubdate,
+            pic=video.get('pic', ''),
+            desc=video.get('desc', '').strip()[:200],
+        ))
+        ROWS.inc(result='accepted')
+        if len(data_rows) >= target_count:
+            break
+    return data_rows
+
+def get_bilibili_ranking_data(tid, category_name, target_count=TARGET_COUNT_PER_CATEGORY, client=None,
+                              dedup=None, batch_filter=BATCH_FILTER, enricher=None):
+    """
+    获取B站排行榜数据，只保留点赞率>LIKE_RATE_THRESHOLD的高质量视频
+
+    client: 共享的 BilibiliClient，默认使用进程内的全局客户端
+    dedup: 可选的 DedupIndex，已见过的 bvid 直接丢弃
+    batch_filter: 是否整页向量化筛选
+    enricher: 可选的 VideoEnricher，为筛选出的视频补充详情
+    """
+    if client is None:
+        client = get_default_client()
+    
+    logger.info(f"正在爬取: {category_name}")
     
     try:
-        # 添加session来保持连接
-        session = requests.Session()
-        session.headers.update(headers)
-        
-        # 首先访问首页建立session
-        session.get('https://www.bilibili.com/', timeout=REQUEST_TIMEOUT)
-        time.sleep(1)
-        
-        # 然后请求API
-        response = session.get(url, timeout=REQUEST_TIMEOUT)
-        print(f"状态码: {response.status_code}")
+        # 复用共享session，cookie只在首次请求时预热
+        with span('fetch', category=category_name):
+            status_code, json_data = client.get_json(RANKING_API, params={'rid': tid, 'type': 'all'})
+        logger.info(f"{category_name} 状态码: {status_code}", extra={'category': category_name, 'status': status_code})
         
-        if response.status_code != 200:
-            print(f"HTTP错误: {response.status_code}")
+        if status_code != 200:
+            if client.offline and status_code == OFFLINE_MISS_STATUS:
+                logger.warning(f"{category_name} 离线模式下缓存中没有该分类的数据")
+            else:
+                logger.warning(f"{category_name} HTTP错误: {status_code}")
             return None
             
-        json_data = response.json()
-        
         # 检查API返回状态
         if json_data.get('code') != 0:
-            print(f"API返回错误: code={json_data.get('code')}, message={json_data.get('message')}")
+            logger.warning(f"{category_name} API返回错误: code={json_data.get('code')}, message={json_data.get('message')}")
             if json_data.get('code') == -352:
-                print("触发反爬虫机制，建议增加延时或更换IP")
+                if client.adaptive:
+                    logger.warning("多次退避重试后仍被风控，建议稍后使用 --resume 重试该分类")
+                else:
+                    logger.warning("触发反爬虫机制，建议增加延时或更换IP")
             return None
             
         # 检查数据结构
         if 'data' not in json_data or 'list' not in json_data['data']:
-            print(f"数据结构异常: {json_data}")
+            logger.warning(f"数据结构异常: {json_data}")
             return None
             
         video_list = json_data['data']['list']
-        print(f"获取到 {len(video_list)} 条数据")
+        logger.info(f"{category_name} 获取到 {len(video_list)} 条数据")
         
         # 解析数据，计算点赞率并过滤高质量视频
-        data_rows = []
-        high_quality_count = 0
-        
-        for video in video_list:
-            view_count = video.get('stat', {}).get('view', 0)
-            like_count = video.get('stat', {}).get('like', 0)
-            
-            # 避免除零错误，播放数为0时跳过
-            if view_count == 0:
-                continue
-                
-            # 计算点赞率
-            like_rate = like_count / view_count
-            
-            # 只保留点赞率>LIKE_RATE_THRESHOLD的高质量视频
-            if like_rate > LIKE_RATE_THRESHOLD:
-                row = {
-                    '视频标题': video.get('title', ''),
-                    '视频地址': f"https://www.bilibili.com/video/{video.get('bvid', '')}",
-                    '作者': video.get('owner', {}).get('name', ''),
-                    '播放数': view_count,
-                    '弹幕数': video.get('stat', {}).get('danmaku', 0),
-                    '投币数': video.get('stat', {}).get('coin', 0),
-                    '点赞数': like_count,
-                    '分享数': video.get('stat', {}).get('share', 0),
-                    '收藏数': video.get('stat', {}).get('favorite', 0),
-                    '点赞率': round(like_rate, 4)  # 保留4位小数
-                }
-                data_rows.append(row)
-                high_quality_count += 1
-                
-                # 达到目标数量就停止
-                if high_quality_count >= target_count:
-                    break
+        with span('filter', category=category_name, videos=len(video_list)):
+            if batch_filter:
+                data_rows = parse_ranking_videos_batch(video_list, category_name, target_count, dedup)
+            else:
+                data_rows = parse_ranking_videos(video_list, category_name, target_count, dedup)
         
-        print(f"筛选出 {len(data_rows)} 条高质量数据（点赞率>{LIKE_RATE_THRESHOLD}）")
+        if enricher is not None:
+            # 详情中的最新统计可能不再满足筛选条件，这些视频不写入
+            data_rows = enricher.enrich(data_rows, keep=is_high_quality)
+        logger.info(f"{category_name} 筛选出 {len(data_rows)} 条高质量数据（点赞率>{LIKE_RATE_THRESHOLD}）",
+                    extra={'category': category_name, 'rows': len(data_rows)})
         return data_rows
         
     except requests.exceptions.Timeout:
-        print(f"请求超时")
+        logger.warning(f"{category_name} 请求超时")
         return None
     except requests.exceptions.RequestException as e:
-        print(f"网络请求失败: {e}")
+        logger.warning(f"{category_name} 网络请求失败: {e}")
         return None
     except ValueError as e:
-        print(f"JSON解析失败: {e}")
+        logger.warning(f"{category_name} JSON解析失败: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"{category_name} 未知错误: {e}")
+        return None
+
+def fetch_region_page(client, api, tid, page, category_name):
+    """
+    请求分区列表的一页
+
+    Returns:
+        list: 该页的视频（翻到末尾时为空列表）；请求失败时返回 None
+    """
+    try:
+        with span('fetch', category=category_name, page=page):
+            status_code, json_data = client.get_json(api, params={'rid': tid, 'pn': page, 'ps': DEEP_PAGE_SIZE})
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"{category_name} 第{page}页网络请求失败: {e}")
+        return None
+    except ValueError as e:
+        logger.warning(f"{category_name} 第{page}页JSON解析失败: {e}")
+        return None
+    if status_code != 200:
+        if client.offline and status_code == OFFLINE_MISS_STATUS:
+            logger.warning(f"{category_name} 离线模式下缓存中没有第{page}页")
+        else:
+            logger.warning(f"{category_name} 第{page}页HTTP错误: {status_code}")
         return None
+    if json_data.get('code') != 0:
+        logger.warning(f"{category_name} 第{page}页API返回错误: code={json_data.get('code')}, "
+                       f"message={json_data.get('message')}")
+        return None
+    return (json_data.get('data') or {}).get('archives') or []
+
+def fetch_region_page_with_retry(client, api, tid, page, category_name, stop_event=None):
+    """
+    请求分区列表的一页，失败时最多重试 DEEP_PAGE_RETRIES 次，等待时间逐次加倍
+
+    Returns:
+        list: 同 fetch_region_page；所有尝试都失败或收到停止信号时返回 None
+    """
+    for attempt in range(DEEP_PAGE_RETRIES + 1):
+        if attempt:
+            wait = DEEP_RETRY_DELAY * 2 ** (attempt - 1)
+            logger.info(f"🔁 {category_name} 第{page}页 {wait:g} 秒后第{attempt}次重试")
+            SLEEP_SECONDS.inc(wait, reason='retry')
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return None
+            else:
+                time.sleep(wait)
+        video_list = fetch_region_page(client, api, tid, page, category_name)
+        if video_list is not None:
+            return video_list
+    return None
+
+def get_region_videos(tid, category_name, target_count=DEEP_TARGET_PER_CATEGORY, client=None, dedup=None,
+                      batch_filter=BATCH_FILTER, enricher=None, max_pages=DEEP_MAX_PAGES, stop_event=None):
+    """
+    深度翻页：按分区 tid 依次翻近期热门投稿和最新投稿列表，不受排行榜每个分类 100 个的限制
+
+    两个列表会有重复的视频，分类内用内存去重索引丢弃（传入 dedup 时用它跨分类去重）。
+    高质量视频达到 target_count、列表翻到末尾、翻满 max_pages 页或连续 MAX_EMPTY_PAGES 页
+    没有新的高质量视频时停止翻页；请求失败的页面先重试（见 fetch_region_page_with_retry），
+    重试后仍失败才停止翻该列表。出错时只影响本分类，已筛选的视频照常返回。
+
+    Args:
+        tid: 分区 tid
+        target_count: 目标高质量视频数
+        client / dedup / batch_filter / enricher: 同 get_bilibili_ranking_data
+        max_pages: 每个列表最多翻的页数
+        stop_event: 可选的 threading.Event；设置后翻完当前页即停止，已筛选的视频照常返回
+
+    Returns:
+        list: VideoRecord 列表；没有一页请求成功时返回 None
+    """
+    if client is None:
+        client = get_default_client()
+    seen = dedup if dedup is not None else DedupIndex()
+    parse = parse_ranking_videos_batch if batch_filter else parse_ranking_videos
+
+    logger.info(f"正在深度翻页: {category_name}（目标 {target_count} 个）")
+    data_rows = []
+    fetched_pages = 0
+    try:
+        for api, feed_name in ((REGION_HOT_API, '近期热门'), (REGION_NEW_API, '最新投稿')):
+            empty_pages = 0
+            for page in range(1, max_pages + 1):
+                if len(data_rows) >= target_count or (stop_event is not None and stop_event.is_set()):
+                    break
+                video_list = fetch_region_page_with_retry(client, api, tid, page, category_name, stop_event)
+                if video_list is None:
+                    logger.warning(f"{category_name} {feed_name}第{page}页重试{DEEP_PAGE_RETRIES}次后仍然失败，"
+                                   f"停止翻该列表")
+                    break
+                fetched_pages += 1
+                if not video_list:
+                    break  # 列表翻到末尾
+
+                with span('filter', category=category_name, videos=len(video_list)):
+                    rows = parse(video_list, category_name, target_count - len(data_rows), seen)
+                if enricher is not None:
+                    rows = enricher.enrich(rows, keep=is_high_quality)
+                # 整页都是重复或低质量视频算空页，列表后部质量太低时不再继续翻
+                empty_pages = 0 if rows else empty_pages + 1
+                data_rows.extend(rows)
+                logger.debug(f"{category_name} {feed_name}第{page}页: {len(video_list)} 条，"
+                             f"新增 {len(rows)} 条高质量数据，累计 {len(data_rows)} 条")
+                if empty_pages >= MAX_EMPTY_PAGES:
+                    logger.info(f"{category_name} {feed_name}连续{empty_pages}页没有新的高质量视频，停止翻页")
+                    break
+            if len(data_rows) >= target_count:
+                break
     except Exception as e:
-        print(f"未知错误: {e}")
+        # 与排行榜一样只影响本分类；已筛选的视频照常返回写入
+        logger.warning(f"{category_name} 深度翻页出错: {e}，保留已筛选的 {len(data_rows)} 条数据")
+        return data_rows or None
+
+    if not fetched_pages:
         return None
+    logger.info(f"{category_name} 翻页 {fetched_pages} 次，筛选出 {len(data_rows)} 条高质量数据"
+                f"（点赞率>{LIKE_RATE_THRESHOLD}）", extra={'category': category_name, 'rows': len(data_rows)})
+    return data_rows
 
-def main():
-    # 分类配置 - 根据提供的完整信息扩充
-    categorys = [{
-        "name": "全站",
-        "tid": 0,
-        "slug": "all"
-    }, {
-        "name": "国产动画",
-        "type": "bangumi",
-        "tid": 168,
-        "slug": "guochan",
-        "season_type": 4
-    }, {
-        "name": "国创相关",
-        "tid": 168,
-        "slug": "guochuang"
-    }, {
-        "name": "纪录片",
-        "type": "cinema",
-        "slug": "documentary",
-        "tid": 177,
-        "season_type": 3
-    }, {
-        "name": "动画",
-        "tid": 1,
-        "slug": "douga"
-    }, {
-        "name": "音乐",
-        "tid": 3,
-        "slug": "music"
-    }, {
-        "name": "舞蹈",
-        "tid": 129,
-        "slug": "dance"
-    }, {
-        "name": "游戏",
-        "tid": 4,
-        "slug": "game"
-    }, {
-        "name": "知识",
-        "tid": 36,
-        "slug": "knowledge"
-    }, {
-        "name": "科技",
-        "tid": 188,
-        "slug": "tech"
-    }, {
-        "name": "运动",
-        "tid": 234,
-        "slug": "sports"
-    }, {
-        "name": "汽车",
-        "tid": 223,
-        "slug": "car"
-    }, {
-        "name": "生活",
-        "tid": 160,
-        "slug": "life"
-    }, {
-        "name": "美食",
-        "tid": 211,
-        "slug": "food"
-    }, {
-        "name": "动物圈",
-        "tid": 217,
-        "slug": "animal"
-    }, {
-        "name": "鬼畜",
-        "tid": 119,
-        "slug": "kichiku"
-    }, {
-        "name": "时尚",
-        "tid": 155,
-        "slug": "fashion"
-    }, {
-        "name": "娱乐",
-        "tid": 5,
-        "slug": "ent"
-    }, {
-        "name": "影视",
-        "tid": 181,
-        "slug": "cinephile"
-    }]
+def save_category(category_name, data_rows, output_format=OUTPUT_FORMAT, store=None, enriched=False):
+    """
+    将单个分类的数据流式写入CSV（或Parquet分区、SQLite时序库）并打印统计
+
+    store: output_format 为 sqlite 时，本次爬取共用的 SQLiteStatsStore
+    enriched: 数据是否补充过详情，是则CSV追加分区、分P数和标签列
+
+    Returns:
+        bool: 是否写入成功
+    """
+    if not data_rows:
+        logger.warning(f"❌ {category_name} 未找到符合条件的高质量数据")
+        return False
     
-    # 先清空之前的CSV文件
-    print("🧹 正在清空之前的CSV文件...")
+    with span('write', category=category_name, rows=len(data_rows), format=output_format):
+        if output_format == 'parquet':
+            # Parquet 使用统一的英文列名，写入 category=分类 分区
+            with ParquetWriter(category_name) as sink:
+                sink.write_rows(data_rows)
+            filename = sink.filepath
+        elif output_format == 'sqlite':
+            store.write_rows(data_rows, source=category_name)
+            store.commit()  # 与检查点一致：已标记完成的分类一定已经入库
+            filename = store.filepath
+        else:
+            # 保存到CSV
+            filename = f'{RANKING_DIR}/{CSV_PREFIX}-{category_name}-高质量.csv'
+            columns = RANKING_COLUMNS + RANKING_ENRICH_COLUMNS if enriched else RANKING_COLUMNS
+            with StreamingCSVWriter(filename, columns, fields=[RANKING_FIELD_MAP[c] for c in columns]) as sink:
+                sink.write_rows(data_rows)
+    logger.info(f'\n✅ 写入成功: {filename}，共 {len(data_rows)} 条高质量数据')
+    
+    # 显示数据统计
+    like_rates = [row.like_rate for row in data_rows]
+    avg_like_rate = sum(like_rates) / len(like_rates)
+    max_like_rate = max(like_rates)
+    logger.info(f"📊 平均点赞率: {avg_like_rate:.4f}, 最高点赞率: {max_like_rate:.4f}")
     
+    # 显示前3条数据
+    logger.info("🔍 前3条数据预览:")
+    for i, row in enumerate(data_rows[:3]):
+        logger.info(f"  {i+1}. {row.title[:25]}... - {row.author} - 点赞率:{row.like_rate:.4f}")
+    return True
+
+def main(resume=False, dedup=None, output_format=OUTPUT_FORMAT, batch_filter=BATCH_FILTER, incremental=None,
+         stop_event=None, enricher=None, deep_target=None):
+    """
+    爬取全部分类（增量模式下只爬取到了刷新时间的分类）
+
+    Args:
+        resume: 为 True 时读取检查点，保留已有CSV并跳过已完成的分类
+        dedup: 可选的 DedupIndex；传入后跨分类、跨运行丢弃重复视频
+        output_format: 输出格式，'csv'、'parquet' 或 'sqlite'
+        batch_filter: 是否整页向量化筛选
+        incremental: 可选的 IncrementalState；传入后保留已有文件，只刷新到期的分类，
+                     并按榜单变化安排各分类的下次刷新时间
+        stop_event: 可选的 threading.Event；设置后不再开始新的分类，已完成的分类照常写入，
+                    检查点保留未完成的分类
+        enricher: 可选的 VideoEnricher；传入后为每个分类的高质量视频补充分区、分P数、标签和最新统计
+        deep_target: 深度翻页模式下每个分类的目标数量；为 None 时只爬排行榜。
+                     全站和番剧、纪录片等没有分区列表的分类仍使用排行榜
+    """
     # 确保数据目录存在
     if not os.path.exists(RANKING_DIR):
         os.makedirs(RANKING_DIR)
     
-    csv_files = glob.glob(f"{RANKING_DIR}/{CSV_PREFIX}*-*.csv")
-    for csv_file in csv_files:
-        try:
-            os.remove(csv_file)
-            print(f"✅ 删除文件: {csv_file}")
-        except Exception as e:
-            print(f"❌ 删除文件失败 {csv_file}: {e}")
+    checkpoint = CrawlCheckpoint.load(RANKING_DIR, 'ranking') if resume else None
+    if checkpoint is not None:
+        done = checkpoint.state['completed_categories']
+        logger.info(f"♻️  断点续爬: 已完成 {len(done)} 个分类，跳过: {', '.join(done)}")
+    else:
+        if resume:
+            logger.warning("⚠️  未找到可用的检查点，从头开始爬取")
+        checkpoint = CrawlCheckpoint.for_dir(RANKING_DIR, 'ranking')
+        
+        if incremental is not None:
+            # 增量模式：没有到刷新时间的分类沿用已有文件
+            logger.info("🔄 增量模式: 保留已有文件，只刷新到期的分类")
+        else:
+            # 先清空之前的CSV文件
+            logger.info("🧹 正在清空之前的CSV文件...")
+            csv_files = glob.glob(f"{RANKING_DIR}/{CSV_PREFIX}*-*.csv")
+            for csv_file in csv_files:
+                try:
+                    os.remove(csv_file)
+                    logger.info(f"✅ 删除文件: {csv_file}")
+                except Exception as e:
+                    logger.warning(f"❌ 删除文件失败 {csv_file}: {e}")
+        checkpoint.save()
     
-    print(f"\n{'='*60}")
-    print(f"🎯 开始爬取高质量视频数据（点赞率>{LIKE_RATE_THRESHOLD}，每个分类{TARGET_COUNT_PER_CATEGORY}个）")
-    print(f"{'='*60}")
+    logger.info(f"\n{'='*60}")
+    target_count = deep_target or TARGET_COUNT_PER_CATEGORY
+    logger.info(f"🎯 开始爬取高质量视频数据（点赞率>{LIKE_RATE_THRESHOLD}，每个分类{target_count}个）")
+    logger.info(f"{'='*60}")
     
     successful_categories = 0
     failed_categories = 0
+    skipped_categories = 0
+    stopped = False
     
-    for category in categorys:
-        category_name = category["name"]
-        tid = category["tid"]
-        
-        print(f"\n📂 正在处理分类: {category_name} (tid={tid})")
-        
-        # 获取数据
-        data_rows = get_bilibili_ranking_data(tid, category_name, TARGET_COUNT_PER_CATEGORY)
-        
-        if data_rows and len(data_rows) > 0:
-            # 创建DataFrame
-            df = pd.DataFrame(data_rows)
-            
-            # 保存到CSV
-            filename = f'{RANKING_DIR}/{CSV_PREFIX}-{category_name}-高质量.csv'
-            df.to_csv(filename, index=False, encoding='utf_8_sig')
-            successful_categories += 1
-            print(f'✅ 写入成功: {filename}，共 {len(df)} 条高质量数据')
-            
-            # 显示数据统计
-            avg_like_rate = df['点赞率'].mean()
-            max_like_rate = df['点赞率'].max()
-            print(f"📊 平均点赞率: {avg_like_rate:.4f}, 最高点赞率: {max_like_rate:.4f}")
-            
-            # 显示前3条数据
-            print("🔍 前3条数据预览:")
-            for i, row in df.head(3).iterrows():
-                print(f"  {i+1}. {row['视频标题'][:25]}... - {row['作者']} - 点赞率:{row['点赞率']:.4f}")
-        else:
-            failed_categories += 1
-            print(f"❌ {category_name} 未找到符合条件的高质量数据")
+    # 时序库：每个分类写完提交一次，与检查点保持一致；出错或中断时只放弃尚未提交的分类
+    with (SQLiteStatsStore() if output_format == 'sqlite' else nullcontext()) as store:
+        # 多个分类并发爬取，共享同一个客户端，由令牌桶统一控制每个主机的请求速率
+        client = get_default_client()
+        concurrency = DEEP_CONCURRENCY if deep_target else MAX_CONCURRENCY
+        logger.info(f"⚡ 并发数: {concurrency}, 限速: 每个主机 {REQUESTS_PER_SECOND} 次/秒")
+    
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {}
+            for category in CATEGORIES:
+                if checkpoint.is_category_done(category["name"]):
+                    continue
+                if incremental is not None and not incremental.is_due(category["name"]):
+                    next_due = time.strftime("%m-%d %H:%M", time.localtime(incremental.next_due(category["name"])))
+                    logger.info(f"⏭️  {category['name']} 未到刷新时间（下次 {next_due}）")
+                    skipped_categories += 1
+                    continue
+                logger.info(f"📂 提交分类: {category['name']} (tid={category['tid']})")
+                if deep_target and category["tid"] and "type" not in category:
+                    future = executor.submit(get_region_videos, category["tid"], category["name"], deep_target,
+                                             client, dedup, batch_filter, enricher, stop_event=stop_event)
+                else:
+                    future = executor.submit(get_bilibili_ranking_data, category["tid"], category["name"],
+                                             target_count, client, dedup, batch_filter, enricher)
+                futures[future] = category
         
-        # 添加延时避免请求过于频繁
-        if category != categorys[-1]:  # 不是最后一个
-            delay = random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX)
-            print(f"⏰ 等待 {delay:.1f} 秒...")
-            time.sleep(delay)
+            # 哪个分类先完成就先写哪个
+            for future in as_completed(futures):
+                if stop_event is not None and stop_event.is_set() and not stopped:
+                    # 还没开始的分类直接取消，正在请求的分类完成后照常写入
+                    stopped = True
+                    cancelled = sum(f.cancel() for f in futures)
+                    logger.info(f"⏹️  收到停止信号，取消尚未开始的 {cancelled} 个分类")
+                if future.cancelled():
+                    continue
+                category_name = futures[future]["name"]
+                data_rows = future.result()
+                if save_category(category_name, data_rows, output_format, store, enriched=enricher is not None):
+                    checkpoint.mark_category(category_name, len(data_rows))
+                    if dedup is not None:
+                        # 分类写入、检查点保存之后才记入持久索引，失败或中止的分类不会被以后的运行跳过
+                        dedup.persist((row.bvid for row in data_rows), category_name)
+                    successful_categories += 1
+                    if incremental is not None:
+                        change = incremental.observe(category_name, data_rows)
+                        interval = incremental.schedule(category_name, change.changed)
+                        logger.info(f"🔄 {category_name}: 新视频 {change.new}，热视频 {change.hot}，"
+                                    f"{interval / 3600:g} 小时后再刷新")
+                else:
+                    failed_categories += 1
     
-    print(f"\n{'='*60}")
-    print(f"🎉 数据爬取完成！")
-    print(f"✅ 成功: {successful_categories} 个分类")
-    print(f"❌ 失败: {failed_categories} 个分类")
-    print(f"📁 生成的CSV文件保存在 {RANKING_DIR}/ 目录")
-    print(f"{'='*60}")
+    logger.info(f"\n{'='*60}")
+    logger.info(f"🎉 数据爬取完成！")
+    client.print_rate_summary()
+    if enricher is not None:
+        enricher.print_summary()
+    logger.info(f"✅ 成功: {successful_categories} 个分类")
+    logger.info(f"❌ 失败: {failed_categories} 个分类")
+    if incremental is not None:
+        logger.info(f"⏭️  未到刷新时间: {skipped_categories} 个分类")
+    if store is not None:
+        logger.info(f"📁 数据已写入时序库 {store.filepath}")
+    else:
+        output_dir = PARQUET_DIR if output_format == 'parquet' else RANKING_DIR
+        logger.info(f"📁 生成的文件保存在 {output_dir}/ 目录")
+    if failed_categories or stopped:
+        logger.info(f"💡 可使用 --resume 只重试失败或未完成的分类")
+    else:
+        checkpoint.clear()
+    logger.info(f"{'='*60}")
+
+def cli(argv=None, prog=None):
+    """
+    命令行入口
+
+    Args:
+        argv: 命令行参数，默认 sys.argv[1:]
+        prog: 帮助信息中的程序名，由 cli.py 的 ranking 子命令传入
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="B站分类排行榜高质量视频爬虫")
+    parser.add_argument("--resume", action="store_true",
+                        help="从检查点继续，保留已有CSV并跳过已完成的分类")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help=f"输出格式（默认 {OUTPUT_FORMAT}）；parquet 写入 {PARQUET_DIR}/ 按日期和分类分区，"
+                             f"sqlite 追加到时序库 {SQLITE_DB}")
+    parser.add_argument("--batch-filter", action="store_true", default=BATCH_FILTER,
+                        help="整页向量化计算点赞率和筛选")
+    parser.add_argument("--dedup", action="store_true",
+                        help=f"使用跨运行共享的去重索引（{DEDUP_DB}），跳过以前爬到过的视频")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"把原始API响应缓存到 {RESPONSE_CACHE_DB}，有效期内不重复请求")
+    parser.add_argument("--offline", action="store_true",
+                        help="只从响应缓存重放，不访问网络（调整阈值后重新筛选和导出）")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"增量模式：保留已有文件，只刷新到了刷新时间的分类（状态保存在 {INCREMENTAL_DB}）")
+    parser.add_argument("--enrich", action="store_true",
+                        help=f"为高质量视频补充分区、分P数、标签和最新统计（{ENRICH_CONCURRENCY} 个请求并发，"
+                             f"结果缓存在 {ENRICH_CACHE_DB}）")
+    parser.add_argument("--deep", type=int, nargs="?", const=DEEP_TARGET_PER_CATEGORY, default=None, metavar="N",
+                        help=f"深度翻页：按分区翻近期热门和最新投稿列表，每个分类爬取N个（默认 "
+                             f"{DEEP_TARGET_PER_CATEGORY}），{DEEP_CONCURRENCY} 个分类并发")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.incremental and args.dedup:
+        parser.error("--incremental 不能与 --dedup 同时使用")
+    if args.deep is not None and args.deep <= 0:
+        parser.error("--deep 的目标数量必须大于 0")
+    metrics_server = metrics.start_from_args(args)
+    response_cache = None
+    if args.cache or args.offline or args.enrich or args.deep:
+        response_cache = ResponseCache(RESPONSE_CACHE_DB) if args.cache or args.offline else None
+        # 补充详情的请求与分类请求同时在途，连接池按两者之和保留连接
+        pool_size = (DEEP_CONCURRENCY if args.deep else MAX_CONCURRENCY) + (ENRICH_CONCURRENCY if args.enrich else 0)
+        configure_default_client(response_cache, offline=args.offline, pool_size=pool_size)
+        if args.offline:
+            logger.info(f"📴 离线模式: 从 {RESPONSE_CACHE_DB} 重放（{len(response_cache)} 条缓存）")
+    dedup_index = DedupIndex(DEDUP_DB) if args.dedup else None
+    incremental = IncrementalState(INCREMENTAL_DB) if args.incremental else None
+    enricher = VideoEnricher(get_default_client(), EnrichmentCache(ENRICH_CACHE_DB)) if args.enrich else None
+    try:
+        main(resume=args.resume, dedup=dedup_index, output_format=args.format,
+             batch_filter=args.batch_filter, incremental=incremental, enricher=enricher, deep_target=args.deep)
+    except KeyboardInterrupt:
+        logger.info("\n⏹️  用户中断爬取，进度已保存，可使用 --resume 继续")
+    finally:
+        if dedup_index is not None:
+            dedup_index.close()
+        if incremental is not None:
+            incremental.close()
+        if enricher is not None:
+            enricher.close()
+            enricher.cache.close()
+        if response_cache is not None:
+            logger.info(f"🗃️  响应缓存: 命中 {response_cache.hits}，未命中 {response_cache.misses}，"
+                        f"304 重新验证 {response_cache.revalidated}")
+            response_cache.close()
+        metrics.finish_from_args(args, metrics_server)
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,107 @@
+"""
+断点续爬
+
+功能：
+1. 记录已完成的页码/分类、最后处理的页码和已写入的行数
+2. 每次更新都原子写入（临时文件 + os.replace），中断时不会留下损坏的检查点
+3. 配合 --resume 先补爬失败的页面，再从上次中断的位置继续，不重复下载已完成的页面
+"""
+
+import json
+import os
+import time
+
+from config import CHECKPOINT_NAME
+
+
+class CrawlCheckpoint:
+    """一次爬取任务的检查点"""
+
+    def __init__(self, path, mode):
+        """
+        Args:
+            path: 检查点文件路径
+            mode: 任务类型，'popular' 或 'ranking'
+        """
+        self.path = path
+        self.state = {
+            'mode': mode,
+            'output': None,            # 输出文件路径（热门模式）
+            'target_count': None,
+            'last_pn': 0,              # 最后一个成功处理的页码
+            'completed_pages': [],
+            'failed_pages': [],
+            'completed_categories': {},  # 分类名 -> 写入行数
+            'rows_written': 0,
+            'output_bytes': 0,         # 已确认写入的中间文件字节数
+            'started_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'updated_at': None,
+        }
+
+    @classmethod
+    def for_dir(cls, data_dir, mode):
+        """在数据目录下创建检查点（不读取已有文件）"""
+        return cls(os.path.join(data_dir, CHECKPOINT_NAME), mode)
+
+    @classmethod
+    def load(cls, data_dir, mode):
+        """
+        读取数据目录下的检查点
+
+        Returns:
+            CrawlCheckpoint: 不存在、损坏或类型不符时返回 None
+        """
+        checkpoint = cls.for_dir(data_dir, mode)
+        try:
+            with open(checkpoint.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('mode') != mode:
+            return None
+        checkpoint.state.update(state)
+        return checkpoint
+
+    def save(self):
+        """原子写入检查点文件"""
+        self.state['updated_at'] = time.strftime("%Y-%m-%d %H:%M:%S")
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """任务完成后删除检查点"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def mark_page(self, page, rows=0, output_bytes=None, ok=True):
+        """记录一页的处理结果并保存"""
+        if ok:
+            self.state['completed_pages'].append(page)
+            self.state['last_pn'] = max(self.state['last_pn'], page)
+            self.state['rows_written'] += rows
+            if output_bytes is not None:
+                self.state['output_bytes'] = output_bytes
+        else:
+            self.state['failed_pages'].append(page)
+        self.save()
+
+    def mark_category(self, name, rows):
+        """记录一个已写入CSV的分类并保存"""
+        self.state['completed_categories'][name] = rows
+        self.state['rows_written'] += rows
+        self.save()
+
+    def is_category_done(self, name):
+        return name in self.state['completed_categories']
+
+    @property
+    def retry_pages(self):
+        """失败后还没有重新爬取成功的页码（预取窗口中失败的页可能早于 last_pn）"""
+        return sorted(set(self.state['failed_pages']) - set(self.state['completed_pages']))
+
+    @property
+    def stopped_on_errors(self):
+        """还有失败且没有重新爬取成功的页（如 -352 封禁），续爬时需要补上，而不是正常结束"""
+        return bool(self.retry_pages)
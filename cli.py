@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+统一命令行入口
+
+功能：
+1. 子命令 ranking / popular / export；ranking 和 popular 的参数与
+   bilibili_crawler.py / popular_crawler.py 完全相同，原样转交
+2. 只在执行子命令时导入对应模块：查看帮助和导出数据不导入 requests / pandas，
+   爬虫也只在启用 --batch-filter 时才导入 numpy / pandas
+3. export 把 SQLite 时序库（或增量状态）中每个视频的最新数据按点赞率排序导出，
+   CSV 用标准库 csv 写出；parquet 需要 pyarrow，写入 PARQUET_DIR 的分区
+4. query 在历史快照索引（snapshot_index.py）上查询前K名或按条件筛选，
+   查询前先增量收录新的运行结果，不重新读取全部CSV
+
+用法：
+    python cli.py popular 50
+    python cli.py ranking --format sqlite --cache
+    python cli.py export --source popular --since-hours 24
+    python cli.py export --from incremental --source popular --format parquet
+    python cli.py query --top 50 --source popular --since-hours 720
+    python cli.py query --source 知识 --where "like_rate>0.2" --where "view>1000000" --all
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 子命令 -> (模块, 命令行入口, 说明)；模块在执行子命令时才导入
+CRAWL_COMMANDS = {
+    'ranking': ('bilibili_crawler', 'cli', "分类排行榜爬虫，参数同 bilibili_crawler.py"),
+    'popular': ('popular_crawler', 'main', "热门页面爬虫，参数同 popular_crawler.py"),
+}
+
+EXPORT_COLUMNS = ['rank', 'bvid', 'title', 'author', 'source', 'view', 'like', 'like_rate',
+                  'coin', 'favorite', 'share', 'reply', 'danmaku', 'duration', 'pubdate',
+                  'tid', 'tname', 'parts', 'tags', 'url', 'crawled_at']
+EXPORT_BATCH_ROWS = 1000  # 每批写入的行数
+
+
+def run_crawler(command, argv):
+    """导入爬虫模块，把剩余参数交给它的命令行入口"""
+    import importlib
+
+    module_name, entry, _ = CRAWL_COMMANDS[command]
+    module = importlib.import_module(module_name)
+    getattr(module, entry)(argv, prog=f"cli.py {command}")
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_rows(source_db, db_path=None, source=None, since=None):
+    """
+    读取要导出的行，按点赞率从高到低编号
+
+    Args:
+        source_db: 'sqlite'（时序库）或 'incremental'（增量状态）
+        db_path: 数据库路径，默认使用配置文件值
+        source: 来源（'popular' 或分类名）；增量状态按来源保存，默认 'popular'
+        since: 只导出该时间戳之后的快照（仅时序库）
+
+    Yields:
+        dict: 统一列名的数据行
+    """
+    if source_db == 'incremental':
+        from config import INCREMENTAL_DB
+        from incremental import IncrementalState
+
+        source = source or 'popular'
+        state = IncrementalState(db_path or INCREMENTAL_DB)
+        try:
+            # 行数受保留期限制，直接在内存中排序
+            records = sorted(state.iter_rows(source), key=lambda record: record.like_rate, reverse=True)
+        finally:
+            state.close()
+        rows = (dict(record.to_dict(), url=record.url, source=source) for record in records)
+    else:
+        from config import SQLITE_DB
+        from storage import iter_latest_rows
+
+        rows = iter_latest_rows(db_path or SQLITE_DB, source, since)
+
+    for rank, row in enumerate(rows, 1):
+        row['rank'] = rank
+        yield row
+
+
+def export(args):
+    """
+    导出最新数据为 CSV 或 Parquet
+
+    Returns:
+        tuple: (输出路径, 行数)
+    """
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    rows = export_rows(args.source_db, args.db, args.source, since)
+    name = args.source or ('popular' if args.source_db == 'incremental' else 'all')
+    if args.format == 'parquet':
+        from storage import ParquetWriter
+
+        sink = ParquetWriter(name)
+    else:
+        from config import EXPORT_DIR
+        from csv_sink import StreamingCSVWriter
+
+        output = args.output or os.path.join(
+            EXPORT_DIR, f"{name}-{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        sink = StreamingCSVWriter(output, EXPORT_COLUMNS)
+    with sink:
+        for batch in _batched(rows, EXPORT_BATCH_ROWS):
+            sink.write_rows(batch)
+    return sink.filepath, sink.rows_written
+
+
+def query(args):
+    """
+    更新历史快照索引并查询
+
+    Returns:
+        tuple: (结果行列表, 索引总行数)
+    """
+    from snapshot_index import SnapshotIndex
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    with SnapshotIndex() as index:
+        if args.rebuild or not args.no_update:
+            start = time.perf_counter()
+            files, rows = index.rebuild() if args.rebuild else index.update()
+            if files:
+                print(f"🗂️  索引更新: 收录 {files} 个文件，{rows} 行（{time.perf_counter() - start:.2f} 秒）")
+        results = index.query(args.by, None if args.all else args.top, args.conditions, args.source,
+                              args.tname, since, latest=not args.snapshots)
+        return results, len(index)
+
+
+def print_results(results, by):
+    """在终端显示查询结果"""
+    for row in results:
+        value = f"{row[by]:.4f}" if isinstance(row[by], float) else f"{row[by]:,}"
+        crawled = time.strftime("%m-%d %H:%M", time.localtime(row['crawled_at']))
+        print(f"{row['rank']:>4}. {value:>12}  {row['title'][:30]} - {row['author']}"
+              f"  [{row['source']}{'/' + row['tname'] if row['tname'] else ''} {crawled}]  {row['url']}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # 爬虫子命令的参数原样转交，由各自的解析器处理（包括 --help）
+    if argv and argv[0] in CRAWL_COMMANDS:
+        run_crawler(argv[0], argv[1:])
+        return
+
+    parser = argparse.ArgumentParser(prog="cli.py", description="B站高质量视频爬虫统一命令行")
+    sub = parser.add_subparsers(dest="command", required=True, metavar="{ranking,popular,export,query}")
+    for command, (_, _, description) in CRAWL_COMMANDS.items():
+        sub.add_parser(command, help=description, add_help=False)
+    export_parser = sub.add_parser("export", help="导出时序库或增量状态中的最新数据")
+    export_parser.add_argument("--from", dest="source_db", choices=("sqlite", "incremental"), default="sqlite",
+                               help="数据来源：SQLite 时序库（--format sqlite 的输出）或增量状态（默认 sqlite）")
+    export_parser.add_argument("--db", default=None, help="数据库路径（默认使用配置文件中的路径）")
+    export_parser.add_argument("--source", default=None,
+                               help="只导出该来源：popular 或分类名（增量状态默认 popular）")
+    export_parser.add_argument("--since-hours", type=float, default=None,
+                               help="只导出最近N小时内爬取的快照（仅时序库）")
+    export_parser.add_argument("--format", choices=("csv", "parquet"), default="csv",
+                               help="输出格式（默认 csv，标准库写出；parquet 需要 pyarrow）")
+    export_parser.add_argument("-o", "--output", default=None,
+                               help="CSV 输出路径（默认写入 data/export/）")
+    query_parser = sub.add_parser("query", help="在历史快照索引上查询前K名或按条件筛选")
+    query_parser.add_argument("--top", type=int, default=50, help="返回前K个视频（默认 50）")
+    query_parser.add_argument("--all", action="store_true", help="返回全部满足条件的视频")
+    query_parser.add_argument("--by", default="like_rate",
+                              help="排序指标，从大到小（默认 like_rate；可选 view、like、coin、favorite 等）")
+    query_parser.add_argument("--where", dest="conditions", action="append", default=[], metavar="EXPR",
+                              help="筛选条件，可重复，如 \"like_rate>0.2\" \"view>=1000000\"")
+    query_parser.add_argument("--source", default=None, help="只查询该来源：popular 或分类名")
+    query_parser.add_argument("--tname", default=None, help="只查询该分区（--enrich 补充过分区的数据）")
+    query_parser.add_argument("--since-hours", type=float, default=None, help="只查询最近N小时内爬取的快照")
+    query_parser.add_argument("--snapshots", action="store_true",
+                              help="查询全部历史快照（默认只用每个视频在每个来源的最新快照）")
+    query_parser.add_argument("--no-update", action="store_true", help="不收录新的运行结果，直接查询")
+    query_parser.add_argument("--rebuild", action="store_true", help="清空索引，按现有CSV重新收录")
+    query_parser.add_argument("-o", "--output", default=None, help="把结果写入CSV")
+    args = parser.parse_args(argv)
+    if args.command == 'query':
+        from snapshot_index import INDEX_METRICS, RESULT_COLUMNS, parse_condition
+
+        if args.by not in INDEX_METRICS:
+            parser.error(f"--by 可选: {', '.join(INDEX_METRICS)}")
+        try:
+            args.conditions = [parse_condition(text) for text in args.conditions]
+        except ValueError as e:
+            parser.error(str(e))
+        start = time.perf_counter()
+        results, total = query(args)
+        elapsed = time.perf_counter() - start
+        if args.output:
+            from csv_sink import StreamingCSVWriter
+
+            os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+            with StreamingCSVWriter(args.output, RESULT_COLUMNS) as sink:
+                sink.write_rows(results)
+            print(f"💾 已写入 {args.output}")
+        else:
+            print_results(results, args.by)
+        print(f"🔎 共 {len(results)} 个视频（索引 {total} 行，{elapsed * 1000:.0f} ms）")
+        return
+    if args.source_db == 'incremental' and args.since_hours:
+        parser.error("增量状态没有逐行的爬取时间，--since-hours 只能用于时序库")
+    if args.source_db == 'sqlite':
+        from config import SQLITE_DB
+
+        if not os.path.exists(args.db or SQLITE_DB):
+            parser.error(f"时序库 {args.db or SQLITE_DB} 不存在，先用 --format sqlite 爬取")
+    if args.format == 'parquet' and args.output:
+        parser.error("parquet 输出写入 PARQUET_DIR 的分区，不能指定 --output")
+
+    start = time.perf_counter()
+    filepath, count = export(args)
+    print(f"💾 已导出 {count} 条数据到 {filepath}（{time.perf_counter() - start:.2f} 秒）")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,13 @@
 
 # 数据质量阈值
 LIKE_RATE_THRESHOLD = 0.1  # 点赞率阈值，大于此值认为是高质量视频
+MIN_QUALITY_SCORE = None   # 加权质量分下限，None 表示只按点赞率筛选
+QUALITY_WEIGHTS = {        # 质量分 = 各比率的加权和
+    'like_rate': 0.5,
+    'coin_rate': 0.3,
+    'favorite_rate': 0.2,
+}
+BATCH_FILTER = False       # 是否默认使用向量化批量筛选（--batch-filter）
 
 # 爬取设置
 TARGET_COUNT_PER_CATEGORY = 100  # 每个分类爬取的目标视频数量
@@ -11,16 +18,108 @@ REQUEST_DELAY_MIN = 2  # 请求间隔最小秒数
 REQUEST_DELAY_MAX = 4  # 请求间隔最大秒数
 REQUEST_TIMEOUT = 10   # 请求超时时间（秒）
 
+# 并发设置
+MAX_CONCURRENCY = 4      # 同时进行的最大请求数
+REQUESTS_PER_SECOND = 1  # 每个主机每秒最大请求数（令牌桶速率）
+RATE_BURST = 2           # 令牌桶容量，允许的瞬时突发请求数
+POPULAR_PREFETCH_WINDOW = 4  # 热门页面同时预取的页数，1 为逐页串行
+
+# 分区深度翻页（--deep）
+DEEP_TARGET_PER_CATEGORY = 1000  # 深度模式每个分类的目标高质量视频数
+DEEP_MAX_PAGES = 100       # 每个分区列表最多翻的页数
+DEEP_PAGE_SIZE = 50        # 分区列表每页的视频数（接口上限 50）
+DEEP_CONCURRENCY = 16      # 同时翻页的分类数，请求节奏仍由每个主机的限速统一控制
+DEEP_PAGE_RETRIES = 3      # 分区列表某页请求失败时的重试次数，重试后仍失败才停止翻该列表
+DEEP_RETRY_DELAY = 1       # 第一次重试前等待的秒数，之后逐次加倍
+
+# 自适应限速（AIMD）
+ADAPTIVE_RATE = True       # 根据响应自动调整速率，代替固定的随机延时
+ADAPTIVE_MIN_RATE = 0.2    # 最低速率（次/秒）
+ADAPTIVE_MAX_RATE = 4      # 最高速率（次/秒）
+ADAPTIVE_INCREASE = 0.05   # 每次正常响应增加的速率
+ADAPTIVE_DECREASE_FACTOR = 0.5  # 被限流时速率乘以该系数
+BACKOFF_BASE = 2           # 退避基数（秒），连续被限流时翻倍
+BACKOFF_MAX = 60           # 退避上限（秒）
+THROTTLE_STATUS_CODES = (412, 429)  # 视为限流的HTTP状态码
+THROTTLE_API_CODES = (-352, -412)   # 视为限流的API返回码
+MAX_THROTTLE_RETRIES = 4   # 被限流后同一请求的最大重试次数
+
+# 多出口 / 多身份调度
+# 每个身份一个出口代理和一组覆盖 HEADERS 的请求头，为空时只用本机直连，例如：
+# IDENTITIES = [
+#     {'name': 'proxy-a', 'proxy': 'http://127.0.0.1:8001', 'headers': {'User-Agent': '...'}},
+#     {'name': 'direct', 'proxy': None},
+# ]
+IDENTITIES = []
+IDENTITY_QUARANTINE_SECONDS = 60   # 身份被限流后的隔离时间（秒），连续被限流时翻倍
+IDENTITY_QUARANTINE_MAX = 900      # 隔离时间上限（秒）
+
 # 文件路径
 DATA_DIR = "data"  # 数据保存目录
 RANKING_DIR = "data/ranking"  # 分类排行榜数据目录
 POPULAR_DIR = "data/popular"   # 热门页面数据目录
 CSV_PREFIX = "B站TOP"  # CSV文件名前缀
+SORT_OUTPUT = True  # 结束时是否按点赞率对热门数据做最终排序
+EXTERNAL_SORT_CHUNK_ROWS = 50000  # 外部排序每个分块的行数，决定排序时的内存上限
+CHECKPOINT_NAME = ".checkpoint.json"  # 断点续爬检查点文件名（保存在各数据目录下）
+DEDUP_DB = "data/dedup.sqlite3"  # 跨运行共享的 bvid 去重索引（--dedup 时启用）
+
+# 输出格式
+OUTPUT_FORMAT = "csv"          # 默认输出格式：csv、parquet（需要 pyarrow）或 sqlite
+PARQUET_DIR = "data/parquet"   # Parquet 数据集根目录，按 date=/category= 分区
+SQLITE_DB = "data/bilibili_stats.sqlite3"  # SQLite 时序库，记录每个视频的数据变化历史
+EXPORT_DIR = "data/export"  # cli.py export 的默认输出目录
+QUERY_INDEX_DIR = "data/query_index"  # cli.py query 的历史快照索引（列式 .npy 分段 + SQLite 元数据）
+QUERY_INDEX_MAX_SEGMENTS = 8   # 索引分段数超过该值时合并为一个
+PARQUET_ROW_GROUP_ROWS = 50000 # Parquet 每个行组的行数
+
+# 分布式爬取
+WORK_QUEUE_DB = "data/work_queue.sqlite3"  # 协调者 / 工作进程 / 合并进程共用的工作队列
+WORK_LEASE_SECONDS = 120       # 工作单元租约时长（秒），进程崩溃后超时的单元会被重新领取
+WORK_MAX_ATTEMPTS = 3          # 每个工作单元最多尝试的次数
+POPULAR_PAGES_PER_UNIT = 5     # 热门页面每个工作单元包含的页数
+WORK_POLL_INTERVAL = 2         # 队列暂时没有可领取单元时的轮询间隔（秒）
+
+# 增量爬取（--incremental）
+INCREMENTAL_DB = "data/incremental.sqlite3"  # 每个视频最近一次的统计和各来源的刷新计划
+INCREMENTAL_NEW_HOURS = 48         # 发布不超过该小时数的视频视为热视频，每次都刷新
+INCREMENTAL_HOT_VELOCITY = 5000    # 播放增速（次/小时）不低于该值的视频视为热视频
+INCREMENTAL_STALE_PAGES = 2        # 热门页面连续多少页没有新视频和热视频时停止翻页
+INCREMENTAL_MIN_INTERVAL = 3600    # 分类排行榜最短刷新间隔（秒），榜单有变化时使用
+INCREMENTAL_MAX_INTERVAL = 86400   # 分类排行榜最长刷新间隔（秒），榜单没有变化时间隔逐次翻倍
+INCREMENTAL_RETENTION_DAYS = 7     # 超过该天数没有再出现的视频从合并结果中移除
+
+# 常驻模式（daemon.py）
+DAEMON_RANKING_INTERVAL = 3600   # 分类排行榜两次爬取的间隔（秒），0 表示不爬取
+DAEMON_POPULAR_INTERVAL = 1800   # 热门页面两次爬取的间隔（秒），0 表示不爬取
+DAEMON_JITTER = 0.1              # 间隔随机抖动比例，0.1 即 ±10%
+DAEMON_PID_FILE = "data/daemon.pid"  # 防止同一数据目录启动多个常驻进程
+
+# 去重设置
+DEDUP_BLOOM_FP_RATE = 0.01         # 布隆过滤器误判率
+DEDUP_BLOOM_MIN_CAPACITY = 100000  # 布隆过滤器最小容量
+
+# 响应缓存
+RESPONSE_CACHE_DB = "data/response_cache.sqlite3"  # 原始API响应缓存（--cache / --offline 时启用）
+RESPONSE_CACHE_TTL = 6 * 3600          # 缓存有效期（秒），过期后带条件请求头重新获取
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 缓存压缩后总大小上限，超出时淘汰最久未使用的条目
+
+# 视频详情补充（--enrich）
+ENRICH_CONCURRENCY = 8      # 同时请求详情和标签的视频数，请求节奏仍受每个主机的限速控制
+ENRICH_CACHE_DB = "data/enrich_cache.sqlite3"  # 按 bvid 缓存的详情补充结果
+ENRICH_TTL = 24 * 3600      # 补充结果的有效期（秒），有效期内的视频不再请求详情
 
 # API设置
 BASE_URL = "https://api.bilibili.com"
 RANKING_API = "/x/web-interface/ranking/v2"  # 排行榜API
 POPULAR_API = "/x/web-interface/popular"     # 热门API
+VIDEO_DETAIL_API = "/x/web-interface/view"   # 视频详情API（分区、分P数、最新统计）
+REGION_HOT_API = "/x/web-interface/dynamic/region"  # 分区近期热门投稿API（按 rid 翻页）
+REGION_NEW_API = "/x/web-interface/newlist"  # 分区最新投稿API（按 rid 翻页）
+VIDEO_TAGS_API = "/x/tag/archive/tags"       # 视频标签API
+HOMEPAGE_URL = "https://www.bilibili.com/"   # cookie预热地址
+COOKIE_REFRESH_CODES = (-352,)  # 遇到这些API返回码时刷新cookie并重试一次
+JSON_BACKEND = "auto"  # API响应的JSON解码后端：auto（msgspec > orjson > 标准库）、msgspec、orjson 或 json
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'Referer': 'https://www.bilibili.com/',
@@ -0,0 +1,192 @@
+"""
+流式CSV写入
+
+功能：
+1. StreamingCSVWriter：每处理完一页就追加写入并刷新到磁盘，崩溃时已写数据不丢失；
+   VideoRecord 按列批量取值后直接交给 csv.writer，不逐行构造 dict
+2. iter_sorted_rows / finalize_csv：对中间文件做最终排序（外部归并排序）并添加排名列，内存只占一个分块
+3. column_stats / read_column：流式统计数值列、读取单列
+"""
+
+import csv
+import heapq
+import os
+import tempfile
+
+from config import EXTERNAL_SORT_CHUNK_ROWS
+from video_record import record_getter
+
+
+class StreamingCSVWriter:
+    """逐页追加写入的CSV文件"""
+
+    def __init__(self, filepath, columns, encoding='utf-8-sig', append=False, fields=None):
+        """
+        Args:
+            filepath: 输出文件路径
+            columns: 列名列表，多余字段会被忽略
+            encoding: 文件编码，默认带BOM方便Excel打开
+            append: 为 True 且文件已存在时在末尾追加，不再写表头
+            fields: 写入 VideoRecord 时每列对应的字段名，默认与 columns 相同
+                    （分类排行榜的中文表头对应统一的英文字段）
+        """
+        self.filepath = filepath
+        self.columns = list(columns)
+        self.rows_written = 0
+        self._getter = record_getter(list(fields or columns))
+
+        write_header = not (append and os.path.exists(filepath) and os.path.getsize(filepath) > 0)
+        if not write_header:
+            encoding = 'utf-8'  # 追加时不能再写BOM
+        self._file = open(filepath, 'a' if append else 'w', newline='', encoding=encoding)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore', lineterminator='\n')
+        if write_header:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def write_rows(self, rows):
+        """写入一批数据（通常是一页，VideoRecord 或 dict）并立即刷新"""
+        if rows and not isinstance(rows[0], dict):
+            self._writer.writer.writerows(map(self._getter, rows))
+        else:
+            self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows_written += len(rows)
+
+    def tell(self):
+        """已写入并刷新的字节数，用于断点续爬时截断未确认的数据"""
+        return self._file.tell()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _sort_value(row, key):
+    try:
+        return float(row[key])
+    except (TypeError, ValueError):
+        return float('-inf')
+
+
+def _write_run(rows, tmp_dir):
+    """把已排序的分块写入临时文件，返回文件路径"""
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()), lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def _read_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def iter_sorted_rows(src, sort_key=None, descending=True, chunk_rows=EXTERNAL_SORT_CHUNK_ROWS):
+    """
+    按 sort_key 外部归并排序后逐行产出中间文件的数据，内存只占一个分块
+
+    Args:
+        src: 中间CSV文件
+        sort_key: 排序列，None 表示保持写入顺序
+        descending: 是否降序
+        chunk_rows: 每个排序分块的行数，决定内存上限
+
+    Yields:
+        dict: 一行数据（值均为字符串）
+    """
+    if sort_key is None:
+        yield from _read_rows(src)
+        return
+
+    tmp_dir = os.path.dirname(os.path.abspath(src))
+    run_files = []
+    try:
+        # 第一阶段：分块排序，每块写成一个临时有序文件
+        chunk = []
+        for row in _read_rows(src):
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                chunk.sort(key=lambda r: _sort_value(r, sort_key), reverse=descending)
+                run_files.append(_write_run(chunk, tmp_dir))
+                chunk = []
+        chunk.sort(key=lambda r: _sort_value(r, sort_key), reverse=descending)
+
+        # 第二阶段：多路归并；只有一个分块时直接使用内存中的结果
+        if not run_files:
+            yield from chunk
+            return
+        if chunk:
+            run_files.append(_write_run(chunk, tmp_dir))
+        yield from heapq.merge(*(_read_rows(p) for p in run_files),
+                               key=lambda r: _sort_value(r, sort_key), reverse=descending)
+    finally:
+        for path in run_files:
+            os.remove(path)
+
+
+def finalize_csv(src, dst, columns, sort_key=None, descending=True,
+                 rank_column='rank', chunk_rows=EXTERNAL_SORT_CHUNK_ROWS):
+    """
+    由中间文件生成最终CSV：按 sort_key 外部归并排序，添加排名列并按 columns 排列
+
+    Args:
+        src: 中间CSV文件
+        dst: 最终输出文件
+        columns: 输出列顺序（不含排名列）
+        sort_key: 排序列，None 表示保持写入顺序
+        descending: 是否降序
+        rank_column: 排名列名，None 表示不添加
+        chunk_rows: 每个排序分块的行数，决定内存上限
+
+    Returns:
+        int: 写入的行数
+    """
+    out_columns = ([rank_column] if rank_column else []) + list(columns)
+    rows = iter_sorted_rows(src, sort_key, descending, chunk_rows)
+    count = 0
+    with open(dst, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=out_columns, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            if rank_column:
+                row[rank_column] = count
+            writer.writerow(row)
+    return count
+
+
+def read_column(filepath, column):
+    """流式读取一列的值"""
+    for row in _read_rows(filepath):
+        yield row[column]
+
+
+def column_stats(filepath, columns):
+    """
+    流式统计数值列
+
+    Returns:
+        dict: {列名: (平均值, 最大值)}，无数据时为空字典
+    """
+    sums = dict.fromkeys(columns, 0.0)
+    maxs = dict.fromkeys(columns, float('-inf'))
+    count = 0
+    for row in _read_rows(filepath):
+        count += 1
+        for col in columns:
+            value = _sort_value(row, col)
+            if value != float('-inf'):
+                sums[col] += value
+                maxs[col] = max(maxs[col], value)
+    if count == 0:
+        return {}
+    return {col: (sums[col] / count, maxs[col]) for col in columns}
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+常驻模式：一个进程内定时爬取，代替反复调用 start.sh / run.sh
+
+功能：
+1. 整个进程共用一个客户端：连接池、cookie 和限速状态在两次爬取之间保留，pandas 只导入一次
+2. 分类排行榜和热门页面各自按独立的间隔定时爬取，间隔带随机抖动
+3. 同一种爬取上一次还没结束时跳过本次；同一数据目录只允许一个常驻进程（PID 文件）；
+   两种爬取写同一个 SQLite 库时（--format sqlite 或 --incremental）依次进行，到期的一种等另一种结束再开始
+4. config.py 修改后自动重新加载阈值等设置（在两次爬取之间生效），也可发送 SIGHUP 立即重新加载
+5. 收到 SIGINT / SIGTERM 时不再开始新的爬取，正在进行的爬取停在当前页 / 分类，
+   照常写出已爬取的数据后退出；再次收到信号时立即退出
+
+用法：
+    python daemon.py
+    python daemon.py --incremental --ranking-interval 3600 --popular-interval 900
+    python daemon.py --once --format sqlite
+    python daemon.py --enrich
+"""
+
+import argparse
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+import config
+import metrics
+from config import *
+from bili_client import configure_default_client, get_default_client
+from enrichment import EnrichmentCache, VideoEnricher
+from incremental import IncrementalState
+from response_cache import ResponseCache
+from storage import OUTPUT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+# 可以在运行中重新加载的设置；连接、限速、路径等设置需要重启才能生效
+RELOADABLE_SETTINGS = (
+    'LIKE_RATE_THRESHOLD', 'MIN_QUALITY_SCORE', 'QUALITY_WEIGHTS',
+    'TARGET_COUNT_PER_CATEGORY', 'TARGET_COUNT_POPULAR', 'MAX_EMPTY_PAGES',
+    'INCREMENTAL_NEW_HOURS', 'INCREMENTAL_HOT_VELOCITY', 'INCREMENTAL_STALE_PAGES',
+    'INCREMENTAL_MIN_INTERVAL', 'INCREMENTAL_MAX_INTERVAL', 'INCREMENTAL_RETENTION_DAYS',
+    'DAEMON_RANKING_INTERVAL', 'DAEMON_POPULAR_INTERVAL', 'DAEMON_JITTER',
+)
+# 这些模块用 from config import ... 复制了设置，重新加载时同步更新它们的全局变量
+RELOAD_MODULES = ('bilibili_crawler', 'popular_crawler', 'quality', 'incremental', __name__)
+
+# 没有到期任务时，最长等待多久检查一次配置文件和停止信号（秒）
+TICK_SECONDS = 5
+
+
+class ConfigWatcher:
+    """监视 config.py，变化后把可重新加载的设置同步到各模块"""
+
+    def __init__(self, path=config.__file__):
+        self.path = path
+        self._mtime = self._stat()
+        self.pending = False  # 文件已变化但还没应用（有爬取在进行时推迟到空闲时）
+        self.reported = {}  # 已提示需要重启的设置 -> 提示时的新值，同一次修改只提示一次
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def check(self, idle=True):
+        """
+        检查配置文件是否变化；idle 为 False 时只记录，等没有爬取在进行时再应用
+        """
+        mtime = self._stat()
+        if mtime != self._mtime:
+            self._mtime = mtime
+            self.pending = True
+        if self.pending and idle:
+            self.pending = False
+            self.reload()
+
+    def reload(self):
+        """
+        重新执行 config.py 并应用变化的设置
+
+        Returns:
+            dict: {设置名: (旧值, 新值)}；文件有错误时返回 None，保留原有设置
+        """
+        namespace = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                exec(compile(f.read(), self.path, 'exec'), namespace)
+        except Exception as e:
+            logger.warning(f"⚠️  重新加载 {self.path} 失败，继续使用原有设置: {e}")
+            return None
+
+        changed = {}
+        restart_needed = []
+        for name, value in namespace.items():
+            if not name.isupper():
+                continue
+            if getattr(config, name, None) == value:
+                self.reported.pop(name, None)  # 改回了运行中的值，以后再修改时重新提示
+                continue
+            if name in RELOADABLE_SETTINGS:
+                changed[name] = (getattr(config, name, None), value)
+            elif name not in self.reported or self.reported[name] != value:
+                self.reported[name] = value
+                restart_needed.append(name)
+
+        for name, (_, value) in changed.items():
+            setattr(config, name, value)
+            for module_name in RELOAD_MODULES:
+                module = sys.modules.get(module_name)
+                if module is not None and hasattr(module, name):
+                    setattr(module, name, value)
+
+        for name, (old, new) in changed.items():
+            logger.info(f"🔁 配置已重新加载: {name} {old!r} → {new!r}")
+        if restart_needed:
+            logger.warning(f"⚠️  以下设置需要重启常驻进程才能生效: {', '.join(sorted(restart_needed))}")
+        if not changed and not restart_needed:
+            logger.info("🔁 配置文件已变化，没有需要更新的设置")
+        return changed
+
+
+class SweepJob:
+    """一种周期性爬取"""
+
+    def __init__(self, name, target, interval_setting, interval=None):
+        """
+        Args:
+            name: 显示名称
+            target: 执行一次爬取的函数，参数为停止事件
+            interval_setting: 间隔对应的配置名，随配置重新加载变化
+            interval: 命令行指定的固定间隔（秒），优先于配置
+        """
+        self.name = name
+        self.target = target
+        self.interval_setting = interval_setting
+        self.fixed_interval = interval
+        self.next_run = time.monotonic()  # 启动后立即执行第一次
+        self.thread = None
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.waiting = False  # 已到期，等另一种爬取结束
+
+    @property
+    def interval(self):
+        if self.fixed_interval is not None:
+            return self.fixed_interval
+        return getattr(config, self.interval_setting)
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, stop_event):
+        self.waiting = False
+        self.thread = threading.Thread(target=self._run, args=(stop_event,), name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self, stop_event):
+        start = time.time()
+        logger.info(f"▶️  开始{self.name}爬取")
+        try:
+            self.target(stop_event)
+            self.runs += 1
+            logger.info(f"✅ {self.name}爬取结束，用时 {time.time() - start:.1f} 秒")
+        except Exception as e:
+            self.failures += 1
+            logger.exception(f"❌ {self.name}爬取出错: {e}")
+
+
+class CrawlerDaemon:
+    """按各自的间隔调度爬取任务，直到收到停止信号"""
+
+    def __init__(self, jobs, stop_event, watcher=None, jitter=None, once=False, serial=False):
+        """
+        Args:
+            jobs: SweepJob 列表
+            stop_event: 停止事件，信号处理函数设置
+            watcher: 可选的 ConfigWatcher
+            jitter: 间隔随机抖动比例，None 时使用 DAEMON_JITTER
+            once: 每种爬取只执行一次，全部结束后退出
+            serial: 同一时间只进行一种爬取（各爬取写同一个 SQLite 库时避免互相锁住）
+        """
+        self.jobs = [job for job in jobs if job.enabled]
+        self.stop_event = stop_event
+        self.watcher = watcher
+        self.fixed_jitter = jitter
+        self.once = once
+        self.serial = serial
+
+    @property
+    def jitter(self):
+        return DAEMON_JITTER if self.fixed_jitter is None else self.fixed_jitter
+
+    def _next_interval(self, job):
+        return job.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def run(self):
+        if not self.jobs:
+            logger.warning("❌ 没有启用任何爬取（间隔都为 0）")
+            return
+        for job in self.jobs:
+            logger.info(f"🗓️  {job.name}: 每 {job.interval / 60:g} 分钟（±{self.jitter:.0%}）")
+
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if self.watcher is not None:
+                self.watcher.check(idle=not any(job.running for job in self.jobs))
+            for job in self.jobs:
+                if now < job.next_run or (self.once and job.thread is not None):
+                    continue
+                if job.running:
+                    job.skipped += 1
+                    logger.warning(f"⏭️  上一次{job.name}爬取还没结束，跳过本次")
+                elif self.serial and any(other.running for other in self.jobs):
+                    # 保留到期时间，另一种爬取结束后的下一次检查时开始
+                    if not job.waiting:
+                        job.waiting = True
+                        logger.info(f"⏳ {job.name}爬取已到期，等其他爬取结束后开始")
+                    continue
+                else:
+                    job.start(self.stop_event)
+                job.next_run = now + self._next_interval(job)
+                if not self.once:
+                    next_at = time.strftime("%H:%M:%S", time.localtime(time.time() + job.next_run - now))
+                    logger.info(f"🗓️  下次{job.name}爬取: {next_at}")
+
+            if self.once and all(job.thread is not None and not job.running for job in self.jobs):
+                break
+            pending = [job.next_run for job in self.jobs if not job.waiting]
+            wait = min(pending) - time.monotonic() if pending else TICK_SECONDS
+            self.stop_event.wait(min(TICK_SECONDS, max(0.1, wait)))
+
+        # 等正在进行的爬取写完已爬取的数据
+        for job in self.jobs:
+            if job.running:
+                logger.info(f"⏳ 等待{job.name}爬取保存数据...")
+                job.thread.join()
+        for job in self.jobs:
+            logger.info(f"📊 {job.name}: 完成 {job.runs} 次，出错 {job.failures} 次，因上一次未结束跳过 {job.skipped} 次")
+
+
+def acquire_pid_file(path=DAEMON_PID_FILE):
+    """
+    写入 PID 文件；文件已存在且对应进程仍在运行时返回 False
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path) as f:
+                    pid = int(f.read().strip() or 0)
+                os.kill(pid, 0)
+                return False
+            except PermissionError:
+                return False  # 进程存在但属于其他用户
+            except (OSError, ValueError):
+                os.remove(path)  # 进程已不存在，清理残留文件后重试
+                continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
+
+
+def release_pid_file(path=DAEMON_PID_FILE):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def install_signal_handlers(stop_event, watcher=None):
+    """SIGINT / SIGTERM：优雅退出，再次收到时立即退出；SIGHUP：立即重新加载配置"""
+    def handle_stop(signum, frame):
+        if stop_event.is_set():
+            logger.warning("⚠️  再次收到停止信号，立即退出")
+            os._exit(1)
+        logger.info(f"\n⏹️  收到 {signal.Signals(signum).name}，不再开始新的爬取，当前爬取保存数据后退出")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+    if watcher is not None and hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(watcher, 'pending', True))
+
+
+def ranking_sweep(args, enricher=None):
+    """返回执行一次分类排行榜爬取的函数"""
+    import bilibili_crawler
+
+    def sweep(stop_event):
+        incremental = _open_incremental() if args.incremental else None
+        try:
+            bilibili_crawler.main(output_format=args.format, batch_filter=args.batch_filter,
+                                  incremental=incremental, stop_event=stop_event, enricher=enricher)
+        finally:
+            if incremental is not None:
+                incremental.close()
+    return sweep
+
+
+def popular_sweep(args, enricher=None):
+    """返回执行一次热门页面爬取的函数"""
+    from popular_crawler import BilibiliPopularCrawler
+
+    def sweep(stop_event):
+        incremental = _open_incremental() if args.incremental else None
+        try:
+            crawler = BilibiliPopularCrawler(client=get_default_client(), batch_filter=args.batch_filter,
+                                             incremental=incremental, enricher=enricher)
+            crawler.stop_event = stop_event
+            crawler.run(args.popular_target, window=POPULAR_PREFETCH_WINDOW, sort_output=SORT_OUTPUT,
+                        output_format=args.format)
+        finally:
+            if incremental is not None:
+                incremental.close()
+    return sweep
+
+
+def _open_incremental():
+    # 显式传入当前设置，使重新加载的增量阈值生效
+    return IncrementalState(INCREMENTAL_DB, new_hours=INCREMENTAL_NEW_HOURS,
+                            hot_velocity=INCREMENTAL_HOT_VELOCITY, min_interval=INCREMENTAL_MIN_INTERVAL,
+                            max_interval=INCREMENTAL_MAX_INTERVAL, retention_days=INCREMENTAL_RETENTION_DAYS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站高质量视频爬虫 - 常驻模式")
+    parser.add_argument("--ranking-interval", type=float, default=None, metavar="SECONDS",
+                        help=f"分类排行榜爬取间隔（秒），0 表示不爬取（默认 DAEMON_RANKING_INTERVAL={DAEMON_RANKING_INTERVAL}）")
+    parser.add_argument("--popular-interval", type=float, default=None, metavar="SECONDS",
+                        help=f"热门页面爬取间隔（秒），0 表示不爬取（默认 DAEMON_POPULAR_INTERVAL={DAEMON_POPULAR_INTERVAL}）")
+    parser.add_argument("--jitter", type=float, default=None,
+                        help=f"间隔随机抖动比例（默认 DAEMON_JITTER={DAEMON_JITTER}）")
+    parser.add_argument("--popular-target", type=int, default=None,
+                        help=f"热门页面目标数量（默认 TARGET_COUNT_POPULAR={TARGET_COUNT_POPULAR}）")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"增量模式：只刷新新视频和热视频，与以前的结果合并（状态保存在 {INCREMENTAL_DB}）")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help=f"输出格式（默认 {OUTPUT_FORMAT}）")
+    parser.add_argument("--batch-filter", action="store_true", default=BATCH_FILTER,
+                        help="整页向量化计算点赞率和筛选")
+    parser.add_argument("--cache", action="store_true", help=f"把原始API响应缓存到 {RESPONSE_CACHE_DB}")
+    parser.add_argument("--enrich", action="store_true",
+                        help=f"为高质量视频补充分区、分P数、标签和最新统计（结果缓存在 {ENRICH_CACHE_DB}，"
+                             f"{ENRICH_TTL // 3600} 小时内不重复请求）")
+    parser.add_argument("--once", action="store_true", help="每种爬取只执行一次，结束后退出")
+    parser.add_argument("--no-reload", action="store_true", help="不监视 config.py 的变化")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics_server = metrics.start_from_args(args)
+
+    if not acquire_pid_file():
+        logger.warning(f"❌ 已有常驻进程在运行（{DAEMON_PID_FILE}）")
+        sys.exit(1)
+
+    logger.info("🛰️  B站高质量视频爬虫 - 常驻模式")
+    logger.info("=" * 50)
+
+    response_cache = None
+    enricher = None
+    try:
+        if args.cache:
+            response_cache = ResponseCache(RESPONSE_CACHE_DB)
+        # 两种爬取可能同时进行，连接池按两者（以及详情补充）的并发数之和保留连接；
+        # 写同一个 SQLite 库（时序库、增量状态）时依次进行，避免一方的写事务让另一方等到超时
+        serial = args.format == 'sqlite' or args.incremental
+        pool_size = MAX_CONCURRENCY + POPULAR_PREFETCH_WINDOW + (ENRICH_CONCURRENCY if args.enrich else 0)
+        configure_default_client(response_cache, pool_size=pool_size)
+        if args.enrich:
+            # 两种爬取共用补充线程池和缓存：一边补充过的视频，另一边在有效期内直接使用缓存
+            enricher = VideoEnricher(get_default_client(), EnrichmentCache(ENRICH_CACHE_DB))
+        stop_event = threading.Event()
+        watcher = None if args.no_reload else ConfigWatcher()
+        install_signal_handlers(stop_event, watcher)
+        jobs = [
+            SweepJob("分类排行榜", ranking_sweep(args, enricher), 'DAEMON_RANKING_INTERVAL', args.ranking_interval),
+            SweepJob("热门页面", popular_sweep(args, enricher), 'DAEMON_POPULAR_INTERVAL', args.popular_interval),
+        ]
+        CrawlerDaemon(jobs, stop_event, watcher, args.jitter, args.once, serial).run()
+        get_default_client().print_rate_summary()
+    finally:
+        if enricher is not None:
+            enricher.close()
+            enricher.cache.close()
+        if response_cache is not None:
+            logger.info(f"🗃️  响应缓存: 命中 {response_cache.hits}，未命中 {response_cache.misses}，"
+                        f"304 重新验证 {response_cache.revalidated}")
+            response_cache.close()
+        release_pid_file()
+        metrics.finish_from_args(args, metrics_server)
+    logger.info("👋 常驻进程已退出")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+bvid 去重索引
+
+功能：
+1. 内存模式：单次运行内去重（热门页面翻页时同一视频会出现在相邻两页）
+2. 持久模式：SQLite 表保存所有见过的 bvid，跨运行、跨两种爬取模式共享
+3. 持久模式前置一个内存布隆过滤器，绝大多数新视频不用查库即可判定
+4. 运行内的去重（add）只记在内存中；视频写入输出、检查点保存之后才调用 persist 记入持久索引，
+   中途停止、失败或被丢弃的视频不会被以后的运行当作已爬取过
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from config import DEDUP_BLOOM_FP_RATE, DEDUP_BLOOM_MIN_CAPACITY
+
+
+class BloomFilter:
+    """基于 bytearray 的布隆过滤器"""
+
+    def __init__(self, capacity, fp_rate=DEDUP_BLOOM_FP_RATE):
+        """
+        Args:
+            capacity: 预计元素数量
+            fp_rate: 期望误判率
+        """
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        # 双重哈希：由一个 128 位摘要派生 k 个位置
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class DedupIndex:
+    """线程安全的 bvid 去重索引"""
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path: SQLite 文件路径；为 None 时只在内存中去重（仅本次运行有效）
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._seen = set()  # 本次运行中已收录（add）的 bvid
+        self._conn = None
+        self._bloom = None
+        self.duplicates = 0  # 被丢弃的重复视频数
+
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen_videos ("
+                " bvid TEXT PRIMARY KEY,"
+                " source TEXT,"
+                " first_seen INTEGER)"
+            )
+            self._conn.commit()
+            count = self._conn.execute("SELECT COUNT(*) FROM seen_videos").fetchone()[0]
+            self._bloom = BloomFilter(max(DEDUP_BLOOM_MIN_CAPACITY, count * 2))
+            for (bvid,) in self._conn.execute("SELECT bvid FROM seen_videos"):
+                self._bloom.add(bvid)
+
+    def __len__(self):
+        with self._lock:
+            if self._conn is None:
+                return len(self._seen)
+            return self._conn.execute("SELECT COUNT(*) FROM seen_videos").fetchone()[0]
+
+    def _contains_locked(self, bvid):
+        if bvid in self._seen:
+            return True
+        if self._conn is None:
+            return False
+        if bvid not in self._bloom:
+            return False
+        # 布隆过滤器可能误判，命中时再查一次库确认
+        row = self._conn.execute("SELECT 1 FROM seen_videos WHERE bvid = ?", (bvid,)).fetchone()
+        return row is not None
+
+    def contains(self, bvid):
+        """是否已经见过该视频，命中时计入 duplicates"""
+        with self._lock:
+            if self._contains_locked(bvid):
+                self.duplicates += 1
+                return True
+            return False
+
+    def add(self, bvid):
+        """
+        在本次运行中收录一个视频（只记在内存中，见 persist）
+
+        Returns:
+            bool: 首次出现返回 True，重复返回 False
+        """
+        with self._lock:
+            if self._contains_locked(bvid):
+                self.duplicates += 1
+                return False
+            self._seen.add(bvid)
+            return True
+
+    def persist(self, bvids, source=''):
+        """
+        把已经写入输出的视频记入持久索引并提交；内存模式下只记在本次运行内
+
+        Args:
+            bvids: 已写入的视频 bvid
+            source: 来源（分类名或 popular）
+        """
+        bvids = list(bvids)
+        with self._lock:
+            self._seen.update(bvids)
+            if self._conn is None or not bvids:
+                return
+            now = int(time.time())
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_videos (bvid, source, first_seen) VALUES (?, ?, ?)",
+                [(bvid, source, now) for bvid in bvids],
+            )
+            self._conn.commit()
+            for bvid in bvids:
+                self._bloom.add(bvid)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+分布式爬取：协调者 / 工作进程 / 合并进程
+
+功能：
+1. enqueue：协调者把分类排行榜（每个分类一个单元）和热门页面（每 POPULAR_PAGES_PER_UNIT 页一个单元）
+   写入工作队列
+2. worker：领取单元、请求并筛选，把数据行写回队列；可以在多个进程或多台共享同一数据目录的机器上同时运行，
+   同一任务的所有工作进程通过队列数据库共享每个主机的令牌桶，加起来不超过 REQUESTS_PER_SECOND
+3. merge：所有单元结束后统一去重、排序，按指定格式生成最终输出
+4. run：在本机一次完成 enqueue + 启动 N 个工作进程 + merge
+
+用法：
+    python distributed.py run job1 --workers 4 --ranking --popular 500
+    python distributed.py enqueue job1 --ranking --popular 500
+    python distributed.py worker job1
+    python distributed.py merge job1 --format parquet
+    python distributed.py status job1
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from contextlib import nullcontext
+
+import metrics
+from config import *
+from bili_client import configure_default_client, get_default_client
+from bilibili_crawler import CATEGORIES, get_bilibili_ranking_data, save_category
+from csv_sink import StreamingCSVWriter, column_stats
+from dedup_index import DedupIndex
+from popular_crawler import BilibiliPopularCrawler, VIDEO_FIELDS
+from response_cache import ResponseCache
+from storage import OUTPUT_FORMATS, SQLiteStatsStore
+from video_record import VideoRecord
+from work_queue import SharedTokenBucket, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+# 热门页面最多爬取的页数，与 BilibiliPopularCrawler.get_popular_videos 的默认值一致
+POPULAR_MAX_PAGES = 50
+
+
+def enqueue(queue, job, ranking=True, popular_target=None, pages_per_unit=POPULAR_PAGES_PER_UNIT,
+            max_pages=POPULAR_MAX_PAGES):
+    """
+    协调者：创建任务并写入工作单元
+
+    Args:
+        queue: WorkQueue
+        job: 任务名
+        ranking: 是否爬取分类排行榜
+        popular_target: 热门页面目标数量，None 表示不爬取热门页面
+        pages_per_unit: 热门页面每个单元的页数
+        max_pages: 热门页面最大页数
+    """
+    queue.create_job(job, {'ranking': ranking, 'popular_target': popular_target})
+    if ranking:
+        count = queue.enqueue(job, 'ranking', [{'tid': c['tid'], 'name': c['name']} for c in CATEGORIES])
+        logger.info(f"📥 加入 {count} 个分类单元")
+    if popular_target:
+        units = [{'pages': [start, min(start + pages_per_unit - 1, max_pages)]}
+                 for start in range(1, max_pages + 1, pages_per_unit)]
+        count = queue.enqueue(job, 'popular', units)
+        logger.info(f"📥 加入 {count} 个热门页面单元（每个 {pages_per_unit} 页，共 {max_pages} 页）")
+
+
+def process_unit(queue, job, worker, unit, client, batch_filter=BATCH_FILTER):
+    """
+    处理一个工作单元并提交结果
+
+    Returns:
+        bool: 是否成功提交
+    """
+    payload = unit['payload']
+    if unit['kind'] == 'ranking':
+        rows = get_bilibili_ranking_data(payload['tid'], payload['name'], TARGET_COUNT_PER_CATEGORY,
+                                         client, None, batch_filter)
+        if rows is None:
+            status = queue.fail(unit['id'], worker, f"{payload['name']} 请求失败")
+            logger.warning(f"❌ [{worker}] 分类 {payload['name']} 失败，单元状态: {status}")
+            return False
+        return queue.complete(unit['id'], worker, [row.to_dict() for row in rows])
+
+    # 热门页面：逐页处理，每页续租；去重交给合并进程
+    crawler = BilibiliPopularCrawler(client=client, batch_filter=batch_filter)
+    start, end = payload['pages']
+    rows = []
+    end_of_feed = False
+    for page in range(start, end + 1):
+        page_videos, error = crawler.fetch_page(page)
+        if page_videos is None:
+            status = queue.fail(unit['id'], worker, f"第{page}页{error}")
+            logger.warning(f"❌ [{worker}] 第{page}页{error}，单元状态: {status}")
+            return False
+        if not page_videos and error:
+            end_of_feed = True  # 接口已经没有数据，后面的页不用再爬
+            break
+        rows.extend(page_videos)
+        queue.renew(unit['id'], worker)
+    if not queue.complete(unit['id'], worker, [row.to_dict() for row in rows]):
+        return False
+    if end_of_feed:
+        skipped = queue.skip_after(job, 'popular', unit['seq'])
+        if skipped:
+            logger.info(f"📭 [{worker}] 热门页面在第{page}页到底，跳过后续 {skipped} 个单元")
+    return True
+
+
+def run_worker(job, worker=None, batch_filter=BATCH_FILTER, cache=False, offline=False):
+    """
+    工作进程：循环领取并处理单元，直到任务的所有单元都结束
+
+    Args:
+        job: 任务名
+        worker: 工作进程名，默认为 主机名-进程号
+        batch_filter: 是否整页向量化筛选
+        cache / offline: 同两种爬虫的 --cache / --offline
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue()
+    response_cache = ResponseCache(RESPONSE_CACHE_DB) if cache or offline else None
+    buckets = []
+
+    def shared_bucket(host, rate, burst):
+        # 桶名带上任务名：同一任务的工作进程共享速率，AIMD 的调整也对所有进程生效
+        bucket = SharedTokenBucket(f"{job}|{host}", rate, burst, queue.db_path)
+        buckets.append(bucket)
+        return bucket
+
+    client = configure_default_client(response_cache, offline, bucket_factory=shared_bucket)
+    done = 0
+    try:
+        while True:
+            unit = queue.claim(job, worker)
+            if unit is None:
+                if queue.is_finished(job):
+                    break
+                time.sleep(WORK_POLL_INTERVAL)  # 剩下的单元都在其他进程手里，等租约结束或过期
+                continue
+            if process_unit(queue, job, worker, unit, client, batch_filter):
+                done += 1
+        logger.info(f"👷 [{worker}] 结束，共完成 {done} 个单元")
+        client.print_rate_summary()
+    finally:
+        queue.close()
+        for bucket in buckets:
+            bucket.close()
+        if response_cache is not None:
+            response_cache.close()
+    return done
+
+
+def merge(queue, job, output_format=OUTPUT_FORMAT, dedup=None, sort_output=SORT_OUTPUT):
+    """
+    合并进程：把所有已完成单元的结果写成最终输出
+
+    分类排行榜每个分类一个输出，与 bilibili_crawler 相同；
+    热门页面按页码顺序去重、截取目标数量，再按 BilibiliPopularCrawler 的方式排序输出。
+
+    Args:
+        queue: WorkQueue
+        job: 任务名
+        output_format: 'csv'、'parquet' 或 'sqlite'
+        dedup: 可选的持久 DedupIndex；默认只在本次合并内去重
+        sort_output: 热门页面是否按点赞率排序
+    """
+    params = queue.job_params(job)
+    if params is None:
+        logger.warning(f"❌ 任务 {job} 不存在")
+        return False
+    if not queue.is_finished(job):
+        logger.warning(f"⚠️  任务 {job} 还有未完成的单元: {queue.progress(job)}")
+        return False
+
+    # 分类排行榜只在传入持久索引时去重（与 bilibili_crawler 一致），热门页面总是去重
+    popular_dedup = dedup if dedup is not None else DedupIndex()
+    if params.get('ranking'):
+        os.makedirs(RANKING_DIR, exist_ok=True)
+        written = 0
+        # 时序库每个分类提交一次；出错时只放弃尚未提交的分类
+        with (SQLiteStatsStore() if output_format == 'sqlite' else nullcontext()) as store:
+            for payload, rows in queue.iter_results(job, 'ranking'):
+                rows = [VideoRecord.from_dict(row) for row in rows]
+                if dedup is not None:
+                    rows = [row for row in rows if dedup.add(row.bvid)]
+                if save_category(payload['name'], rows, output_format, store):
+                    written += 1
+                    if dedup is not None:
+                        dedup.persist((row.bvid for row in rows), payload['name'])
+        logger.info(f"✅ 分类排行榜: 写入 {written} 个分类")
+
+    target = params.get('popular_target')
+    if target:
+        crawler = BilibiliPopularCrawler(client=get_default_client())
+        filepath = os.path.join(POPULAR_DIR, f"B站热门-高质量-{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        partial_path = filepath + ".part"
+        count = 0
+        with StreamingCSVWriter(partial_path, VIDEO_FIELDS, encoding='utf-8') as sink:
+            for _, rows in queue.iter_results(job, 'popular'):
+                rows = [VideoRecord.from_dict(row) for row in rows if popular_dedup.add(row['bvid'])]
+                rows = rows[:target - count]
+                sink.write_rows(rows)
+                popular_dedup.persist((row.bvid for row in rows), 'popular')
+                count += len(rows)
+                if count >= target:
+                    break
+        if count:
+            stats = column_stats(partial_path, ['like_rate', 'view', 'like'])
+            sort_key = 'like_rate' if sort_output else None
+            output_path = crawler.finalize_output(partial_path, filepath, sort_key, output_format, None)
+            logger.info(f"💾 热门页面: {count} 个高质量视频已保存到 {output_path}，"
+                        f"平均点赞率 {stats['like_rate'][0]:.4f}")
+        else:
+            logger.warning("❌ 热门页面未获取到任何视频数据")
+        os.remove(partial_path)
+
+    logger.info(f"🔁 合并时丢弃重复视频 {popular_dedup.duplicates} 个")
+    for kind, payload, error in queue.failed_units(job):
+        logger.warning(f"⚠️  未完成的{kind}单元 {payload}: {error}")
+    return True
+
+
+def print_status(queue, job):
+    progress = queue.progress(job)
+    total = sum(progress.values())
+    summary = '，'.join(f"{status} {n}" for status, n in sorted(progress.items()))
+    logger.info(f"📋 任务 {job}: 共 {total} 个单元（{summary or '无'}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站高质量视频爬虫 - 分布式模式")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_job_args(p, enqueue_args=False, worker_args=False, merge_args=False):
+        p.add_argument("job", help="任务名")
+        metrics.add_arguments(p)
+        if enqueue_args:
+            p.add_argument("--ranking", action="store_true", help="爬取分类排行榜")
+            p.add_argument("--popular", type=int, default=None, metavar="N", help="爬取热门页面，目标数量N")
+            p.add_argument("--pages-per-unit", type=int, default=POPULAR_PAGES_PER_UNIT,
+                           help=f"热门页面每个单元的页数（默认 {POPULAR_PAGES_PER_UNIT}）")
+        if worker_args:
+            p.add_argument("--batch-filter", action="store_true", default=BATCH_FILTER,
+                           help="整页向量化计算点赞率和筛选")
+            p.add_argument("--cache", action="store_true", help=f"把原始API响应缓存到 {RESPONSE_CACHE_DB}")
+            p.add_argument("--offline", action="store_true", help="只从响应缓存重放，不访问网络")
+        if merge_args:
+            p.add_argument("--format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                           help=f"输出格式（默认 {OUTPUT_FORMAT}）")
+            p.add_argument("--no-sort", action="store_true", help="热门页面不按点赞率排序")
+            p.add_argument("--dedup", action="store_true",
+                           help=f"合并时使用跨运行共享的去重索引（{DEDUP_DB}）")
+
+    add_job_args(sub.add_parser("enqueue", help="协调者：创建任务并写入工作单元"), enqueue_args=True)
+    worker_parser = sub.add_parser("worker", help="工作进程：领取并处理单元")
+    add_job_args(worker_parser, worker_args=True)
+    worker_parser.add_argument("--id", default=None, help="工作进程名（默认 主机名-进程号）")
+    add_job_args(sub.add_parser("merge", help="合并进程：生成最终输出"), merge_args=True)
+    add_job_args(sub.add_parser("status", help="查看任务进度"))
+    run_parser = sub.add_parser("run", help="本机一次完成：写入单元、启动工作进程、合并")
+    add_job_args(run_parser, enqueue_args=True, worker_args=True, merge_args=True)
+    run_parser.add_argument("-n", "--workers", type=int, default=MAX_CONCURRENCY,
+                            help=f"工作进程数（默认 {MAX_CONCURRENCY}）")
+    args = parser.parse_args()
+
+    if args.command in ("enqueue", "run") and not (args.ranking or args.popular):
+        parser.error("至少指定 --ranking 或 --popular N")
+
+    server = metrics.start_from_args(args)
+    queue = WorkQueue()
+    try:
+        if args.command == "enqueue":
+            enqueue(queue, args.job, args.ranking, args.popular, args.pages_per_unit)
+        elif args.command == "worker":
+            run_worker(args.job, args.id, args.batch_filter, args.cache, args.offline)
+        elif args.command == "status":
+            print_status(queue, args.job)
+        elif args.command in ("merge", "run"):
+            if args.command == "run":
+                enqueue(queue, args.job, args.ranking, args.popular, args.pages_per_unit)
+                logger.info(f"🚀 启动 {args.workers} 个工作进程")
+                start = time.time()
+                workers = [multiprocessing.Process(
+                    target=run_worker,
+                    args=(args.job, f"worker-{i + 1}", args.batch_filter, args.cache, args.offline))
+                    for i in range(args.workers)]
+                for process in workers:
+                    process.start()
+                for process in workers:
+                    process.join()
+                logger.info(f"⏱️  工作进程全部结束，耗时 {time.time() - start:.1f} 秒")
+                print_status(queue, args.job)
+            dedup = DedupIndex(DEDUP_DB) if args.dedup else None
+            try:
+                if not merge(queue, args.job, args.format, dedup, SORT_OUTPUT and not args.no_sort):
+                    sys.exit(1)
+            finally:
+                if dedup is not None:
+                    dedup.close()
+    except ValueError as e:
+        logger.warning(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        queue.close()
+        metrics.finish_from_args(args, server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+视频详情补充
+
+功能：
+1. 筛选之后可选的一步（--enrich）：只对通过筛选的视频请求详情接口（VIDEO_DETAIL_API）
+   和标签接口（VIDEO_TAGS_API），补充分区（tid / tname）、分P数和标签，
+   并用详情中的最新统计覆盖列表页的统计、重新计算点赞率；调用方可以传入筛选函数，
+   统计更新后不再满足条件的视频从结果中移除
+2. 有界并发：最多 ENRICH_CONCURRENCY 个详情 / 标签请求同时在途；请求经过共享客户端，
+   节奏仍由每个主机的令牌桶 / 自适应限速控制，被限流时照常降速和退避
+3. 分区、分P数和标签按 bvid 缓存到 SQLite（ENRICH_CACHE_DB）：ENRICH_TTL 内补充过的视频直接使用缓存，
+   同时出现在热门和多个分类排行榜中的视频、重跑和常驻模式的每一轮都不再重复请求。
+   统计不缓存：使用缓存的视频保留列表页的统计，不会被最多 ENRICH_TTL 之前的旧统计覆盖
+4. 单个视频请求失败只记录日志，该视频保留列表页的数据，不影响整页写入
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from config import ENRICH_CACHE_DB, ENRICH_CONCURRENCY, ENRICH_TTL, VIDEO_DETAIL_API, VIDEO_TAGS_API
+from metrics import ENRICHED, span
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ('view', 'like', 'coin', 'favorite', 'share', 'reply', 'danmaku')
+CACHED_FIELDS = ('tid', 'tname', 'parts', 'tags')  # 写入缓存的补充信息，统计只来自本次请求
+SQLITE_MAX_VARIABLES = 500  # 每条 IN 查询的 bvid 数，低于旧版 SQLite 的 999 个参数上限
+
+
+def parse_details(view_data, tags_data):
+    """
+    从详情和标签接口的 data 字段提取补充信息
+
+    Args:
+        view_data: 详情接口的 data（dict）
+        tags_data: 标签接口的 data（标签列表，可以为空）
+
+    Returns:
+        dict: tid / tname / parts / tags，以及最新统计 stat
+    """
+    stat = view_data.get('stat') or {}
+    tags = [tag.get('tag_name') for tag in tags_data or ()]
+    return {
+        'tid': view_data.get('tid'),
+        'tname': view_data.get('tname') or None,
+        'parts': view_data.get('videos') or len(view_data.get('pages') or ()) or None,
+        'tags': ','.join(tag for tag in tags if tag) or None,
+        'stat': {name: stat[name] for name in STAT_FIELDS if name in stat},
+    }
+
+
+def apply_details(record, details):
+    """把补充信息写入 VideoRecord；有最新统计时覆盖统计并重新计算点赞率"""
+    record.tid = details.get('tid')
+    record.tname = details.get('tname')
+    record.parts = details.get('parts')
+    record.tags = details.get('tags')
+    stat = details.get('stat')
+    if stat:
+        for name, value in stat.items():
+            setattr(record, name, value)
+        record.like_rate = round(record.like / record.view, 4) if record.view > 0 else 0
+
+
+class EnrichmentCache:
+    """按 bvid 保存的补充结果，线程安全"""
+
+    def __init__(self, db_path=ENRICH_CACHE_DB, ttl=ENRICH_TTL):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            ttl: 补充结果的有效期（秒），过期的条目在打开时清理
+        """
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enrichment ("
+            " bvid TEXT PRIMARY KEY,"
+            " details TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute("DELETE FROM enrichment WHERE fetched_at < ?", (time.time() - ttl,))
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM enrichment").fetchone()[0]
+
+    def get_many(self, bvids, now=None):
+        """
+        读取有效期内的补充结果
+
+        Returns:
+            dict: {bvid: 补充信息}，没有缓存或已过期的 bvid 不在其中
+        """
+        now = time.time() if now is None else now
+        bvids = list(bvids)
+        found = {}
+        with self._lock:  # 旧版本写入的条目可能带有统计，读出时同样只取 CACHED_FIELDS
+            for start in range(0, len(bvids), SQLITE_MAX_VARIABLES):
+                chunk = bvids[start:start + SQLITE_MAX_VARIABLES]
+                rows = self._conn.execute(
+                    f"SELECT bvid, details FROM enrichment WHERE fetched_at >= ?"
+                    f" AND bvid IN ({', '.join('?' * len(chunk))})",
+                    (now - self.ttl, *chunk),
+                ).fetchall()
+                found.update((bvid, {name: value for name, value in json.loads(details).items()
+                                     if name in CACHED_FIELDS}) for bvid, details in rows)
+        return found
+
+    def put_many(self, items, now=None):
+        """
+        保存一批补充结果，只保存 CACHED_FIELDS（不保存统计）
+
+        Args:
+            items: {bvid: 补充信息}
+        """
+        now = time.time() if now is None else now
+        rows = [(bvid, json.dumps({name: details.get(name) for name in CACHED_FIELDS}, ensure_ascii=False), now)
+                for bvid, details in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO enrichment (bvid, details, fetched_at) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class VideoEnricher:
+    """为高质量视频补充详情，分类爬虫和热门爬虫共用，线程安全"""
+
+    def __init__(self, client, cache=None, concurrency=ENRICH_CONCURRENCY):
+        """
+        Args:
+            client: 共享的 BilibiliClient（或 IdentityScheduler）
+            cache: 可选的 EnrichmentCache；为 None 时每个视频都重新请求
+            concurrency: 同时在途的详情 / 标签请求数
+        """
+        self.client = client
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.fetched = 0  # 请求接口补充的视频数
+        self.cached = 0   # 使用缓存的视频数
+        self.failed = 0   # 请求失败、保留列表页数据的视频数
+        self.dropped = 0  # 统计更新后不再满足筛选条件、被移除的视频数
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='enrich')
+
+    def _fetch(self, path, bvid):
+        """请求一个接口，返回 data 字段；失败时记录日志并返回 None"""
+        try:
+            status_code, data = self.client.get_json(path, params={'bvid': bvid})
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"⚠️  {bvid} 详情补充失败（{path}）: {e}")
+            return None
+        if status_code != 200:
+            logger.warning(f"⚠️  {bvid} 详情补充失败（{path}）: 状态码 {status_code}")
+            return None
+        if data.get('code') != 0 or data.get('data') is None:
+            logger.warning(f"⚠️  {bvid} 详情补充失败（{path}）: code={data.get('code')}, "
+                           f"message={data.get('message')}")
+            return None
+        return data['data']
+
+    def enrich(self, records, keep=None):
+        """
+        补充一批视频，就地修改记录
+
+        有效期内缓存过的视频不再请求，只补充分区、分P数和标签，统计保留列表页的值；
+        其余视频的详情和标签请求同时提交，由线程池限制同时在途的请求数，
+        成功时统计换成详情接口的最新值。
+
+        Args:
+            records: VideoRecord 列表（一页或一个分类的高质量视频）
+            keep: 可选的筛选函数（VideoRecord -> bool）；统计被更新的记录重新判断，
+                  返回 False 的从结果中移除
+
+        Returns:
+            list: 保留的记录，顺序不变
+        """
+        if not records:
+            return []
+        with span('enrich', videos=len(records)):
+            cached = self.cache.get_many(record.bvid for record in records) if self.cache is not None else {}
+            pending = [(record,
+                        self._executor.submit(self._fetch, VIDEO_DETAIL_API, record.bvid),
+                        self._executor.submit(self._fetch, VIDEO_TAGS_API, record.bvid))
+                       for record in records if record.bvid not in cached]
+            fetched = {}
+            for record, view_future, tags_future in pending:
+                view_data, tags_data = view_future.result(), tags_future.result()
+                if view_data is None or tags_data is None:
+                    continue
+                fetched[record.bvid] = parse_details(view_data, tags_data)
+            if fetched and self.cache is not None:
+                self.cache.put_many(fetched)
+
+            kept = []
+            for record in records:
+                details = cached.get(record.bvid) or fetched.get(record.bvid)
+                if details is not None:
+                    apply_details(record, details)
+                if keep is not None and record.bvid in fetched and not keep(record):
+                    continue
+                kept.append(record)
+
+        failed = len(pending) - len(fetched)
+        dropped = len(records) - len(kept)
+        ENRICHED.inc(len(fetched), result='fetched')
+        ENRICHED.inc(len(cached), result='cached')
+        ENRICHED.inc(failed, result='failed')
+        ENRICHED.inc(dropped, result='dropped')
+        with self._lock:
+            self.fetched += len(fetched)
+            self.cached += len(cached)
+            self.failed += failed
+            self.dropped += dropped
+        return kept
+
+    def print_summary(self):
+        """打印补充统计"""
+        logger.info(f"🏷️  详情补充: 请求 {self.fetched} 个视频，使用缓存 {self.cached} 个，失败 {self.failed} 个，"
+                    f"按最新统计不再满足条件 {self.dropped} 个")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
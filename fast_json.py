@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+API 响应的 JSON 解码
+
+功能：
+1. 可选的快速解码后端：msgspec 或 orjson，都没有安装时使用标准库 json，结果都是普通 dict / list
+2. 使用 msgspec 时，热门、排行榜和分区列表接口按精简的 schema 解码：视频只保留
+   bvid / title / owner.name / stat / duration / pubdate / pic / desc，
+   rcmd_reason、owner.face、dimension 等用不到的字段在解码时直接跳过，不创建对象
+3. 响应结构与 schema 不一致（接口改版、字段类型变化）时回退到完整解码，不影响爬取
+4. 解码失败统一抛出 ValueError，与 requests 的 response.json() 一致
+5. msgspec / orjson 为可选依赖，第一次解码时才导入，不增加命令行的启动时间
+6. 命令行：对保存的原始页面或响应缓存比较各后端的解码速度
+
+用法：
+    python fast_json.py raw_pages/*.json
+    python fast_json.py --cache --rounds 20
+    python fast_json.py --synthetic 200
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import time
+from typing import List, Optional, TypedDict
+
+from config import JSON_BACKEND, POPULAR_API, RANKING_API, REGION_HOT_API, REGION_NEW_API, RESPONSE_CACHE_DB
+
+BACKENDS = ('msgspec', 'orjson', 'json')
+VIDEO_LIST_PATHS = (POPULAR_API, RANKING_API)  # data.list 结构的接口
+REGION_FEED_PATHS = (REGION_HOT_API, REGION_NEW_API)  # data.archives 结构的接口
+
+
+class Owner(TypedDict, total=False):
+    name: str
+
+
+class Stat(TypedDict, total=False):
+    view: int
+    like: int
+    coin: int
+    favorite: int
+    share: int
+    reply: int
+    danmaku: int
+
+
+class Video(TypedDict, total=False):
+    bvid: str
+    title: str
+    owner: Owner
+    stat: Stat
+    duration: int
+    pubdate: int
+    pic: str
+    desc: str
+
+
+class VideoListData(TypedDict, total=False):
+    list: Optional[List[Video]]
+    no_more: bool
+
+
+class VideoListResponse(TypedDict, total=False):
+    """热门和排行榜接口的响应，只包含爬虫读取的字段"""
+    code: int
+    message: str
+    data: Optional[VideoListData]
+
+
+class RegionFeedData(TypedDict, total=False):
+    archives: Optional[List[Video]]
+
+
+class RegionFeedResponse(TypedDict, total=False):
+    """分区列表接口的响应，只包含爬虫读取的字段"""
+    code: int
+    message: str
+    data: Optional[RegionFeedData]
+
+
+def available_backends():
+    """已安装的后端，按速度从快到慢"""
+    return [name for name in BACKENDS if name == 'json' or importlib.util.find_spec(name) is not None]
+
+
+def resolve_backend(backend=JSON_BACKEND):
+    """
+    把配置的后端名解析为实际使用的后端
+
+    Args:
+        backend: 'auto'（第一个已安装的后端）、'msgspec'、'orjson' 或 'json'
+
+    Raises:
+        ValueError: 后端名无效
+        RuntimeError: 指定的后端没有安装
+    """
+    if backend == 'auto':
+        return available_backends()[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的 JSON 后端: {backend}（可选 auto、{'、'.join(BACKENDS)}）")
+    if backend not in available_backends():
+        raise RuntimeError(f"JSON 后端 {backend} 需要安装: pip install {backend}")
+    return backend
+
+
+class JSONDecoder:
+    """按后端和接口选择解码方式，线程安全"""
+
+    def __init__(self, backend=JSON_BACKEND, typed=True):
+        """
+        Args:
+            backend: 见 resolve_backend
+            typed: 使用 msgspec 时，热门、排行榜和分区列表接口是否按精简 schema 解码
+        """
+        self.backend = resolve_backend(backend)
+        self.typed = typed and self.backend == 'msgspec'
+        self.fallbacks = 0  # 与 schema 不一致、回退到完整解码的次数
+        if self.backend == 'msgspec':
+            self._msgspec = importlib.import_module('msgspec')
+            self._loads = self._msgspec.json.Decoder().decode
+            video_list = self._msgspec.json.Decoder(VideoListResponse).decode
+            region_feed = self._msgspec.json.Decoder(RegionFeedResponse).decode
+            self._typed_decoders = {**dict.fromkeys(VIDEO_LIST_PATHS, video_list),
+                                    **dict.fromkeys(REGION_FEED_PATHS, region_feed)}
+        elif self.backend == 'orjson':
+            self._loads = importlib.import_module('orjson').loads
+        else:
+            self._loads = json.loads
+
+    def decode(self, body, path=None):
+        """
+        解码一个响应正文
+
+        Args:
+            body: 响应正文（bytes 或 str）
+            path: 请求的 API 路径，热门、排行榜和分区列表接口使用精简 schema
+
+        Returns:
+            dict: 解码结果
+
+        Raises:
+            ValueError: 正文不是合法的 JSON
+        """
+        if self.backend != 'msgspec':
+            return self._loads(body)  # orjson.JSONDecodeError / json.JSONDecodeError 都是 ValueError
+        try:
+            if self.typed and path in self._typed_decoders:
+                try:
+                    return self._typed_decoders[path](body)
+                except self._msgspec.ValidationError:
+                    self.fallbacks += 1
+            return self._loads(body)
+        except self._msgspec.DecodeError as e:
+            raise ValueError(f"JSON解析失败: {e}") from None
+
+
+_default_decoder = None
+
+
+def decode(body, path=None):
+    """使用配置的后端（JSON_BACKEND）解码，见 JSONDecoder.decode"""
+    global _default_decoder
+    if _default_decoder is None:
+        _default_decoder = JSONDecoder()
+    return _default_decoder.decode(body, path)
+
+
+def load_recorded_pages(paths=None, cache_db=None):
+    """
+    读取保存的原始响应
+
+    Args:
+        paths: 原始 API 响应 JSON 文件
+        cache_db: 响应缓存（ResponseCache）的路径，读取其中热门、排行榜和分区列表接口的响应
+
+    Returns:
+        list: [(API路径, 正文bytes)]
+    """
+    pages = []
+    for path in paths or ():
+        with open(path, 'rb') as f:
+            pages.append((POPULAR_API, f.read()))
+    if cache_db:
+        from response_cache import ResponseCache
+
+        cache = ResponseCache(cache_db)
+        try:
+            for key, body in cache.iter_bodies():
+                api = next((p for p in VIDEO_LIST_PATHS + REGION_FEED_PATHS if p in key), None)
+                if api is not None:
+                    pages.append((api, body))
+        finally:
+            cache.close()
+    return pages
+
+
+def synthetic_pages(count, page_size=20):
+    """用模拟服务器的视频生成器构造热门接口页面（字段结构与真实接口一致）"""
+    import random
+    from mock_server import make_video
+
+    pages = []
+    for page in range(1, count + 1):
+        rng = random.Random(f"synthetic-{page}")
+        body = {'code': 0, 'message': '0', 'ttl': 1,
+                'data': {'list': [make_video(rng, page, i) for i in range(page_size)], 'no_more': False}}
+        pages.append((POPULAR_API, json.dumps(body, ensure_ascii=False).encode('utf-8')))
+    return pages
+
+
+def benchmark_decoders(pages, rounds=10):
+    """
+    比较各后端的解码速度
+
+    Returns:
+        list: 每个后端一个结果字典（后端、是否精简 schema、页/秒、MB/秒、相对标准库的加速比）
+    """
+    total_bytes = sum(len(body) for _, body in pages)
+    variants = [('json', False), ('orjson', False), ('msgspec', False), ('msgspec', True)]
+    results = []
+    for backend, typed in variants:
+        if backend not in available_backends():
+            continue
+        decoder = JSONDecoder(backend, typed=typed)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path, body in pages:
+                decoder.decode(body, path)
+        elapsed = time.perf_counter() - start
+        results.append({
+            'backend': backend + (' (schema)' if typed else ''),
+            'pages_per_sec': len(pages) * rounds / elapsed,
+            'mb_per_sec': total_bytes * rounds / elapsed / 1024 / 1024,
+            'fallbacks': decoder.fallbacks,
+        })
+    base = results[0]['pages_per_sec']
+    for result in results:
+        result['speedup'] = result['pages_per_sec'] / base
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较各 JSON 后端解码保存的原始页面的速度")
+    parser.add_argument("paths", nargs="*", help="原始 API 响应 JSON 文件")
+    parser.add_argument("--cache", nargs="?", const=RESPONSE_CACHE_DB, default=None, metavar="DB",
+                        help=f"同时读取响应缓存中的热门、排行榜和分区列表响应（默认 {RESPONSE_CACHE_DB}）")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="没有保存的页面时，用模拟服务器生成 N 页热门数据（默认 100）")
+    parser.add_argument("--rounds", type=int, default=10, help="每个后端重复解码的轮数（默认 10）")
+    args = parser.parse_args()
+
+    pages = load_recorded_pages(args.paths, args.cache)
+    if args.synthetic or not pages:
+        pages += synthetic_pages(args.synthetic or 100)
+    total_bytes = sum(len(body) for _, body in pages)
+    print(f"📦 共 {len(pages)} 页，{total_bytes / 1024 / 1024:.1f} MB，每个后端解码 {args.rounds} 轮"
+          f"（已安装: {', '.join(available_backends())}，JSON_BACKEND={JSON_BACKEND}）")
+
+    # 表头用 ASCII，避免中文宽度导致列错位
+    header = f"{'backend':<20}{'pages/s':>10}{'MB/s':>9}{'speedup':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in benchmark_decoders(pages, args.rounds):
+        print(f"{r['backend']:<20}{r['pages_per_sec']:>10.0f}{r['mb_per_sec']:>9.1f}{r['speedup']:>8.2f}x")
+        if r['fallbacks']:
+            print(f"{'':<20}  与 schema 不一致、回退完整解码 {r['fallbacks']} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+多出口 / 多身份请求调度
+
+功能：
+1. 每个身份（出口代理 + 请求头配置）对应一个独立的 BilibiliClient：独立的连接池、cookie 和限速器
+2. 每次请求选择当前可用、等待时间最短的身份，把请求量分摊到多个出口
+3. 被限流（-352 / 412 / 429）或代理连接失败的身份进入隔离期，期间不再分配请求；
+   连续出问题时隔离时间翻倍，恢复正常后清零
+4. 接口与 BilibiliClient 一致（get_json / offline / adaptive / print_rate_summary），两种爬虫直接使用
+"""
+
+import logging
+import threading
+import time
+
+import requests
+
+from config import (IDENTITY_QUARANTINE_SECONDS, IDENTITY_QUARANTINE_MAX, THROTTLE_STATUS_CODES,
+                    THROTTLE_API_CODES)
+from metrics import SLEEP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Identity:
+    """一个请求身份及其健康状态"""
+
+    def __init__(self, name, client):
+        """
+        Args:
+            name: 身份名称，用于日志和统计
+            client: 该身份专用的 BilibiliClient
+        """
+        self.name = name
+        self.client = client
+        self.successes = 0
+        self.throttles = 0
+        self.errors = 0
+        self.consecutive = 0        # 连续被限流或出错的次数
+        self.quarantined_until = 0.0
+        self.in_flight = 0
+
+    def is_healthy(self, now):
+        return now >= self.quarantined_until
+
+
+class IdentityScheduler:
+    """在多个身份之间分配请求的调度器"""
+
+    def __init__(self, identities, quarantine_seconds=IDENTITY_QUARANTINE_SECONDS,
+                 quarantine_max=IDENTITY_QUARANTINE_MAX):
+        """
+        Args:
+            identities: Identity 列表，名称不能重复
+            quarantine_seconds: 第一次被限流时的隔离时间（秒）
+            quarantine_max: 隔离时间上限（秒）
+
+        Raises:
+            ValueError: 没有身份或身份名称重复
+        """
+        if not identities:
+            raise ValueError("至少需要一个身份")
+        names = [identity.name for identity in identities]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"身份名称重复: {', '.join(duplicates)}"
+                             f"（IDENTITIES 中每个身份需要不同的 name 或 proxy）")
+        self.identities = list(identities)
+        self.quarantine_seconds = quarantine_seconds
+        self.quarantine_max = quarantine_max
+        self._lock = threading.Lock()
+
+    @property
+    def offline(self):
+        return self.identities[0].client.offline
+
+    @property
+    def adaptive(self):
+        """所有身份都由自适应限速器控制节奏时为 True"""
+        return all(identity.client.adaptive for identity in self.identities)
+
+    def _pick(self, path, exclude):
+        """
+        选出一个健康的身份，优先本次请求还没试过的（exclude 为 Identity 对象的集合）；
+        全部被隔离时等到最早的一个恢复
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                healthy = [i for i in self.identities if i.is_healthy(now)]
+                candidates = [i for i in healthy if i not in exclude] or healthy
+                if candidates:
+                    identity = min(candidates, key=lambda i: (i.client.wait_time(path), i.in_flight))
+                    identity.in_flight += 1
+                    return identity
+                wait = min(i.quarantined_until for i in self.identities) - now
+            logger.warning(f"⏸️  所有身份都在隔离中，等待 {wait:.1f} 秒")
+            time.sleep(max(0.0, wait))
+            SLEEP_SECONDS.inc(max(0.0, wait), reason='quarantine')
+
+    def _quarantine(self, identity, reason, throttled):
+        """隔离身份并计入被限流（throttled=True）或请求失败的次数"""
+        with self._lock:
+            if throttled:
+                identity.throttles += 1
+            else:
+                identity.errors += 1
+            identity.consecutive += 1
+            duration = min(self.quarantine_max,
+                           self.quarantine_seconds * 2 ** (identity.consecutive - 1))
+            identity.quarantined_until = time.monotonic() + duration
+        logger.warning(f"🚫 身份 {identity.name} {reason}，隔离 {duration:.0f} 秒")
+
+    def get_json(self, path, params=None):
+        """
+        选择身份发起请求；被限流或代理失败时换下一个身份重试，每个身份最多尝试一次
+
+        Returns / Raises: 同 BilibiliClient.get_json
+        """
+        tried = set()
+        for attempt in range(len(self.identities)):
+            identity = self._pick(path, tried)
+            tried.add(identity)
+            try:
+                status_code, data = identity.client.get_json(path, params)
+            except requests.exceptions.RequestException as e:
+                self._quarantine(identity, f"请求失败（{type(e).__name__}）", throttled=False)
+                if attempt == len(self.identities) - 1:
+                    raise
+                continue
+            finally:
+                with self._lock:
+                    identity.in_flight -= 1
+
+            throttled = (status_code in THROTTLE_STATUS_CODES
+                         or (data is not None and data.get('code') in THROTTLE_API_CODES))
+            if not throttled:
+                with self._lock:
+                    identity.successes += 1
+                    identity.consecutive = 0
+                return status_code, data
+            reason = f"HTTP {status_code}" if data is None else f"code {data.get('code')}"
+            self._quarantine(identity, f"被限流（{reason}）", throttled=True)
+        return status_code, data
+
+    def rate_metrics(self):
+        """
+        每个身份的健康状态和限速统计
+
+        Returns:
+            dict: {身份名: {'healthy', 'successes', 'throttles', 'errors', 'hosts'}}
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {i.name: {'healthy': i.is_healthy(now),
+                             'successes': i.successes,
+                             'throttles': i.throttles,
+                             'errors': i.errors,
+                             'hosts': i.client.rate_metrics()}
+                    for i in self.identities}
+
+    def print_rate_summary(self):
+        """打印每个身份的请求统计"""
+        for name, m in self.rate_metrics().items():
+            state = '正常' if m['healthy'] else '隔离中'
+            logger.info(f"🪪 身份 {name}（{state}）: 成功 {m['successes']} 次，被限流 {m['throttles']} 次，"
+                        f"请求失败 {m['errors']} 次")
+            for host, hm in m['hosts'].items():
+                logger.info(f"    ⏱️  {host}: 当前速率 {hm['rate']:.2f} 次/秒，退避 {hm['backoffs']} 次")
@@ -0,0 +1,223 @@
+"""
+增量爬取状态
+
+功能：
+1. SQLite 中按 来源（分类名或 popular）+ bvid 记录最近一次的数据行、统计、发布时间、
+   首次 / 最近出现时间和播放增速
+2. 判断视频是否值得刷新：新出现、发布不久（INCREMENTAL_NEW_HOURS 内）或
+   播放增速超过 INCREMENTAL_HOT_VELOCITY
+3. 分类排行榜按分类安排下次刷新时间：榜单上有新视频或热视频时按最短间隔刷新，
+   没有变化时间隔翻倍，直到 INCREMENTAL_MAX_INTERVAL
+4. 热门页面按热度排序，新视频和上升快的视频集中在前几页：
+   连续 INCREMENTAL_STALE_PAGES 页没有新视频和热视频时即可停止翻页
+5. 合并结果：本次刷新的行覆盖旧行，没有刷新的行保留，超过 INCREMENTAL_RETENTION_DAYS
+   没有再出现的视频移除
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import (INCREMENTAL_DB, INCREMENTAL_HOT_VELOCITY, INCREMENTAL_MAX_INTERVAL,
+                    INCREMENTAL_MIN_INTERVAL, INCREMENTAL_NEW_HOURS, INCREMENTAL_RETENTION_DAYS)
+from video_record import VideoRecord
+
+INCREMENTAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_state (
+    source      TEXT NOT NULL,
+    bvid        TEXT NOT NULL,
+    view        INTEGER,
+    "like"      INTEGER,
+    pubdate     INTEGER,
+    velocity    REAL,
+    first_seen  REAL NOT NULL,
+    last_seen   REAL NOT NULL,
+    row         TEXT NOT NULL,
+    PRIMARY KEY (source, bvid)
+);
+CREATE TABLE IF NOT EXISTS source_state (
+    source       TEXT PRIMARY KEY,
+    last_fetched REAL NOT NULL,
+    interval     REAL NOT NULL,
+    next_due     REAL NOT NULL
+);
+"""
+
+
+class ObserveResult:
+    """一批数据行与上次记录相比的变化"""
+
+    __slots__ = ('new', 'hot', 'stale')
+
+    def __init__(self):
+        self.new = 0    # 第一次出现的视频
+        self.hot = 0    # 发布不久或播放增速超过阈值的已知视频
+        self.stale = 0  # 其余已知视频
+
+    @property
+    def changed(self):
+        return bool(self.new or self.hot)
+
+
+class IncrementalState:
+    """增量爬取的持久状态，线程安全"""
+
+    def __init__(self, db_path=INCREMENTAL_DB, new_hours=INCREMENTAL_NEW_HOURS,
+                 hot_velocity=INCREMENTAL_HOT_VELOCITY, min_interval=INCREMENTAL_MIN_INTERVAL,
+                 max_interval=INCREMENTAL_MAX_INTERVAL, retention_days=INCREMENTAL_RETENTION_DAYS):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            new_hours: 发布不超过该小时数的视频视为热视频
+            hot_velocity: 播放增速（次/小时）阈值
+            min_interval / max_interval: 分类排行榜的刷新间隔范围（秒）
+            retention_days: 合并结果中保留多久没有再出现的视频
+        """
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.new_hours = new_hours
+        self.hot_velocity = hot_velocity
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(INCREMENTAL_SCHEMA)
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM video_state").fetchone()[0]
+
+    def is_due(self, source, now=None):
+        """该来源是否到了刷新时间；从没爬过的来源总是需要刷新"""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute("SELECT next_due FROM source_state WHERE source = ?",
+                                     (source,)).fetchone()
+        return row is None or now >= row[0]
+
+    def next_due(self, source):
+        """该来源的下次刷新时间（时间戳），从没爬过时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT next_due FROM source_state WHERE source = ?",
+                                     (source,)).fetchone()
+        return row[0] if row else None
+
+    def _is_hot(self, pubdate, velocity, now):
+        if pubdate and now - pubdate < self.new_hours * 3600:
+            return True
+        return velocity is not None and velocity >= self.hot_velocity
+
+    def observe(self, source, rows, now=None):
+        """
+        记录一批刷新后的数据行，并与上次的统计比较
+
+        Args:
+            source: 来源，分类名或 'popular'
+            rows: VideoRecord 列表
+
+        Returns:
+            ObserveResult: 新视频 / 热视频 / 无变化视频的数量
+        """
+        now = time.time() if now is None else now
+        result = ObserveResult()
+        with self._lock:
+            for row in rows:
+                bvid = row.bvid
+                if not bvid:
+                    continue
+                view = row.view or 0
+                pubdate = row.pubdate or None
+                previous = self._conn.execute(
+                    "SELECT view, pubdate, last_seen FROM video_state WHERE source = ? AND bvid = ?",
+                    (source, bvid),
+                ).fetchone()
+                if previous is None:
+                    result.new += 1
+                    # 第一次见到：有发布时间时用发布以来的平均增速
+                    velocity = view / max(1.0, (now - pubdate) / 3600) if pubdate else None
+                    self._conn.execute(
+                        'INSERT INTO video_state (source, bvid, view, "like", pubdate, velocity,'
+                        ' first_seen, last_seen, row) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (source, bvid, view, row.like, pubdate, velocity, now, now,
+                         json.dumps(row.to_dict(), ensure_ascii=False)),
+                    )
+                    continue
+                last_view, last_pubdate, last_seen = previous
+                pubdate = pubdate or last_pubdate
+                hours = max(1 / 60, (now - last_seen) / 3600)
+                velocity = max(0, view - (last_view or 0)) / hours
+                if self._is_hot(pubdate, velocity, now):
+                    result.hot += 1
+                else:
+                    result.stale += 1
+                self._conn.execute(
+                    'UPDATE video_state SET view = ?, "like" = ?, pubdate = ?, velocity = ?,'
+                    ' last_seen = ?, row = ? WHERE source = ? AND bvid = ?',
+                    (view, row.like, pubdate, velocity, now,
+                     json.dumps(row.to_dict(), ensure_ascii=False), source, bvid),
+                )
+            self._conn.commit()
+        return result
+
+    def schedule(self, source, changed, now=None):
+        """
+        安排来源的下次刷新：有变化时回到最短间隔，没有变化时间隔翻倍
+
+        Returns:
+            float: 新的刷新间隔（秒）
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute("SELECT interval FROM source_state WHERE source = ?",
+                                     (source,)).fetchone()
+            if changed or row is None:
+                interval = self.min_interval
+            else:
+                interval = min(self.max_interval, row[0] * 2)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO source_state (source, last_fetched, interval, next_due)"
+                " VALUES (?, ?, ?, ?)",
+                (source, now, interval, now + interval),
+            )
+            self._conn.commit()
+        return interval
+
+    def prune(self, source, now=None):
+        """
+        移除超过保留期没有再出现的视频
+
+        Returns:
+            int: 移除的行数
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM video_state WHERE source = ? AND last_seen < ?",
+                (source, now - self.retention_days * 86400),
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def iter_rows(self, source):
+        """
+        合并后的数据行：每个视频最近一次刷新的行，按首次出现顺序
+
+        Yields:
+            VideoRecord: 数据行
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row FROM video_state WHERE source = ? ORDER BY first_seen, rowid", (source,)
+            ).fetchall()
+        for (row,) in rows:
+            yield VideoRecord.from_dict(json.loads(row))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
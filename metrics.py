@@ -0,0 +1,288 @@
+"""
+运行指标与日志
+
+功能：
+1. 计数器（Counter）与直方图（Histogram）：请求数、HTTP状态码、API返回码、响应字节数、
+   接受/丢弃的视频数、各阶段耗时
+2. span(stage)：记录 请求 → 解析 → 筛选 → 写入 各阶段的耗时，保留最近的 span 作为简单的链路追踪
+3. 导出：Prometheus 文本格式（可选 HTTP 端点 /metrics）或 JSON 运行报告
+4. setup_logging：统一日志级别；默认输出与原来的 print 相同，--log-json 时每行一个 JSON 对象
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 秒级耗时的直方图分桶
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+
+class Counter:
+    """按标签累加的计数器"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram:
+    """按标签分组的累积直方图"""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # 标签 -> [各分桶计数, 总和, 总数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+
+class MetricsRegistry:
+    """一次运行的全部指标"""
+
+    def __init__(self, max_spans=1000):
+        self.started_at = time.time()
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.spans = deque(maxlen=max_spans)  # 最近的 span：{'stage', 'start', 'duration', ...}
+        self.stage_seconds = self.histogram('bili_stage_seconds', '各阶段耗时（秒）')
+
+    def counter(self, name, help_text=''):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets)
+            return self._metrics[name]
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        """
+        记录一个阶段的耗时
+
+        Args:
+            stage: 阶段名，如 'fetch'、'decode'、'filter'、'write'
+            attrs: 附加在 span 上的属性（如页码、分类名），不作为指标标签
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.stage_seconds.observe(duration, stage=stage)
+            self.spans.append({'stage': stage, 'start': round(time.time() - duration, 6),
+                               'duration': round(duration, 6), **attrs})
+
+    def to_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} counter")
+                for key, value in sorted(metric.samples().items()):
+                    lines.append(f"{metric.name}{_format_labels(key)} {value}")
+            else:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} histogram")
+                for key, (counts, total, count) in sorted(metric.samples().items()):
+                    for bound, bucket_count in zip(metric.buckets, counts):
+                        lines.append(f"{metric.name}_bucket{_format_labels(key, [('le', bound)])} {bucket_count}")
+                    lines.append(f"{metric.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+                    lines.append(f"{metric.name}_sum{_format_labels(key)} {total}")
+                    lines.append(f"{metric.name}_count{_format_labels(key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        """
+        JSON 运行报告
+
+        Returns:
+            dict: 计数器取值、直方图汇总（次数/总和/平均）和最近的 span
+        """
+        counters = {}
+        histograms = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                counters[metric.name] = [{'labels': dict(key), 'value': value}
+                                         for key, value in sorted(metric.samples().items())]
+            else:
+                histograms[metric.name] = [{'labels': dict(key), 'count': count, 'sum': round(total, 6),
+                                            'mean': round(total / count, 6) if count else 0}
+                                           for key, (_, total, count) in sorted(metric.samples().items())]
+        return {
+            'started_at': self.started_at,
+            'elapsed': round(time.time() - self.started_at, 3),
+            'counters': counters,
+            'histograms': histograms,
+            'spans': list(self.spans),
+        }
+
+    def write_report(self, path):
+        """把 JSON 运行报告写入文件"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        在后台线程启动 Prometheus 端点 http://host:port/metrics
+
+        Returns:
+            ThreadingHTTPServer: 调用 shutdown() 停止
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# 进程内共享的指标
+REGISTRY = MetricsRegistry()
+span = REGISTRY.span
+
+REQUESTS = REGISTRY.counter('bili_requests_total', 'HTTP请求数，按状态码')
+API_CODES = REGISTRY.counter('bili_api_codes_total', 'API返回码')
+RESPONSE_BYTES = REGISTRY.counter('bili_response_bytes_total', '响应正文字节数')
+CACHE_HITS = REGISTRY.counter('bili_cache_hits_total', '响应缓存命中数')
+THROTTLES = REGISTRY.counter('bili_throttles_total', '被限流次数，按原因')
+ROWS = REGISTRY.counter('bili_rows_total', '处理的视频数，按结果（accepted / rejected / duplicate）')
+ENRICHED = REGISTRY.counter('bili_enriched_total', '详情补充的视频数，按结果（fetched / cached / failed / dropped）')
+SLEEP_SECONDS = REGISTRY.counter('bili_sleep_seconds_total', '主动等待的秒数（随机延时、令牌桶、退避）')
+REQUEST_SECONDS = REGISTRY.histogram('bili_request_seconds', '单次HTTP请求耗时（秒）')
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，extra 中的字段一并输出"""
+
+    _RESERVED = set(vars(logging.makeLogRecord({})))
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage().strip(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level='INFO', json_format=False):
+    """
+    配置根日志
+
+    Args:
+        level: 日志级别名，如 'DEBUG'、'INFO'、'WARNING'
+        json_format: True 时每行输出一个 JSON 对象，否则只输出消息本身（与原来的 print 一致）
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONFormatter() if json_format else logging.Formatter('%(message)s'))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def add_arguments(parser):
+    """给命令行加上日志和指标相关的参数"""
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="日志级别（默认 INFO）")
+    parser.add_argument("--log-json", action="store_true", help="日志每行输出一个 JSON 对象")
+    parser.add_argument("--metrics-json", default=None, metavar="PATH",
+                        help="结束时把指标和各阶段耗时写入 JSON 运行报告")
+    parser.add_argument("--metrics-port", type=int, default=None, metavar="PORT",
+                        help="运行期间在 127.0.0.1:PORT/metrics 提供 Prometheus 指标")
+
+
+def start_from_args(args):
+    """按命令行参数配置日志并启动指标端点，返回端点服务器（未启用时为 None）"""
+    setup_logging(args.log_level, args.log_json)
+    if args.metrics_port:
+        server = REGISTRY.serve(args.metrics_port)
+        logging.getLogger(__name__).info(f"📡 Prometheus 指标: http://127.0.0.1:{args.metrics_port}/metrics")
+        return server
+    return None
+
+
+def finish_from_args(args, server=None):
+    """运行结束：写 JSON 报告，关闭指标端点"""
+    if args.metrics_json:
+        REGISTRY.write_report(args.metrics_json)
+        logging.getLogger(__name__).info(f"📊 运行报告已写入 {args.metrics_json}")
+    if server is not None:
+        server.shutdown()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+本地模拟B站API服务器
+
+功能：
+1. 实现 /x/web-interface/popular 和 /x/web-interface/ranking/v2，以及发放 cookie 的首页；
+   列表中出现过的视频可以用 /x/web-interface/view 和 /x/tag/archive/tags 查询详情和标签；
+   分区列表 /x/web-interface/newlist（最新投稿）和 /x/web-interface/dynamic/region（近期热门）
+   按 rid 翻页，两个列表来自同一分区的视频，热门列表是其中一半视频打乱后的顺序
+2. 按页码 / 分类 tid 用固定种子生成合成视频数据，同样的参数每次返回同样的内容
+3. 可配置每页视频数、页数、响应延迟及抖动、HTTP错误率和 -352 风控注入率
+4. 用于 benchmark.py 和本地调试：不访问 api.bilibili.com，也不用等待真实的请求间隔
+
+用法：
+    python mock_server.py --port 8000 --latency 50 --risk-rate 0.05
+    # 另一个终端：把 config.py 中的 BASE_URL / HOMEPAGE_URL 指向 http://127.0.0.1:8000
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config import POPULAR_API, RANKING_API, REGION_HOT_API, REGION_NEW_API, VIDEO_DETAIL_API, VIDEO_TAGS_API
+
+RANKING_SIZE = 100  # 排行榜每个分类返回的视频数，与真实接口一致
+REGION_PAGE_SIZE = 50  # 分区列表的默认每页视频数
+ZONES = [(36, '知识'), (188, '科技'), (160, '生活'), (4, '游戏'), (3, '音乐')]  # 按 aid 轮流分配的分区
+TAG_NAMES = ['学习', '科普', '干货', '教程', '日常', '数码', '测评', '翻唱', '实况', '搞笑', '记录', '原创']
+
+
+def make_video(rng, seed, index):
+    """
+    生成一个与API字段结构一致的合成视频
+
+    点赞率在 0.01 ~ 0.3 之间均匀分布，大约三分之二的视频高于默认阈值 0.1。
+    除爬虫读取的字段外，也带上真实接口返回的 rights / dimension / rcmd_reason 等字段，
+    解码和传输的开销与真实页面接近；这些字段由 aid 推出，不消耗随机数。
+    """
+    view = rng.randint(1_000, 5_000_000)
+    like = int(view * rng.uniform(0.01, 0.3))
+    aid = seed * 100_000 + index
+    bvid = f"BVmock{seed}x{index}"
+    pubdate = 1_700_000_000 + aid % 10_000_000
+    tid, tname = ZONES[aid % len(ZONES)]
+    return {
+        'aid': aid,
+        'videos': 1 + aid % 3,
+        'tid': tid,
+        'tname': tname,
+        'copyright': 1,
+        'bvid': bvid,
+        'title': f"模拟视频 {seed}-{index}",
+        'pic': f"https://i0.hdslb.com/bfs/archive/{aid}.jpg",
+        'pubdate': pubdate,
+        'ctime': pubdate - 600,
+        'desc': "本地模拟服务器生成的视频简介 " * 3,
+        'state': 0,
+        'duration': rng.randint(30, 3600),
+        'rights': {name: 0 for name in ('bp', 'elec', 'download', 'movie', 'pay', 'hd5', 'no_reprint',
+                                        'autoplay', 'ugc_pay', 'is_cooperation', 'ugc_pay_preview',
+                                        'no_background', 'arc_pay', 'pay_free_watch')},
+        'owner': {'mid': rng.randint(1, 10**9), 'name': f"UP主{index % 97}",
+                  'face': f"https://i1.hdslb.com/bfs/face/{aid:x}{'0' * 24}.jpg"},
+        'stat': {
+            'aid': aid,
+            'view': view,
+            'like': like,
+            'coin': int(like * rng.uniform(0.05, 0.5)),
+            'favorite': int(like * rng.uniform(0.05, 0.6)),
+            'share': int(like * rng.uniform(0.01, 0.1)),
+            'reply': int(like * rng.uniform(0.01, 0.1)),
+            'danmaku': int(like * rng.uniform(0.01, 0.2)),
+            'now_rank': 0,
+            'his_rank': 0,
+            'dislike': 0,
+            'vt': 0,
+            'vv': 0,
+        },
+        'dynamic': '',
+        'cid': aid * 10 + 1,
+        'dimension': {'width': 1920, 'height': 1080, 'rotate': 0},
+        'short_link_v2': f"https://b23.tv/{bvid}",
+        'first_frame': f"https://i0.hdslb.com/bfs/storyff/{aid:x}_firsti.jpg",
+        'pub_location': '上海',
+        'season_type': 0,
+        'is_ogv': False,
+        'ogv_info': None,
+        'rcmd_reason': {'content': '百万播放' if view >= 1_000_000 else '', 'corner_mark': 0},
+        'enable_vt': 0,
+    }
+
+
+def make_detail(video):
+    """
+    列表中的视频对应的详情：分P列表和比列表稍新的统计（播放、点赞等各增长约 2%）
+    """
+    detail = dict(video)
+    detail['stat'] = dict(video['stat'])
+    for name in ('view', 'like', 'coin', 'favorite', 'share', 'reply', 'danmaku'):
+        detail['stat'][name] += detail['stat'][name] // 50
+    detail['pages'] = [{'cid': video['cid'] + part, 'page': part + 1, 'part': f"P{part + 1}",
+                        'duration': video['duration'] // video['videos'], 'dimension': video['dimension']}
+                       for part in range(video['videos'])]
+    return detail
+
+
+def make_tags(video):
+    """视频的标签列表，由 aid 决定，不消耗随机数"""
+    aid = video['aid']
+    indexes = [(aid + step * 5) % len(TAG_NAMES) for step in range(aid % 4)]
+    tags = [{'tag_id': video['tid'], 'tag_name': video['tname']}]
+    tags += [{'tag_id': 1000 + index, 'tag_name': TAG_NAMES[index]} for index in dict.fromkeys(indexes)]
+    return [dict(tag, cover='', likes=0, hates=0, attribute=0) for tag in tags]
+
+
+class MockBilibiliServer:
+    """在后台线程运行的模拟API服务器"""
+
+    def __init__(self, host='127.0.0.1', port=0, page_size=20, pages=50, latency=0.0, jitter=0.0,
+                 error_rate=0.0, risk_rate=0.0, seed=0, region_videos=5000):
+        """
+        Args:
+            host / port: 监听地址，port=0 时自动分配
+            page_size: 热门接口每页的视频数
+            pages: 热门接口的总页数，之后返回空列表和 no_more
+            latency: 每个请求的基础延迟（秒）
+            jitter: 在基础延迟上附加 0 ~ jitter 秒的随机延迟
+            error_rate: 返回 HTTP 500 的概率
+            risk_rate: 返回 code=-352（风控）的概率
+            seed: 随机种子，决定视频数据和错误注入序列
+            region_videos: 每个分区的视频数，最新投稿列表翻完这么多视频后返回空列表
+        """
+        self.page_size = page_size
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.risk_rate = risk_rate
+        self.seed = seed
+        self.region_videos = region_videos
+        self.requests = 0
+        self.errors = 0
+        self.risks = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._videos = {}  # 列表中出现过的视频，bvid -> 视频，供详情和标签接口查询
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset(self):
+        """清零计数并重置错误注入序列，每个基准场景看到相同的注入序列"""
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.risks = 0
+            self._rng = random.Random(self.seed)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @lru_cache(maxsize=4096)
+    def popular_body(self, page, page_size):
+        """热门接口第 page 页的响应正文"""
+        if page > self.pages:
+            videos = []
+        else:
+            rng = random.Random(f"{self.seed}-popular-{page}")
+            videos = [make_video(rng, page, i) for i in range(page_size)]
+        self._remember(videos)
+        body = {'code': 0, 'message': '0', 'ttl': 1,
+                'data': {'list': videos, 'no_more': page >= self.pages}}
+        return json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+    @lru_cache(maxsize=256)
+    def ranking_body(self, rid):
+        """排行榜接口分类 rid 的响应正文"""
+        rng = random.Random(f"{self.seed}-ranking-{rid}")
+        videos = [make_video(rng, 1000 + rid, i) for i in range(RANKING_SIZE)]
+        self._remember(videos)
+        body = {'code': 0, 'message': '0', 'ttl': 1, 'data': {'note': '', 'list': videos}}
+        return json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+    @lru_cache(maxsize=256)
+    def _hot_order(self, rid):
+        """分区 rid 近期热门列表的顺序：一半视频按固定种子打乱"""
+        order = list(range(self.region_videos))
+        random.Random(f"{self.seed}-hot-{rid}").shuffle(order)
+        return order[:self.region_videos // 2]
+
+    @lru_cache(maxsize=4096)
+    def region_body(self, path, rid, page, page_size):
+        """分区列表第 page 页的响应正文；同一分区的第 k 个视频在两个列表中内容相同"""
+        if path == REGION_HOT_API:
+            indexes = self._hot_order(rid)
+        else:
+            indexes = range(self.region_videos)
+        start = (page - 1) * page_size
+        videos = [make_video(random.Random(f"{self.seed}-region-{rid}-{index}"), 2000 + rid, index)
+                  for index in indexes[max(0, start):start + page_size]]
+        self._remember(videos)
+        body = {'code': 0, 'message': '0', 'ttl': 1,
+                'data': {'archives': videos, 'page': {'count': len(indexes), 'num': page, 'size': page_size}}}
+        return json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+    def _remember(self, videos):
+        with self._lock:
+            self._videos.update((video['bvid'], video) for video in videos)
+
+    def video_body(self, path, bvid):
+        """详情或标签接口的响应正文；没有在列表中出现过的视频与真实接口一样返回 -404"""
+        with self._lock:
+            video = self._videos.get(bvid)
+        if video is None:
+            return json.dumps({'code': -404, 'message': '啥都木有', 'ttl': 1}, ensure_ascii=False).encode('utf-8')
+        data = make_detail(video) if path == VIDEO_DETAIL_API else make_tags(video)
+        return json.dumps({'code': 0, 'message': '0', 'ttl': 1, 'data': data}, ensure_ascii=False).encode('utf-8')
+
+    def _inject(self):
+        """按配置的概率决定本次请求的结果：None（正常）、'error' 或 'risk'"""
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return 'error'
+            if roll < self.error_rate + self.risk_rate:
+                self.risks += 1
+                return 'risk'
+            return None
+
+    def _delay(self):
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive，与真实接口一致，客户端连接池才能复用连接
+            disable_nagle_algorithm = True  # 响应头和正文分两次写出，不关闭 Nagle 会多出约 40ms 的延迟确认等待
+
+            def _send(self, status, body=b'', content_type='application/json; charset=utf-8', headers=()):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+                if parsed.path == '/':
+                    self._send(200, b'<html></html>', 'text/html; charset=utf-8',
+                               [('Set-Cookie', 'buvid3=mock-buvid3; Path=/')])
+                    return
+                if parsed.path not in (POPULAR_API, RANKING_API, REGION_HOT_API, REGION_NEW_API,
+                                       VIDEO_DETAIL_API, VIDEO_TAGS_API):
+                    self._send(404, '{"code":-404,"message":"啥都木有"}'.encode('utf-8'))
+                    return
+
+                server._delay()
+                outcome = server._inject()
+                if outcome == 'error':
+                    self._send(500, '{"code":-500,"message":"服务器错误"}'.encode('utf-8'))
+                    return
+                if outcome == 'risk':
+                    self._send(200, json.dumps({'code': -352, 'message': '风控校验失败', 'ttl': 1})
+                               .encode('utf-8'))
+                    return
+
+                try:
+                    if parsed.path == POPULAR_API:
+                        body = server.popular_body(int(query.get('pn', 1)), int(query.get('ps', server.page_size)))
+                    elif parsed.path in (REGION_HOT_API, REGION_NEW_API):
+                        body = server.region_body(parsed.path, int(query.get('rid', 0)), int(query.get('pn', 1)),
+                                                  int(query.get('ps', REGION_PAGE_SIZE)))
+                    elif parsed.path in (VIDEO_DETAIL_API, VIDEO_TAGS_API):
+                        body = server.video_body(parsed.path, query.get('bvid', ''))
+                    else:
+                        body = server.ranking_body(int(query.get('rid', 0)))
+                except ValueError:
+                    self._send(400, '{"code":-400,"message":"请求错误"}'.encode('utf-8'))
+                    return
+                self._send(200, body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def add_arguments(parser):
+    """模拟服务器的数据和故障注入参数，benchmark.py 共用"""
+    parser.add_argument("--page-size", type=int, default=20, help="热门接口每页视频数（默认 20）")
+    parser.add_argument("--pages", type=int, default=50, help="热门接口总页数（默认 50）")
+    parser.add_argument("--latency", type=float, default=20, help="每个请求的基础延迟，毫秒（默认 20）")
+    parser.add_argument("--jitter", type=float, default=10, help="附加的随机延迟上限，毫秒（默认 10）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 500 的概率（默认 0）")
+    parser.add_argument("--risk-rate", type=float, default=0.0, help="返回 -352 风控的概率（默认 0）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（默认 0）")
+    parser.add_argument("--region-videos", type=int, default=5000,
+                        help="分区列表中每个分区的视频数（默认 5000）")
+
+
+def server_from_args(args, port=0):
+    """按命令行参数创建（未启动的）模拟服务器"""
+    return MockBilibiliServer(port=port, page_size=args.page_size, pages=args.pages,
+                              latency=args.latency / 1000, jitter=args.jitter / 1000,
+                              error_rate=args.error_rate, risk_rate=args.risk_rate, seed=args.seed,
+                              region_videos=args.region_videos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟B站API服务器")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口（默认 8000）")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.port).start()
+    print(f"🧪 模拟API服务器: {server.url}")
+    print(f"   热门接口: {server.url}{POPULAR_API}?pn=1&ps={args.page_size}")
+    print(f"   排行榜接口: {server.url}{RANKING_API}?rid=0&type=all")
+    print(f"   分区列表接口: {server.url}{REGION_NEW_API}?rid=36&pn=1&ps={REGION_PAGE_SIZE}")
+    print(f"   详情 / 标签接口: {server.url}{VIDEO_DETAIL_API}?bvid=BVmock1x0（先请求第1页热门）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n⏹️  已停止，共处理 {server.requests} 个API请求"
+              f"（注入错误 {server.errors} 次，风控 {server.risks} 次）")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
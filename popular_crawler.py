@@ -5,129 +5,245 @@ Author: GitHub Copilot
 Version: 1.0
 """
 
-import requests
-import pandas as pd
+import csv
 import time
 import random
 import sys
 import os
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from config import *
+from bili_client import configure_default_client, get_default_client
+from csv_sink import StreamingCSVWriter, finalize_csv, iter_sorted_rows, column_stats, read_column
+from checkpoint import CrawlCheckpoint
+from dedup_index import DedupIndex
+from enrichment import EnrichmentCache, VideoEnricher
+from incremental import IncrementalState
+from response_cache import ResponseCache
+from storage import OUTPUT_FORMATS, ParquetWriter, SQLiteStatsStore
+from video_record import ENRICH_FIELDS, FIELD_NAMES, VideoRecord, record_getter
+import metrics
+from metrics import ROWS, SLEEP_SECONDS, span
+from quality import passes_quality
+
+logger = logging.getLogger(__name__)
+
+# 中间文件的列（VideoRecord 的字段加上 url）
+VIDEO_FIELDS = FIELD_NAMES + ['url']
+# 最终CSV的列顺序（排名列 rank 在最前面）
+CSV_COLUMNS = ['title', 'author', 'view', 'like', 'like_rate',
+               'coin', 'favorite', 'share', 'reply', 'danmaku',
+               'duration', 'url', 'bvid', 'desc']
 
 class BilibiliPopularCrawler:
-    def __init__(self):
-        """初始化爬虫"""
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+    def __init__(self, client=None, dedup_index=None, batch_filter=BATCH_FILTER, incremental=None, enricher=None):
+        """
+        初始化爬虫
+        
+        Args:
+            client: 共享的 BilibiliClient，默认使用进程内的全局客户端
+            dedup_index: 跨运行共享的 DedupIndex；为 None 时每次运行只在内存中去重
+            batch_filter: 是否整页向量化筛选（process_page_batch）
+            incremental: 可选的 IncrementalState；传入后只翻到没有新视频和热视频为止，
+                         输出与以前爬到的视频合并
+            enricher: 可选的 VideoEnricher；传入后每页的高质量视频写入前先补充分区、分P数、
+                      标签和最新统计（按最新统计重新筛选），最终CSV多出这几列
+        """
+        self.client = client or get_default_client()
+        self.dedup_index = dedup_index
+        self.dedup = dedup_index
+        self.batch_filter = batch_filter
+        self.incremental = incremental
+        self.enricher = enricher
+        self.stop_event = None  # 可选的 threading.Event，设置后处理完当前页即停止翻页（daemon.py 优雅退出）
         self.data_dir = POPULAR_DIR
         
         # 确保数据目录存在
         os.makedirs(self.data_dir, exist_ok=True)
         
+    @property
+    def csv_columns(self):
+        """最终CSV的列：补充详情时在末尾加上分区、分P数和标签"""
+        return CSV_COLUMNS + ENRICH_FIELDS if self.enricher is not None else CSV_COLUMNS
+    
     def delay(self):
         """随机延迟"""
         delay_time = random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX)
         time.sleep(delay_time)
+        SLEEP_SECONDS.inc(delay_time, reason='delay')
         
-    def get_popular_videos(self, target_count=500, max_pages=50):
+    def fetch_page(self, page):
+        """
+        获取并处理单页热门视频，可在工作线程中并发调用
+        
+        Args:
+            page: 页码
+            
+        Returns:
+            tuple: (高质量视频列表, 说明)，请求或解析失败时列表为None，
+                   接口没有返回数据时为空列表
+        """
+        params = {
+            'ps': 20,  # 每页20个视频
+            'pn': page
+        }
+        
+        try:
+            with span('fetch', page=page):
+                status_code, data = self.client.get_json(POPULAR_API, params=params)
+            
+            if status_code != 200:
+                return None, f"请求失败，状态码: {status_code}"
+                
+            if data.get('code') != 0:
+                return None, f"API错误: {data.get('message')}"
+                
+            video_list = data.get('data', {}).get('list', [])
+            
+            if not video_list:
+                return [], "无原始数据"
+                
+            # 处理视频数据
+            with span('filter', page=page, videos=len(video_list)):
+                if self.batch_filter:
+                    return self.process_page_batch(video_list), None
+                page_videos = []
+                for video in video_list:
+                    processed_video = self.process_video_data(video)
+                    if processed_video:
+                        page_videos.append(processed_video)
+                return page_videos, None
+            
+        except Exception as e:
+            return None, f"出错: {e}"
+        
+    def get_popular_videos(self, target_count=500, max_pages=50, window=POPULAR_PREFETCH_WINDOW,
+                           sink=None, checkpoint=None):
         """
         获取热门视频数据
         
+        window 大于1时为流水线模式：同时保持 window 个页面在途，
+        请求节奏交给客户端的令牌桶控制，不再逐页随机延迟（启用自适应限速时
+        串行模式也不再随机延迟）；
+        结果仍按页码顺序处理，连续空页规则不变。
+        增量模式下连续 INCREMENTAL_STALE_PAGES 页没有新视频和热视频时也会停止。
+        
         Args:
             target_count: 目标视频数量
             max_pages: 最大页数限制
+            window: 同时在途的页数，1 为逐页串行
+            sink: 可选的 StreamingCSVWriter，每页数据处理完立即写入，不在内存中保留
+            checkpoint: 可选的 CrawlCheckpoint，先补爬其中失败的页，再从记录的页码之后继续，并逐页更新
             
         Returns:
-            list: 视频数据列表
+            list: VideoRecord 列表；传入 sink 时为写入的视频数量
         """
         all_videos = []
-        page = 1
+        collected = 0  # 已获取的视频数量
         empty_page_count = 0  # 连续空页计数器
+        stale_page_count = 0  # 增量模式：连续没有新视频和热视频的页数
+        window = max(1, window)
+        pages = iter(range(1, max_pages + 1))
         
-        print(f"🚀 开始爬取热门视频，目标数量: {target_count}")
-        print(f"⚙️  停止条件: 连续{MAX_EMPTY_PAGES}页无有效数据时停止")
+        if checkpoint is not None and (checkpoint.state['last_pn'] or checkpoint.retry_pages):
+            # 预取窗口中失败的页可能早于 last_pn，先补爬这些页，否则它们的数据会丢失
+            retry_pages = checkpoint.retry_pages
+            first_page = checkpoint.state['last_pn'] + 1
+            pages = chain(retry_pages, range(first_page, max_pages + 1))
+            collected = checkpoint.state['rows_written']
+            if retry_pages:
+                logger.info(f"♻️  断点续爬: 先补爬失败的第{'、'.join(map(str, retry_pages))}页，"
+                            f"再从第{first_page}页继续，已有 {collected} 个视频")
+            else:
+                logger.info(f"♻️  断点续爬: 从第{first_page}页继续，已有 {collected} 个视频")
         
-        while len(all_videos) < target_count and page <= max_pages:
-            print(f"📄 正在爬取第{page}页...")
-            
-            url = f"{BASE_URL}{POPULAR_API}"
-            params = {
-                'ps': 20,  # 每页20个视频
-                'pn': page
-            }
+        logger.info(f"🚀 开始爬取热门视频，目标数量: {target_count}")
+        logger.info(f"⚙️  停止条件: 连续{MAX_EMPTY_PAGES}页无有效数据时停止")
+        if window > 1:
+            logger.info(f"⚡ 流水线模式: 同时预取 {window} 页")
+        
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            in_flight = deque()  # (页码, future)，按提交顺序排列
             
-            try:
-                response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            while collected < target_count:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    logger.info("⏹️  收到停止信号，停止翻页，已爬取的数据照常保存")
+                    break
                 
-                if response.status_code != 200:
-                    print(f"❌ 请求失败，状态码: {response.status_code}")
-                    empty_page_count += 1
-                    if empty_page_count >= MAX_EMPTY_PAGES:
-                        print(f"📭 连续{MAX_EMPTY_PAGES}页请求失败，停止爬取")
+                # 补满预取窗口
+                while len(in_flight) < window:
+                    next_page = next(pages, None)
+                    if next_page is None:
                         break
-                    page += 1
-                    self.delay()
-                    continue
-                    
-                data = response.json()
+                    logger.info(f"📄 正在爬取第{next_page}页...")
+                    in_flight.append((next_page, executor.submit(self.fetch_page, next_page)))
+                if not in_flight:
+                    break
                 
-                if data.get('code') != 0:
-                    print(f"❌ API错误: {data.get('message')}")
-                    empty_page_count += 1
-                    if empty_page_count >= MAX_EMPTY_PAGES:
-                        print(f"📭 连续{MAX_EMPTY_PAGES}页API错误，停止爬取")
-                        break
-                    page += 1
-                    self.delay()
-                    continue
-                    
-                video_list = data.get('data', {}).get('list', [])
+                page, future = in_flight.popleft()
+                page_videos, error = future.result()
+                if page_videos and self.enricher is not None:
+                    # 详情中的最新统计可能不再满足筛选条件，这些视频不写入
+                    page_videos = self.enricher.enrich(page_videos, keep=self.is_high_quality)
                 
-                if not video_list:
+                if page_videos is None:
                     empty_page_count += 1
-                    print(f"📭 第{page}页无原始数据，连续空页计数: {empty_page_count}/{MAX_EMPTY_PAGES}")
-                    if empty_page_count >= MAX_EMPTY_PAGES:
-                        print(f"📭 连续{MAX_EMPTY_PAGES}页无数据，停止爬取")
-                        break
-                    page += 1
-                    self.delay()
-                    continue
-                    
-                # 处理视频数据
-                page_videos = []
-                for video in video_list:
-                    processed_video = self.process_video_data(video)
-                    if processed_video:
-                        page_videos.append(processed_video)
-                
-                # 检查是否获取到有效视频
-                if not page_videos:
+                    logger.warning(f"❌ 第{page}页{error}，连续空页计数: {empty_page_count}/{MAX_EMPTY_PAGES}",
+                                   extra={'page': page, 'error': error})
+                    if checkpoint is not None:
+                        checkpoint.mark_page(page, ok=False)
+                elif not page_videos:
                     empty_page_count += 1
-                    print(f"📭 第{page}页无高质量视频（点赞率<{LIKE_RATE_THRESHOLD}），连续空页计数: {empty_page_count}/{MAX_EMPTY_PAGES}")
-                    if empty_page_count >= MAX_EMPTY_PAGES:
-                        print(f"📭 连续{MAX_EMPTY_PAGES}页无有效视频，停止爬取")
-                        break
+                    reason = error or f"无新的高质量视频（点赞率<{LIKE_RATE_THRESHOLD}或已爬取过）"
+                    logger.info(f"📭 第{page}页{reason}，连续空页计数: {empty_page_count}/{MAX_EMPTY_PAGES}")
                 else:
                     # 重置连续空页计数器
                     empty_page_count = 0
+                    if sink is not None:
+                        with span('write', page=page, rows=len(page_videos)):
+                            sink.write_rows(page_videos)
+                    else:
+                        all_videos.extend(page_videos)
+                    collected += len(page_videos)
+                    logger.info(f"✅ 第{page}页获取 {len(page_videos)} 个视频，总计: {collected}",
+                                extra={'page': page, 'rows': len(page_videos), 'total': collected})
                 
-                all_videos.extend(page_videos)
+                if page_videos is not None and checkpoint is not None:
+                    checkpoint.mark_page(page, len(page_videos),
+                                         output_bytes=sink.tell() if sink is not None else None)
+                if page_videos and self.dedup is not None:
+                    # 写入且检查点已保存之后才记入持久索引，续爬截断中间文件时不会丢掉已记入的视频
+                    self.dedup.persist((video.bvid for video in page_videos), 'popular')
                 
-                print(f"✅ 第{page}页获取 {len(page_videos)} 个视频，总计: {len(all_videos)}")
-                
-                page += 1
-                self.delay()
-                
-            except Exception as e:
-                print(f"❌ 爬取第{page}页时出错: {e}")
-                empty_page_count += 1
                 if empty_page_count >= MAX_EMPTY_PAGES:
-                    print(f"📭 连续{MAX_EMPTY_PAGES}页出错，停止爬取")
+                    logger.info(f"📭 连续{MAX_EMPTY_PAGES}页无有效数据，停止爬取")
                     break
-                page += 1
-                self.delay()
+                
+                if self.incremental is not None and page_videos is not None:
+                    change = self.incremental.observe('popular', page_videos)
+                    stale_page_count = 0 if change.changed else stale_page_count + 1
+                    logger.info(f"🔄 第{page}页: 新视频 {change.new}，热视频 {change.hot}，无变化 {change.stale}",
+                                extra={'page': page, 'new': change.new, 'hot': change.hot})
+                    if stale_page_count >= INCREMENTAL_STALE_PAGES:
+                        logger.info(f"⏭️  连续{INCREMENTAL_STALE_PAGES}页没有新视频或热视频，增量模式停止翻页")
+                        break
+                
+                # 自适应限速时节奏由客户端控制，不再固定随机延时
+                if window == 1 and not self.client.offline and not self.client.adaptive:
+                    self.delay()
+            
+            # 停止后丢弃尚未开始的预取
+            for _, future in in_flight:
+                future.cancel()
         
-        print(f"🎉 爬取完成！共获取 {len(all_videos)} 个视频")
-        return all_videos
+        logger.info(f"🎉 爬取完成！共获取 {collected} 个视频")
+        self.client.print_rate_summary()
+        if self.enricher is not None:
+            self.enricher.print_summary()
+        return collected if sink is not None else all_videos
     
     def process_video_data(self, video):
         """
@@ -137,11 +253,17 @@ class BilibiliPopularCrawler:
             video: 原始视频数据
             
         Returns:
-            dict: 处理后的视频数据
+            VideoRecord: 处理后的视频数据，低质量或重复视频返回None
         """
         try:
             # 基础信息
             bvid = video.get('bvid', '')
+            
+            # 已见过的视频直接丢弃，不再解析
+            if self.dedup is not None and self.dedup.contains(bvid):
+                ROWS.inc(result='duplicate')
+                return None
+            
             title = video.get('title', '').strip()
             
             # 作者信息
@@ -164,128 +286,361 @@ class BilibiliPopularCrawler:
             pic = video.get('pic', '')
             desc = video.get('desc', '').strip()
             
-            # 计算点赞率
+            # 只保留高质量视频，规则与向量化筛选（quality_mask）相同
+            if not passes_quality(view, like, coin, favorite, LIKE_RATE_THRESHOLD, MIN_QUALITY_SCORE,
+                                  weights=QUALITY_WEIGHTS):
+                ROWS.inc(result='rejected')
+                return None
             like_rate = like / view if view > 0 else 0
             
-            # 只保留高质量视频
-            if like_rate < LIKE_RATE_THRESHOLD:
+            # 并发预取时两页可能同时处理同一视频，以先收录的那一次为准
+            if self.dedup is not None and not self.dedup.add(bvid):
+                ROWS.inc(result='duplicate')
                 return None
             
-            return {
-                'bvid': bvid,
-                'title': title,
-                'author': author,
-                'view': view,
-                'like': like,
-                'coin': coin,
-                'favorite': favorite,
-                'share': share,
-                'reply': reply,
-                'danmaku': danmaku,
-                'like_rate': round(like_rate, 4),
-                'duration': duration,
-                'pubdate': pubdate,
-                'pic': pic,
-                'desc': desc[:200],  # 限制描述长度
-                'url': f'https://www.bilibili.com/video/{bvid}'
-            }
+            ROWS.inc(result='accepted')
+            return VideoRecord(
+                bvid=bvid,
+                title=title,
+                author=author,
+                view=view,
+                like=like,
+                coin=coin,
+                favorite=favorite,
+                share=share,
+                reply=reply,
+                danmaku=danmaku,
+                like_rate=round(like_rate, 4),
+                duration=duration,
+                pubdate=pubdate,
+                pic=pic,
+                desc=desc[:200],  # 限制描述长度
+            )
             
         except Exception as e:
-            print(f"❌ 处理视频数据时出错: {e}")
+            logger.warning(f"❌ 处理视频数据时出错: {e}")
             return None
     
+    def is_high_quality(self, record):
+        """按记录当前的统计重新判断，规则与 process_video_data 相同（详情补充更新统计之后使用）"""
+        return passes_quality(record.view, record.like, record.coin, record.favorite, LIKE_RATE_THRESHOLD,
+                              MIN_QUALITY_SCORE, weights=QUALITY_WEIGHTS)
+    
+    def process_page_batch(self, video_list):
+        """
+        整页向量化处理：一次算出点赞率等比率和筛选掩码，只为通过筛选的视频构造行
+        
+        结果与逐条调用 process_video_data 相同（包括 MIN_QUALITY_SCORE 质量分下限）。
+        
+        Args:
+            video_list: 原始视频列表
+            
+        Returns:
+            list: VideoRecord 列表
+        """
+        # numpy / pandas 只在向量化筛选时才需要，延迟导入，逐条筛选的短任务不必承担其导入时间
+        from quality import filter_videos, frame_to_rows
+
+        total = len(video_list)
+        if self.dedup is not None:
+            video_list = [video for video in video_list
+                          if not self.dedup.contains(video.get('bvid', ''))]
+        rows = frame_to_rows(video_list, filter_videos(video_list, LIKE_RATE_THRESHOLD, MIN_QUALITY_SCORE,
+                                                        weights=QUALITY_WEIGHTS))
+        passed = len(rows)
+        if self.dedup is not None:
+            rows = [row for row in rows if self.dedup.add(row.bvid)]
+        ROWS.inc(total - len(video_list) + passed - len(rows), result='duplicate')
+        ROWS.inc(len(video_list) - passed, result='rejected')
+        ROWS.inc(len(rows), result='accepted')
+        return rows
+    
     def save_to_csv(self, videos, filename):
         """
         保存数据到CSV文件
         
         Args:
-            videos: 视频数据列表
+            videos: VideoRecord 列表
             filename: 文件名
         """
         if not videos:
-            print("❌ 无数据可保存")
+            logger.warning("❌ 无数据可保存")
             return
             
-        df = pd.DataFrame(videos)
-        
-        # 按点赞率排序
-        df = df.sort_values('like_rate', ascending=False)
-        
-        # 添加排名
-        df['rank'] = range(1, len(df) + 1)
-        
-        # 重新排列列顺序
-        columns = ['rank', 'title', 'author', 'view', 'like', 'like_rate', 
-                  'coin', 'favorite', 'share', 'reply', 'danmaku', 
-                  'duration', 'url', 'bvid', 'desc']
-        df = df[columns]
+        # 按点赞率排序并添加排名，标准库 csv 直接写出，不需要 pandas
+        with span('sort', rows=len(videos)):
+            ranked = sorted(videos, key=lambda video: video.like_rate, reverse=True)
         
         # 保存文件
         filepath = os.path.join(self.data_dir, filename)
-        df.to_csv(filepath, index=False, encoding='utf-8-sig')
+        with span('write', rows=len(ranked)):
+            with open(filepath, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                writer.writerow(['rank'] + self.csv_columns)
+                getter = record_getter(self.csv_columns)
+                writer.writerows((rank, *getter(video)) for rank, video in enumerate(ranked, 1))
         
-        print(f"💾 数据已保存到: {filepath}")
-        print(f"📊 共保存 {len(df)} 个高质量视频")
+        logger.info(f"💾 数据已保存到: {filepath}")
+        logger.info(f"📊 共保存 {len(ranked)} 个高质量视频")
         
         # 显示统计信息
-        print(f"\n📈 质量统计:")
-        print(f"平均点赞率: {df['like_rate'].mean():.4f}")
-        print(f"最高点赞率: {df['like_rate'].max():.4f}")
-        print(f"平均播放量: {df['view'].mean():,.0f}")
-        print(f"平均点赞数: {df['like'].mean():,.0f}")
+        logger.info(f"\n📈 质量统计:")
+        logger.info(f"平均点赞率: {sum(video.like_rate for video in ranked) / len(ranked):.4f}")
+        logger.info(f"最高点赞率: {ranked[0].like_rate:.4f}")
+        logger.info(f"平均播放量: {sum(video.view for video in ranked) / len(ranked):,.0f}")
+        logger.info(f"平均点赞数: {sum(video.like for video in ranked) / len(ranked):,.0f}")
     
-    def run(self, target_count=None):
+    def run(self, target_count=None, window=POPULAR_PREFETCH_WINDOW, sort_output=SORT_OUTPUT, resume=False,
+            output_format=OUTPUT_FORMAT):
         """
         运行爬虫
         
+        每页数据先追加写入中间文件（.part），结束后再生成最终CSV或Parquet：
+        中途崩溃时已爬取的数据仍保留在中间文件中。
+        检查点逐页记录进度；因连续请求失败（如 -352）而停止或被中断时保留检查点，
+        下次以 resume=True 运行即可从断点继续。
+        
         Args:
             target_count: 目标视频数量，默认使用配置文件值
+            window: 同时预取的页数
+            sort_output: 是否按点赞率排序（外部归并排序，不把全部数据读入内存）
+            resume: 是否从上次的检查点继续
+            output_format: 输出格式，'csv'、'parquet' 或 'sqlite'
         """
         if target_count is None:
             target_count = TARGET_COUNT_POPULAR
             
-        print(f"🎯 开始爬取B站热门高质量视频...")
-        print(f"⚙️  配置: 点赞率阈值 {LIKE_RATE_THRESHOLD}, 目标数量 {target_count}")
+        logger.info(f"🎯 开始爬取B站热门高质量视频...")
+        logger.info(f"⚙️  配置: 点赞率阈值 {LIKE_RATE_THRESHOLD}, 目标数量 {target_count}")
+        
+        checkpoint = None
+        if resume:
+            checkpoint = CrawlCheckpoint.load(self.data_dir, 'popular')
+            if checkpoint is None or not os.path.exists(checkpoint.state['output'] + ".part"):
+                logger.warning("⚠️  未找到可用的检查点，从头开始爬取")
+                checkpoint = None
         
-        # 获取视频数据
-        videos = self.get_popular_videos(target_count)
+        # 未指定持久索引时，本次运行内去重
+        self.dedup = self.dedup_index if self.dedup_index is not None else DedupIndex()
         
-        if videos:
-            # 保存数据
+        if checkpoint is not None:
+            filepath = checkpoint.state['output']
+            partial_path = filepath + ".part"
+            # 丢弃最后一次检查点之后写入但未确认的数据，避免重复
+            os.truncate(partial_path, checkpoint.state['output_bytes'])
+            if self.dedup_index is None:
+                for bvid in read_column(partial_path, 'bvid'):
+                    self.dedup.add(bvid)
+        else:
             timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = f"B站热门-高质量-{timestamp}.csv"
-            self.save_to_csv(videos, filename)
+            filepath = os.path.join(self.data_dir, f"B站热门-高质量-{timestamp}.csv")
+            partial_path = filepath + ".part"
+            checkpoint = CrawlCheckpoint.for_dir(self.data_dir, 'popular')
+            checkpoint.state['output'] = filepath
+            checkpoint.state['target_count'] = target_count
+            checkpoint.state['crawled_at'] = int(time.time())
+        
+        # 获取视频数据，逐页写入中间文件
+        with StreamingCSVWriter(partial_path, VIDEO_FIELDS, encoding='utf-8', append=resume) as sink:
+            checkpoint.state['output_bytes'] = sink.tell()
+            checkpoint.save()
+            count = self.get_popular_videos(target_count, window=window, sink=sink, checkpoint=checkpoint)
+        
+        if self.incremental is not None:
+            count = self.merge_incremental(partial_path, count)
+        
+        if not count:
+            os.remove(partial_path)
+            checkpoint.clear()
+            logger.warning("❌ 未获取到任何视频数据")
+            return
+        
+        # 统计信息直接读中间文件，与输出格式无关
+        with span('stats'):
+            stats = column_stats(partial_path, ['like_rate', 'view', 'like'])
+        
+        # 生成最终文件
+        sort_key = 'like_rate' if sort_output else None
+        with span('finalize', format=output_format):
+            output_path = self.finalize_output(partial_path, filepath, sort_key, output_format, checkpoint)
+        
+        if checkpoint.stopped_on_errors:
+            logger.warning(f"⚠️  因连续请求失败而停止，已保留检查点，可使用 --resume 继续")
         else:
-            print("❌ 未获取到任何视频数据")
+            os.remove(partial_path)
+            checkpoint.clear()
+        
+        logger.info(f"💾 数据已保存到: {output_path}")
+        logger.info(f"📊 共保存 {count} 个高质量视频，丢弃重复视频 {self.dedup.duplicates} 个")
+        
+        # 显示统计信息
+        logger.info(f"\n📈 质量统计:")
+        logger.info(f"平均点赞率: {stats['like_rate'][0]:.4f}")
+        logger.info(f"最高点赞率: {stats['like_rate'][1]:.4f}")
+        logger.info(f"平均播放量: {stats['view'][0]:,.0f}")
+        logger.info(f"平均点赞数: {stats['like'][0]:,.0f}")
+    
+    def merge_incremental(self, partial_path, refreshed):
+        """
+        增量模式：用状态库中合并后的全部视频重写中间文件
+        
+        本次刷新的视频已在 get_popular_videos 中写入状态库并覆盖旧数据，
+        没有刷新的视频沿用上次的数据，超过保留期没有再出现的视频被移除。
+        
+        Args:
+            partial_path: 中间CSV文件
+            refreshed: 本次刷新的视频数
+            
+        Returns:
+            int: 合并后的视频数
+        """
+        removed = self.incremental.prune('popular')
+        with StreamingCSVWriter(partial_path, VIDEO_FIELDS, encoding='utf-8') as sink:
+            sink.write_rows(list(self.incremental.iter_rows('popular')))
+            count = sink.rows_written
+        logger.info(f"🔄 增量合并: 本次刷新 {refreshed} 个视频，合并后共 {count} 个"
+                    f"（移除 {INCREMENTAL_RETENTION_DAYS} 天未出现的视频 {removed} 个）")
+        return count
+    
+    def finalize_output(self, partial_path, filepath, sort_key, output_format, checkpoint):
+        """
+        由中间文件生成指定格式的最终输出
+        
+        Args:
+            partial_path: 中间CSV文件
+            filepath: CSV格式时的输出路径
+            sort_key: 排序列，None 表示保持爬取顺序
+            output_format: 'csv'、'parquet' 或 'sqlite'
+            checkpoint: 本次任务的检查点，用于记录 Parquet 输出位置；None 表示不续爬（如分布式合并）
+            
+        Returns:
+            str: 最终输出文件路径
+        """
+        if output_format == 'csv':
+            finalize_csv(partial_path, filepath, self.csv_columns, sort_key=sort_key)
+            return filepath
+        
+        if output_format == 'sqlite':
+            # 时序库不关心顺序；续爬时中间文件包含全部数据，同一次爬取的快照用同一个时间戳
+            crawled_at = checkpoint.state.get('crawled_at') if checkpoint is not None else None
+            with SQLiteStatsStore(crawled_at=crawled_at) as store:
+                store.clear_snapshots('popular')
+                batch = []
+                for row in iter_sorted_rows(partial_path):
+                    batch.append(row)
+                    if len(batch) >= PARQUET_ROW_GROUP_ROWS:
+                        store.write_rows(batch, source='popular')
+                        batch = []
+                store.write_rows(batch, source='popular')
+            return store.filepath
+        
+        # 续爬时上一次生成的 Parquet 文件已包含在中间文件里，先删除避免分区内重复
+        previous = checkpoint.state.get('parquet_output') if checkpoint is not None else None
+        if previous and os.path.exists(previous):
+            os.remove(previous)
+        
+        with ParquetWriter('popular') as writer:
+            batch = []
+            for rank, row in enumerate(iter_sorted_rows(partial_path, sort_key), 1):
+                row['rank'] = rank
+                batch.append(row)
+                if len(batch) >= PARQUET_ROW_GROUP_ROWS:
+                    writer.write_rows(batch)
+                    batch = []
+            writer.write_rows(batch)
+        if checkpoint is not None:
+            checkpoint.state['parquet_output'] = writer.filepath
+            checkpoint.save()
+        return writer.filepath
+
+def main(argv=None, prog=None):
+    """
+    主函数
 
-def main():
-    """主函数"""
-    print("🔥 B站热门视频高质量爬虫 v1.0")
-    print("=" * 50)
+    Args:
+        argv: 命令行参数，默认 sys.argv[1:]
+        prog: 帮助信息中的程序名，由 cli.py 的 popular 子命令传入
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="B站热门视频高质量爬虫")
+    parser.add_argument("target_count", nargs="?", type=int, default=None,
+                        help=f"目标视频数量（默认 {TARGET_COUNT_POPULAR}）")
+    parser.add_argument("-w", "--window", type=int, default=POPULAR_PREFETCH_WINDOW,
+                        help=f"同时预取的页数，1 为逐页串行（默认 {POPULAR_PREFETCH_WINDOW}）")
+    parser.add_argument("--no-sort", action="store_true",
+                        help="不按点赞率排序，保持爬取顺序输出")
+    parser.add_argument("--resume", action="store_true",
+                        help="从上次中断的检查点继续爬取")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help=f"输出格式（默认 {OUTPUT_FORMAT}）；parquet 写入 {PARQUET_DIR}/ 按日期和分类分区，"
+                             f"sqlite 追加到时序库 {SQLITE_DB}")
+    parser.add_argument("--batch-filter", action="store_true", default=BATCH_FILTER,
+                        help="整页向量化计算点赞率和筛选（可配合 MIN_QUALITY_SCORE 使用质量分）")
+    parser.add_argument("--dedup", action="store_true",
+                        help=f"使用跨运行共享的去重索引（{DEDUP_DB}），跳过以前爬到过的视频")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"把原始API响应缓存到 {RESPONSE_CACHE_DB}，有效期内不重复请求")
+    parser.add_argument("--offline", action="store_true",
+                        help="只从响应缓存重放，不访问网络（调整阈值后重新筛选和导出）")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"增量模式：只翻到没有新视频和热视频为止，与以前的结果合并输出（状态保存在 {INCREMENTAL_DB}）")
+    parser.add_argument("--enrich", action="store_true",
+                        help=f"为高质量视频补充分区、分P数、标签和最新统计（{ENRICH_CONCURRENCY} 个请求并发，"
+                             f"结果缓存在 {ENRICH_CACHE_DB}）")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.incremental and (args.resume or args.dedup):
+        parser.error("--incremental 不能与 --resume 或 --dedup 同时使用")
+    metrics_server = metrics.start_from_args(args)
     
+    logger.info("🔥 B站热门视频高质量爬虫 v1.0")
+    logger.info("=" * 50)
+    
+    response_cache = None
+    enricher = None
     try:
-        crawler = BilibiliPopularCrawler()
+        if args.cache or args.offline or args.enrich:
+            response_cache = ResponseCache(RESPONSE_CACHE_DB) if args.cache or args.offline else None
+            # 补充详情的请求与预取的页面同时在途，连接池按两者之和保留连接
+            pool_size = max(MAX_CONCURRENCY, args.window) + (ENRICH_CONCURRENCY if args.enrich else 0)
+            configure_default_client(response_cache, offline=args.offline, pool_size=pool_size)
+            if args.offline:
+                logger.info(f"📴 离线模式: 从 {RESPONSE_CACHE_DB} 重放（{len(response_cache)} 条缓存）")
+        dedup_index = DedupIndex(DEDUP_DB) if args.dedup else None
+        incremental = IncrementalState(INCREMENTAL_DB) if args.incremental else None
+        if args.enrich:
+            enricher = VideoEnricher(get_default_client(), EnrichmentCache(ENRICH_CACHE_DB))
+        crawler = BilibiliPopularCrawler(dedup_index=dedup_index, batch_filter=args.batch_filter,
+                                         incremental=incremental, enricher=enricher)
         
         # 可以通过命令行参数指定目标数量
-        target_count = None
-        if len(sys.argv) > 1:
-            try:
-                target_count = int(sys.argv[1])
-                print(f"📋 使用命令行参数，目标数量: {target_count}")
-            except ValueError:
-                print(f"❌ 无效的数量参数: {sys.argv[1]}")
-                sys.exit(1)
-        
-        crawler.run(target_count)
-        print("\n🎉 爬取任务完成！")
+        if args.target_count is not None:
+            logger.info(f"📋 使用命令行参数，目标数量: {args.target_count}")
+        
+        try:
+            crawler.run(args.target_count, window=args.window,
+                        sort_output=SORT_OUTPUT and not args.no_sort, resume=args.resume,
+                        output_format=args.format)
+        finally:
+            if dedup_index is not None:
+                dedup_index.close()
+            if incremental is not None:
+                incremental.close()
+            if enricher is not None:
+                enricher.close()
+                enricher.cache.close()
+            if response_cache is not None:
+                logger.info(f"🗃️  响应缓存: 命中 {response_cache.hits}，未命中 {response_cache.misses}，"
+                            f"304 重新验证 {response_cache.revalidated}")
+                response_cache.close()
+        logger.info("\n🎉 爬取任务完成！")
         
     except KeyboardInterrupt:
-        print("\n⏹️  用户中断爬取")
+        logger.info("\n⏹️  用户中断爬取，进度已保存，可使用 --resume 继续")
     except Exception as e:
-        print(f"\n❌ 爬取过程中出错: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"\n❌ 爬取过程中出错: {e}")
         sys.exit(1)
+    finally:
+        metrics.finish_from_args(args, metrics_server)
 
 if __name__ == "__main__":
     main()
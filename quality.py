@@ -0,0 +1,225 @@
+"""
+向量化质量筛选与评分
+
+功能：
+1. 把一页（或多页）API 返回的视频列表一次性转换成列式 DataFrame
+2. 一次向量化计算点赞率、投币率、收藏率和加权质量分
+3. 一次生成筛选掩码，替代逐条 dict.get + Python 计算
+4. 逐条筛选使用的 passes_quality 与 quality_mask 是同一套规则（阈值、严格比较、质量分下限），
+   两条路径筛选出的视频相同；numpy / pandas 只在向量化函数中导入，逐条筛选不加载它们
+5. 命令行：对保存的原始页面（JSON）批量筛选评分
+
+向量化筛选的优势在评分和筛选本身；逐行构造记录时并不更快
+（100 万条、约 65% 通过时逐条约 2.5 秒，向量化约 3.9 秒），所以逐条筛选仍是默认。
+
+用法：
+    python quality.py raw_pages/*.json [--top 20]
+"""
+
+import argparse
+import json
+import time
+
+from config import LIKE_RATE_THRESHOLD, MIN_QUALITY_SCORE, QUALITY_WEIGHTS
+from video_record import VideoRecord
+
+STAT_FIELDS = ['view', 'like', 'coin', 'favorite', 'share', 'reply', 'danmaku']
+RATE_FIELDS = ['like_rate', 'coin_rate', 'favorite_rate']
+
+
+def passes_quality(view, like, coin, favorite, threshold=LIKE_RATE_THRESHOLD, min_score=MIN_QUALITY_SCORE,
+                   strict=False, weights=QUALITY_WEIGHTS):
+    """
+    逐条判断一个视频是否为高质量视频，规则与 quality_mask 完全相同
+
+    比率和质量分的计算顺序与 score_frame 一致，浮点结果逐位相同。
+
+    Args:
+        view / like / coin / favorite: 视频的统计
+        threshold / min_score / strict: 见 quality_mask
+        weights: 见 score_frame
+
+    Returns:
+        bool: 是否通过筛选
+    """
+    if view > 0:
+        rates = {'like_rate': like / view, 'coin_rate': coin / view, 'favorite_rate': favorite / view}
+    elif strict:
+        return False
+    else:
+        rates = dict.fromkeys(RATE_FIELDS, 0.0)
+    like_rate = rates['like_rate']
+    if not (like_rate > threshold if strict else like_rate >= threshold):
+        return False
+    if min_score is not None:
+        score = 0.0
+        for rate, weight in weights.items():
+            score += weight * rates[rate]
+        return score >= min_score
+    return True
+
+
+def page_to_frame(video_list):
+    """
+    把视频列表的数值字段转换为列式 DataFrame，每个字段只遍历一次
+
+    字符串字段（标题、作者等）不进入 DataFrame，筛选后只为通过的视频读取，
+    见 frame_to_rows。
+
+    Args:
+        video_list: API 返回的 data.list（可以是多页拼接后的列表）
+
+    Returns:
+        DataFrame: 整数统计列 + duration / pubdate，索引为在 video_list 中的位置
+    """
+    import numpy as np
+    import pandas as pd
+
+    count = len(video_list)
+    stats = [video.get('stat') or {} for video in video_list]
+    columns = {
+        field: np.fromiter((stat.get(field, 0) or 0 for stat in stats), dtype=np.int64, count=count)
+        for field in STAT_FIELDS
+    }
+    for field in ('duration', 'pubdate'):
+        columns[field] = np.fromiter((video.get(field, 0) or 0 for video in video_list),
+                                     dtype=np.int64, count=count)
+    return pd.DataFrame(columns)
+
+
+def score_frame(df, weights=QUALITY_WEIGHTS):
+    """
+    向量化计算各项比率和加权质量分（原地添加列）
+
+    播放数为0的视频比率记为0。
+
+    Args:
+        df: page_to_frame 的结果
+        weights: {比率列: 权重}，用于计算 quality_score
+
+    Returns:
+        DataFrame: 添加了 like_rate / coin_rate / favorite_rate / quality_score 列
+    """
+    import numpy as np
+
+    view = df['view'].to_numpy(dtype=np.float64)
+    has_view = view > 0
+    for rate, field in zip(RATE_FIELDS, ['like', 'coin', 'favorite']):
+        values = df[field].to_numpy(dtype=np.float64)
+        df[rate] = np.divide(values, view, out=np.zeros_like(view), where=has_view)
+
+    score = np.zeros(len(df))
+    for rate, weight in weights.items():
+        score += weight * df[rate].to_numpy()
+    df['quality_score'] = score
+    return df
+
+
+def quality_mask(df, threshold=LIKE_RATE_THRESHOLD, min_score=MIN_QUALITY_SCORE, strict=False):
+    """
+    生成高质量视频的筛选掩码
+
+    Args:
+        df: score_frame 的结果
+        threshold: 点赞率阈值
+        min_score: 可选的质量分下限，None 表示不启用
+        strict: True 时要求点赞率 > 阈值且播放数 > 0（分类排行榜的规则），
+                否则点赞率 >= 阈值即可（热门页面的规则）
+
+    Returns:
+        ndarray: 布尔掩码
+    """
+    like_rate = df['like_rate'].to_numpy()
+    if strict:
+        mask = (like_rate > threshold) & (df['view'].to_numpy() > 0)
+    else:
+        mask = like_rate >= threshold
+    if min_score is not None:
+        mask &= df['quality_score'].to_numpy() >= min_score
+    return mask
+
+
+def filter_videos(video_list, threshold=LIKE_RATE_THRESHOLD, min_score=MIN_QUALITY_SCORE, strict=False,
+                  weights=QUALITY_WEIGHTS):
+    """
+    一次完成转换、评分和筛选
+
+    常驻进程（daemon.py）重新加载配置后，调用方应显式传入当前的阈值和权重，
+    默认值只在导入时确定。
+
+    Returns:
+        DataFrame: 通过筛选的视频，保持原有顺序，索引为在 video_list 中的位置
+    """
+    df = score_frame(page_to_frame(video_list), weights)
+    return df[quality_mask(df, threshold, min_score, strict)]
+
+
+def frame_to_rows(video_list, df):
+    """
+    为筛选后的视频生成记录，与 BilibiliPopularCrawler.process_video_data 的结果相同
+
+    Args:
+        video_list: 传给 page_to_frame 的原始列表
+        df: filter_videos 的结果（索引为在 video_list 中的位置）
+
+    Returns:
+        list: VideoRecord 列表
+    """
+    columns = [df[field].tolist() for field in STAT_FIELDS + ['like_rate', 'duration', 'pubdate']]
+    rows = []
+    for pos, view, like, coin, favorite, share, reply, danmaku, like_rate, duration, pubdate in zip(
+            df.index.tolist(), *columns):
+        video = video_list[pos]
+        rows.append(VideoRecord(
+            bvid=video.get('bvid', ''),
+            title=video.get('title', '').strip(),
+            author=(video.get('owner') or {}).get('name', ''),
+            view=view,
+            like=like,
+            coin=coin,
+            favorite=favorite,
+            share=share,
+            reply=reply,
+            danmaku=danmaku,
+            like_rate=round(like_rate, 4),
+            duration=duration,
+            pubdate=pubdate,
+            pic=video.get('pic', ''),
+            desc=video.get('desc', '').strip()[:200],
+        ))
+    return rows
+
+
+def load_raw_pages(paths):
+    """读取保存的原始 API 响应，拼接所有页面的 data.list"""
+    videos = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        videos.extend((data.get('data') or {}).get('list') or [])
+    return videos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对保存的原始页面批量筛选评分")
+    parser.add_argument("paths", nargs="+", help="原始 API 响应 JSON 文件")
+    parser.add_argument("--threshold", type=float, default=LIKE_RATE_THRESHOLD, help="点赞率阈值")
+    parser.add_argument("--min-score", type=float, default=MIN_QUALITY_SCORE, help="质量分下限")
+    parser.add_argument("--top", type=int, default=10, help="按质量分显示前N条")
+    args = parser.parse_args()
+
+    videos = load_raw_pages(args.paths)
+    start = time.perf_counter()
+    df = filter_videos(videos, args.threshold, args.min_score)
+    elapsed = time.perf_counter() - start
+
+    print(f"📊 共 {len(videos)} 条记录，筛选出 {len(df)} 条，耗时 {elapsed:.3f} 秒")
+    for pos, row in df.nlargest(args.top, 'quality_score').iterrows():
+        video = videos[pos]
+        print(f"  {video.get('title', '')[:25]} - {(video.get('owner') or {}).get('name', '')} - "
+              f"点赞率:{row['like_rate']:.4f} 投币率:{row['coin_rate']:.4f} "
+              f"收藏率:{row['favorite_rate']:.4f} 质量分:{row['quality_score']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+请求限速器
+
+功能：
+1. 令牌桶（TokenBucket）：按固定速率发放令牌，允许少量突发
+2. 按主机限速（HostRateLimiter）：每个域名一个令牌桶，线程安全
+3. 自适应限速（AdaptiveRateController）：AIMD 调整速率，响应正常时线性加速，
+   遇到 -352 / 412 / 429 时速率减半并按指数退避（带抖动）暂停该主机
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from config import (REQUESTS_PER_SECOND, RATE_BURST, ADAPTIVE_MIN_RATE, ADAPTIVE_MAX_RATE,
+                    ADAPTIVE_INCREASE, ADAPTIVE_DECREASE_FACTOR, BACKOFF_BASE, BACKOFF_MAX)
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=RATE_BURST):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量，即允许的最大突发请求数
+        """
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于0: {rate}")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def set_rate(self, rate):
+        """修改补充速率，已积累的令牌按旧速率结算"""
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+    def wait_time(self, tokens=1):
+        """获取令牌还需等待的秒数，不消耗令牌"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def try_acquire(self, tokens=1):
+        """
+        尝试立即获取令牌
+
+        Returns:
+            float: 0 表示获取成功，否则为还需等待的秒数
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """阻塞直到获取到令牌，返回实际等待的秒数"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    """按主机划分的限速器，每个域名独立一个令牌桶"""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=RATE_BURST, bucket_factory=None):
+        """
+        Args:
+            rate: 每个主机每秒的请求数
+            burst: 令牌桶容量
+            bucket_factory: 可选，bucket_factory(主机, rate, burst) 创建令牌桶，
+                            用于多个进程共享同一份速率（见 work_queue.SharedTokenBucket）；默认为进程内的 TokenBucket
+        """
+        self.rate = rate
+        self.burst = burst
+        self.bucket_factory = bucket_factory
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url):
+        """获取 url 所属主机的令牌桶"""
+        host = urlparse(url).netloc or url
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                if self.bucket_factory is not None:
+                    bucket = self.bucket_factory(host, self.rate, self.burst)
+                else:
+                    bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url):
+        """请求 url 前调用，阻塞到该主机有可用令牌"""
+        return self.bucket_for(url).acquire()
+
+    def wait_time(self, url):
+        """该主机下一个令牌还需等待的秒数，不消耗令牌"""
+        return self.bucket_for(url).wait_time()
+
+
+class AdaptiveRateController(HostRateLimiter):
+    """
+    AIMD 自适应限速器
+
+    每个主机独立调整：正常响应后速率增加 increase（不超过 max_rate）；
+    被限流时速率乘以 decrease_factor（不低于 min_rate），并让该主机的所有请求
+    暂停一段指数增长、带随机抖动的退避时间，连续被限流时退避时间翻倍。
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=RATE_BURST, min_rate=ADAPTIVE_MIN_RATE,
+                 max_rate=ADAPTIVE_MAX_RATE, increase=ADAPTIVE_INCREASE,
+                 decrease_factor=ADAPTIVE_DECREASE_FACTOR, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX, bucket_factory=None):
+        """
+        Args:
+            rate: 初始速率（次/秒）
+            burst: 令牌桶容量
+            min_rate / max_rate: 速率调整范围
+            increase: 每次正常响应增加的速率
+            decrease_factor: 被限流时速率的缩小倍数
+            backoff_base / backoff_max: 退避时间的基数和上限（秒）
+            bucket_factory: 同 HostRateLimiter
+        """
+        super().__init__(rate, burst, bucket_factory)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._state = {}  # 主机 -> 统计与退避状态
+        self.events = deque(maxlen=200)  # 最近的退避事件
+
+    def _host_state(self, url):
+        host = urlparse(url).netloc or url
+        with self._lock:
+            state = self._state.get(host)
+            if state is None:
+                state = {'host': host, 'successes': 0, 'backoffs': 0, 'consecutive': 0,
+                         'blocked_until': 0.0, 'reasons': {}}
+                self._state[host] = state
+            return state
+
+    def acquire(self, url):
+        """请求前调用：先等退避结束，再取令牌"""
+        state = self._host_state(url)
+        waited = 0.0
+        while True:
+            pause = state['blocked_until'] - time.monotonic()
+            if pause <= 0:
+                break
+            time.sleep(pause)
+            waited += pause
+        return waited + self.bucket_for(url).acquire()
+
+    def wait_time(self, url):
+        """退避剩余时间和令牌等待时间中较长的一个，不消耗令牌"""
+        pause = self._host_state(url)['blocked_until'] - time.monotonic()
+        return max(pause, super().wait_time(url))
+
+    def on_success(self, url):
+        """正常响应：加性增加速率"""
+        bucket = self.bucket_for(url)
+        state = self._host_state(url)
+        with self._lock:
+            state['successes'] += 1
+            state['consecutive'] = 0
+            # 读取和写回速率都在控制器锁内完成，避免并发调整互相覆盖
+            new_rate = min(self.max_rate, bucket.rate + self.increase)
+            if new_rate != bucket.rate:
+                bucket.set_rate(new_rate)
+
+    def on_throttle(self, url, reason):
+        """
+        被限流：乘性减小速率，并让该主机暂停一段退避时间
+
+        Args:
+            url: 请求地址
+            reason: 限流原因，如 'code -352'、'HTTP 412'
+
+        Returns:
+            float: 本次退避的秒数
+        """
+        bucket = self.bucket_for(url)
+        state = self._host_state(url)
+        with self._lock:
+            state['backoffs'] += 1
+            state['consecutive'] += 1
+            state['reasons'][reason] = state['reasons'].get(reason, 0) + 1
+            new_rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+            # 指数退避 + 抖动：取 [backoff/2, backoff] 之间的随机值，避免多个线程同时恢复
+            backoff = min(self.backoff_max, self.backoff_base * 2 ** (state['consecutive'] - 1))
+            backoff = backoff / 2 + random.uniform(0, backoff / 2)
+            state['blocked_until'] = max(state['blocked_until'], time.monotonic() + backoff)
+            self.events.append({'time': time.time(), 'host': state['host'], 'reason': reason,
+                                'rate': new_rate, 'backoff': round(backoff, 3)})
+            bucket.set_rate(new_rate)
+        logger.warning(f"🐢 {state['host']} 触发限流（{reason}），速率降至 {new_rate:.2f} 次/秒，退避 {backoff:.1f} 秒")
+        return backoff
+
+    def metrics(self):
+        """
+        当前限速状态
+
+        Returns:
+            dict: {主机: {'rate', 'successes', 'backoffs', 'reasons'}}
+        """
+        with self._lock:
+            return {host: {'rate': round(self._buckets[host].rate, 3) if host in self._buckets else self.rate,
+                           'successes': state['successes'],
+                           'backoffs': state['backoffs'],
+                           'reasons': dict(state['reasons'])}
+                    for host, state in self._state.items()}
@@ -0,0 +1,174 @@
+"""
+原始API响应缓存
+
+功能：
+1. 把API返回的原始JSON按 接口+参数 压缩（zlib）保存到 SQLite，调整阈值或行结构后不用重新爬取
+2. 有效期内直接使用缓存；过期后带 If-None-Match / If-Modified-Since 重新请求，304 时沿用缓存
+3. 压缩后总大小超过上限时，按最近使用时间淘汰（LRU）
+4. 离线模式（--offline）只读缓存，不发任何网络请求，可以在本地以磁盘速度重跑筛选和导出
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+from config import RESPONSE_CACHE_DB, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL
+
+
+def cache_key(url, params=None):
+    """缓存键：完整URL + 按名称排序的查询参数"""
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted(params.items()))}"
+
+
+class CachedResponse:
+    """一条缓存记录"""
+
+    __slots__ = ('body', 'fetched_at', 'etag', 'last_modified')
+
+    def __init__(self, body, fetched_at, etag=None, last_modified=None):
+        self.body = body  # 解压后的原始响应字节
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self):
+        """重新验证时使用的条件请求头"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """线程安全的原始响应缓存"""
+
+    def __init__(self, db_path=RESPONSE_CACHE_DB, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            ttl: 缓存有效期（秒）
+            max_bytes: 压缩后总大小上限（字节）
+        """
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0  # 过期后服务器返回 304、沿用缓存的次数
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " fetched_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key):
+        """
+        读取一条缓存（不论是否过期），并更新最近使用时间
+
+        Returns:
+            CachedResponse: 不存在时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, fetched_at, etag, last_modified FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        body, fetched_at, etag, last_modified = row
+        return CachedResponse(zlib.decompress(body), fetched_at, etag, last_modified)
+
+    def iter_bodies(self):
+        """
+        遍历全部缓存（不更新最近使用时间），用于离线基准等批量读取
+
+        Yields:
+            tuple: (缓存键, 解压后的正文)
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT key, body FROM responses ORDER BY key").fetchall()
+        for key, body in rows:
+            yield key, zlib.decompress(body)
+
+    def put(self, key, body, etag=None, last_modified=None):
+        """
+        保存一条原始响应，必要时淘汰最久未使用的条目
+
+        Args:
+            key: cache_key 的结果
+            body: 原始响应字节
+            etag / last_modified: 响应头，用于之后的条件请求
+        """
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, etag, last_modified, fetched_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, compressed, len(compressed), etag, last_modified, now, now),
+            )
+            self._total_bytes += len(compressed) - (old[0] if old else 0)
+            self._evict_locked()
+            self._conn.commit()
+
+    def touch(self, key):
+        """服务器返回 304 时刷新获取时间，缓存重新计入有效期"""
+        now = time.time()
+        with self._lock:
+            self.revalidated += 1
+            self._conn.execute("UPDATE responses SET fetched_at = ?, last_used = ? WHERE key = ?",
+                               (now, now, key))
+            self._conn.commit()
+
+    def _evict_locked(self):
+        # 按 last_used 从旧到新删除，直到总大小回到上限以内
+        if self._total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if self._total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
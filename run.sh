@@ -14,10 +14,10 @@ if ! command -v python &> /dev/null; then
 fi
 
 # 检查依赖
-python -c "import pandas, requests" 2>/dev/null
+python -c "import requests" 2>/dev/null
 if [ $? -ne 0 ]; then
     echo "⚠️  缺少依赖，正在安装..."
-    pip install pandas requests
+    pip install requests
 fi
 
 # 运行爬虫
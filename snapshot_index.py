@@ -0,0 +1,532 @@
+"""
+历史快照查询索引
+
+功能：
+1. 把 data/popular/ 和 data/ranking/ 下每次运行的最终CSV收进一个紧凑的列式索引：
+   每个数值列一个 .npy 文件，另有每个指标按值升序排列的行号（order_<指标>.npy），
+   查询时以内存映射方式打开，只读取用到的列和行
+2. 增量更新：按 路径 + 修改时间 + 大小 记录收录过的文件，只读取新的运行结果
+   （分类排行榜CSV每次运行都会覆盖，覆盖后作为一次新快照收录）；
+   每次更新写入一个新分段，分段超过 QUERY_INDEX_MAX_SEGMENTS 个时合并为一个
+3. (来源, bvid) → 最近一次快照的行号：默认只查询每个视频在每个来源的最新数据
+4. 前K名：每个分段沿排序指标从大到小分块读取、检查条件，各分段的结果用堆做K路归并，
+   凑够K个视频即停止，不对全部快照排序
+5. 范围条件：在按指标排好序的行号上二分查找，从最窄的条件取候选行，再检查其余条件
+6. 原CSV删除后，已收录的快照仍保留在索引中；--rebuild 按现有文件重建
+
+用法：
+    python cli.py query --top 50 --source popular --since-hours 720
+    python cli.py query --source 知识 --where "like_rate>0.2" --where "view>1000000" --all
+"""
+
+import bisect
+import csv
+import glob
+import heapq
+import operator
+import os
+import re
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+
+from config import CSV_PREFIX, POPULAR_DIR, QUERY_INDEX_DIR, QUERY_INDEX_MAX_SEGMENTS, RANKING_DIR
+from storage import RANKING_FIELD_MAP
+from video_record import VIDEO_URL
+
+# 每个分段保存的列和类型；video / source / tname 为 SQLite 中的编号，tname 没有时为 0
+COLUMN_TYPES = {
+    'video': np.int32,
+    'source': np.int32,
+    'tname': np.int32,
+    'crawled_at': np.int64,
+    'view': np.int64,
+    'like': np.int64,
+    'coin': np.int64,
+    'favorite': np.int64,
+    'share': np.int64,
+    'reply': np.int64,
+    'danmaku': np.int64,
+    'duration': np.int64,
+    'like_rate': np.float64,
+}
+# 预先排序、可用于前K名和二分查找的指标
+INDEX_METRICS = ('like_rate', 'view', 'like', 'coin', 'favorite', 'share', 'reply', 'danmaku', 'crawled_at')
+# 可以出现在条件中的列
+FILTER_COLUMNS = INDEX_METRICS + ('duration',)
+METRIC_COLUMNS = [name for name in COLUMN_TYPES if name not in ('video', 'source', 'tname', 'crawled_at')]
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '=': operator.eq}
+CONDITION_PATTERN = re.compile(r'^\s*(\w+)\s*(>=|<=|>|<|=)\s*([-+0-9.eE]+)\s*$')
+TOPK_CHUNK_ROWS = 1024  # 前K名每次从排序列读取的行数，之后逐次翻倍
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path        TEXT PRIMARY KEY,
+    mtime_ns    INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    rows        INTEGER NOT NULL,
+    indexed_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id          INTEGER PRIMARY KEY,
+    row_offset  INTEGER NOT NULL,
+    rows        INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS videos (
+    id          INTEGER PRIMARY KEY,
+    bvid        TEXT UNIQUE NOT NULL,
+    title       TEXT,
+    author      TEXT
+);
+"""
+
+RESULT_COLUMNS = ['rank', 'bvid', 'title', 'author', 'source', 'tname', 'view', 'like', 'like_rate',
+                  'coin', 'favorite', 'share', 'reply', 'danmaku', 'duration', 'crawled_at', 'url']
+
+
+def parse_condition(text):
+    """
+    解析条件表达式，如 'like_rate>0.2'、'view>=1000000'
+
+    Returns:
+        tuple: (列名, 运算符, 数值)
+
+    Raises:
+        ValueError: 表达式无效或列不能用于筛选
+    """
+    match = CONDITION_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"无效的条件: {text}（格式如 like_rate>0.2）")
+    column, op, value = match.groups()
+    if column not in FILTER_COLUMNS:
+        raise ValueError(f"不能按 {column} 筛选（可选 {', '.join(FILTER_COLUMNS)}）")
+    return column, op, float(value)
+
+
+def _number(value, cast=int):
+    if value is None or value == '':
+        return 0
+    return cast(float(value)) if cast is int else cast(value)
+
+
+def _popular_crawled_at(path):
+    """热门CSV的文件名带有爬取时间（B站热门-高质量-YYYYmmdd_HHMMSS.csv），解析失败时用修改时间"""
+    stamp = os.path.basename(path).rsplit('-', 1)[-1][:-len('.csv')]
+    try:
+        return int(time.mktime(time.strptime(stamp, "%Y%m%d_%H%M%S")))
+    except ValueError:
+        return int(os.path.getmtime(path))
+
+
+def find_snapshot_files(popular_dir=POPULAR_DIR, ranking_dir=RANKING_DIR):
+    """
+    找出两种爬虫的最终CSV
+
+    Returns:
+        list: [(路径, 来源, 爬取时间戳)]，来源为 'popular' 或分类名
+    """
+    files = [(path, 'popular', _popular_crawled_at(path))
+             for path in sorted(glob.glob(os.path.join(popular_dir, "B站热门-高质量-*.csv")))]
+    prefix, suffix = f"{CSV_PREFIX}-", "-高质量.csv"
+    for path in sorted(glob.glob(os.path.join(ranking_dir, f"{prefix}*{suffix}"))):
+        category = os.path.basename(path)[len(prefix):-len(suffix)]
+        files.append((path, category, int(os.path.getmtime(path))))
+    return files
+
+
+def read_snapshot_rows(path):
+    """
+    读取一个最终CSV，分类排行榜的中文表头映射为统一列名，没有 bvid 列时从视频地址推出
+
+    Yields:
+        dict: 统一列名的数据行（值为字符串）
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            row = {RANKING_FIELD_MAP.get(name, name): value for name, value in row.items()}
+            if not row.get('bvid') and row.get('url'):
+                row['bvid'] = row['url'].rstrip('/').rsplit('/', 1)[-1]
+            if row.get('bvid'):
+                yield row
+
+
+class _SortedView:
+    """把 (列, 升序行号) 当作一个有序序列，供 bisect 在内存映射的数组上二分查找"""
+
+    __slots__ = ('values', 'order')
+
+    def __init__(self, values, order):
+        self.values = values
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, position):
+        return self.values[self.order[position]]
+
+
+class _Segment:
+    """一个分段：目录下每列一个 .npy 文件，按需以内存映射方式打开"""
+
+    def __init__(self, directory, segment_id, offset, rows):
+        self.id = segment_id
+        self.directory = directory
+        self.offset = offset
+        self.rows = rows
+        self._arrays = {}
+
+    def array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+
+    def span(self, column, conditions):
+        """
+        column 列上的条件在升序行号中对应的区间
+
+        Returns:
+            tuple: (lo, hi)，order_<column>[lo:hi] 是满足这些条件的行
+        """
+        view = _SortedView(self.array(column), self.array(f"order_{column}"))
+        lo, hi = 0, self.rows
+        for name, op, value in conditions:
+            if name != column:
+                continue
+            if op in ('>', '>='):
+                lo = max(lo, (bisect.bisect_right if op == '>' else bisect.bisect_left)(view, value))
+            elif op in ('<', '<='):
+                hi = min(hi, (bisect.bisect_left if op == '<' else bisect.bisect_right)(view, value))
+            else:
+                lo = max(lo, bisect.bisect_left(view, value))
+                hi = min(hi, bisect.bisect_right(view, value))
+        return lo, max(lo, hi)
+
+
+def write_segment(directory, columns):
+    """写出一个分段：各列和每个指标的升序行号"""
+    os.makedirs(directory, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), values)
+    for name in INDEX_METRICS:
+        order = np.argsort(columns[name], kind='stable').astype(np.int32)
+        np.save(os.path.join(directory, f"order_{name}.npy"), order)
+
+
+class SnapshotIndex:
+    """历史快照索引；单进程使用"""
+
+    def __init__(self, index_dir=QUERY_INDEX_DIR, max_segments=QUERY_INDEX_MAX_SEGMENTS):
+        """
+        Args:
+            index_dir: 索引目录（SQLite 元数据 + 各分段的 .npy 文件）
+            max_segments: 分段数超过该值时合并为一个
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_dir = index_dir
+        self.max_segments = max_segments
+        self._conn = sqlite3.connect(os.path.join(index_dir, "index.sqlite3"))
+        self._conn.executescript(INDEX_SCHEMA)
+        self._conn.commit()
+        self._segments = None
+        self._latest_mask = None
+
+    # ---- 元数据 ----
+
+    def __len__(self):
+        return self._conn.execute("SELECT COALESCE(SUM(rows), 0) FROM segments").fetchone()[0]
+
+    def segments(self):
+        if self._segments is None:
+            self._segments = [
+                _Segment(self._segment_dir(segment_id), segment_id, offset, rows)
+                for segment_id, offset, rows in self._conn.execute(
+                    "SELECT id, row_offset, rows FROM segments ORDER BY row_offset")
+            ]
+        return self._segments
+
+    def _segment_dir(self, segment_id):
+        return os.path.join(self.index_dir, f"seg-{segment_id:06d}")
+
+    def _name_ids(self, names):
+        """名称 → 编号，没有的名称新建"""
+        self._conn.executemany("INSERT OR IGNORE INTO names (name) VALUES (?)", [(name,) for name in names])
+        return dict(self._conn.execute("SELECT name, id FROM names"))
+
+    def name_id(self, name):
+        row = self._conn.execute("SELECT id FROM names WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _reset_cache(self):
+        self._segments = None
+        self._latest_mask = None
+
+    # ---- 增量更新 ----
+
+    def update(self, popular_dir=POPULAR_DIR, ranking_dir=RANKING_DIR):
+        """
+        收录新的或被覆盖过的CSV，写入一个新分段
+
+        Returns:
+            tuple: (收录的文件数, 新增的行数)
+        """
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                 self._conn.execute("SELECT path, mtime_ns, size FROM files")}
+        pending = []
+        for path, source, crawled_at in find_snapshot_files(popular_dir, ranking_dir):
+            stat = os.stat(path)
+            if known.get(path) != (stat.st_mtime_ns, stat.st_size):
+                pending.append((path, source, crawled_at, stat))
+        if not pending:
+            return 0, 0
+
+        rows = []
+        for path, source, crawled_at, stat in pending:
+            file_rows = [(source, crawled_at, row) for row in read_snapshot_rows(path)]
+            rows.extend(file_rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, rows, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_mtime_ns, stat.st_size, len(file_rows), time.time()),
+            )
+
+        if rows:
+            self._append_segment(rows)
+        self._conn.commit()
+        self._reset_cache()
+        if len(self.segments()) > self.max_segments:
+            self.compact()
+        return len(pending), len(rows)
+
+    def _append_segment(self, rows):
+        """把一批数据行写成新分段，并更新 (来源, bvid) → 最新行号"""
+        # 标题和作者以最后收录的为准
+        self._conn.executemany(
+            "INSERT INTO videos (bvid, title, author) VALUES (?, ?, ?)"
+            " ON CONFLICT(bvid) DO UPDATE SET title = excluded.title, author = excluded.author",
+            [(row['bvid'], row.get('title'), row.get('author')) for _, _, row in rows],
+        )
+        video_ids = dict(self._conn.execute("SELECT bvid, id FROM videos"))
+        names = {source for source, _, _ in rows} | {row['tname'] for _, _, row in rows if row.get('tname')}
+        name_ids = self._name_ids(names)
+
+        columns = {
+            'video': [video_ids[row['bvid']] for _, _, row in rows],
+            'source': [name_ids[source] for source, _, _ in rows],
+            'tname': [name_ids.get(row.get('tname'), 0) for _, _, row in rows],
+            'crawled_at': [crawled_at for _, crawled_at, _ in rows],
+        }
+        for name in METRIC_COLUMNS:
+            cast = float if COLUMN_TYPES[name] is np.float64 else int
+            columns[name] = [_number(row.get(name), cast) for _, _, row in rows]
+        columns = {name: np.asarray(values, dtype=COLUMN_TYPES[name]) for name, values in columns.items()}
+
+        offset = len(self)
+        cursor = self._conn.execute("INSERT INTO segments (row_offset, rows) VALUES (?, ?)", (offset, len(rows)))
+        write_segment(self._segment_dir(cursor.lastrowid), columns)
+        self._update_latest(columns, offset)
+
+    def _latest_path(self, name):
+        return os.path.join(self.index_dir, f"latest_{name}.npy")
+
+    def _update_latest(self, columns, offset):
+        """
+        合并新分段的 (来源, bvid) → 最新行号；同一键取爬取时间最晚的行，时间相同取后收录的行
+        """
+        keys = (columns['source'].astype(np.int64) << 32) | columns['video'].astype(np.int64)
+        rows = np.arange(offset, offset + len(keys), dtype=np.int64)
+        crawled = columns['crawled_at']
+        if os.path.exists(self._latest_path('key')):
+            old_keys = np.load(self._latest_path('key'))
+            old_rows = np.load(self._latest_path('row'))
+            old_crawled = np.load(self._latest_path('crawled_at'))
+            keys = np.concatenate([old_keys, keys])
+            rows = np.concatenate([old_rows, rows])
+            crawled = np.concatenate([old_crawled, crawled])
+        order = np.lexsort((rows, crawled, keys))
+        keys, rows, crawled = keys[order], rows[order], crawled[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        np.save(self._latest_path('key'), keys[last])
+        np.save(self._latest_path('row'), rows[last])
+        np.save(self._latest_path('crawled_at'), crawled[last])
+
+    def compact(self):
+        """把所有分段按原顺序合并为一个；全局行号不变，最新行号映射不需要重算"""
+        segments = self.segments()
+        if len(segments) <= 1:
+            return
+        columns = {name: np.concatenate([np.asarray(segment.array(name)) for segment in segments])
+                   for name in COLUMN_TYPES}
+        cursor = self._conn.execute("INSERT INTO segments (row_offset, rows) VALUES (0, ?)",
+                                    (len(columns['video']),))
+        write_segment(self._segment_dir(cursor.lastrowid), columns)
+        old_ids = [segment.id for segment in segments]
+        self._conn.executemany("DELETE FROM segments WHERE id = ?", [(segment_id,) for segment_id in old_ids])
+        self._conn.commit()
+        self._reset_cache()
+        for segment_id in old_ids:
+            shutil.rmtree(self._segment_dir(segment_id), ignore_errors=True)
+
+    def rebuild(self, popular_dir=POPULAR_DIR, ranking_dir=RANKING_DIR):
+        """清空索引，按现有CSV重新收录"""
+        self._conn.executescript("DELETE FROM files; DELETE FROM segments; DELETE FROM names; DELETE FROM videos;")
+        self._conn.commit()
+        for path in glob.glob(os.path.join(self.index_dir, "seg-*")):
+            shutil.rmtree(path, ignore_errors=True)
+        for path in glob.glob(self._latest_path('*')):
+            os.remove(path)
+        self._reset_cache()
+        return self.update(popular_dir, ranking_dir)
+
+    # ---- 查询 ----
+
+    def _latest(self):
+        """全局行号上的布尔掩码：该行是否为其 (来源, bvid) 的最新快照"""
+        if self._latest_mask is None:
+            mask = np.zeros(len(self), dtype=bool)
+            if os.path.exists(self._latest_path('row')):
+                mask[np.load(self._latest_path('row'))] = True
+            self._latest_mask = mask
+        return self._latest_mask
+
+    def _mask(self, segment, rows, conditions, latest):
+        """segment 中 rows 这些行是否满足全部条件"""
+        mask = np.ones(len(rows), dtype=bool)
+        for name, op, value in conditions:
+            mask &= OPERATORS[op](np.asarray(segment.array(name)[rows]), value)
+        if latest:
+            mask &= self._latest()[segment.offset + rows]
+        return mask
+
+    def _iter_ranked(self, segment, by, conditions, latest):
+        """
+        按 by 从大到小逐块读取分段中满足条件的行
+
+        Yields:
+            tuple: (by 的值, 全局行号)
+        """
+        order = segment.array(f"order_{by}")
+        values = segment.array(by)
+        lo, end = segment.span(by, conditions)
+        chunk = TOPK_CHUNK_ROWS
+        while end > lo:
+            start = max(lo, end - chunk)
+            rows = np.asarray(order[start:end])[::-1]
+            rows = rows[self._mask(segment, rows, conditions, latest)]
+            yield from zip(np.asarray(values[rows]).tolist(), (rows + segment.offset).tolist())
+            end = start
+            chunk *= 2
+
+    def _filter_rows(self, segment, by, conditions, latest):
+        """
+        分段中满足条件的全部行：从二分查找得到的最窄区间取候选行，再检查其余条件
+
+        Returns:
+            tuple: (by 的值数组, 全局行号数组)
+        """
+        candidates = None
+        for column in {name for name, _, _ in conditions if name in INDEX_METRICS}:
+            lo, hi = segment.span(column, conditions)
+            if candidates is None or hi - lo < candidates[2] - candidates[1]:
+                candidates = (column, lo, hi)
+        if candidates is None:
+            rows = np.arange(segment.rows)
+        else:
+            column, lo, hi = candidates
+            rows = np.asarray(segment.array(f"order_{column}")[lo:hi])
+        rows = rows[self._mask(segment, rows, conditions, latest)]
+        return np.asarray(segment.array(by)[rows]), rows + segment.offset
+
+    def query(self, by='like_rate', limit=None, conditions=(), source=None, tname=None, since=None,
+              latest=True):
+        """
+        查询视频
+
+        Args:
+            by: 排序指标（INDEX_METRICS 之一），从大到小
+            limit: 返回的视频数，None 表示返回全部满足条件的视频
+            conditions: parse_condition 的结果列表
+            source: 只查询该来源（'popular' 或分类名）
+            tname: 只查询该分区（需要 --enrich 补充过分区的数据）
+            since: 只查询该时间戳之后爬取的快照
+            latest: 只使用每个 (来源, bvid) 的最新快照；为 False 时查询全部快照
+
+        Returns:
+            list: 结果行（RESULT_COLUMNS），同一视频只出现一次（保留排在最前的快照）
+        """
+        if by not in INDEX_METRICS:
+            raise ValueError(f"不能按 {by} 排序（可选 {', '.join(INDEX_METRICS)}）")
+        conditions = list(conditions)
+        for column, name in (('source', source), ('tname', tname)):
+            if name is not None:
+                name_id = self.name_id(name)
+                if name_id is None:
+                    return []
+                conditions.append((column, '=', name_id))
+        if since is not None:
+            conditions.append(('crawled_at', '>=', since))
+
+        segments = [segment for segment in self.segments() if segment.rows]
+        if limit is not None:
+            # 各分段已按 by 从大到小输出，堆归并后取够 limit 个不同的视频即停止
+            ranked = heapq.merge(*(self._iter_ranked(segment, by, conditions, latest) for segment in segments),
+                                 key=operator.itemgetter(0), reverse=True)
+            rows = (row for _, row in ranked)
+        else:
+            parts = [self._filter_rows(segment, by, conditions, latest) for segment in segments]
+            if not parts:
+                return []
+            values = np.concatenate([part[0] for part in parts])
+            global_rows = np.concatenate([part[1] for part in parts])
+            rows = global_rows[np.argsort(-values, kind='stable')].tolist()
+        return self._materialize(rows, limit)
+
+    def _locate(self, row):
+        offsets = [segment.offset for segment in self.segments()]
+        segment = self.segments()[bisect.bisect_right(offsets, row) - 1]
+        return segment, row - segment.offset
+
+    def _materialize(self, rows, limit):
+        """把全局行号转换为结果行，按视频去重"""
+        results = []
+        seen = set()
+        for row in rows:
+            segment, local = self._locate(row)
+            video = int(segment.array('video')[local])
+            if video in seen:
+                continue
+            seen.add(video)
+            results.append({name: segment.array(name)[local].item() for name in COLUMN_TYPES})
+            if limit is not None and len(results) >= limit:
+                break
+
+        names = dict(self._conn.execute("SELECT id, name FROM names"))
+        video_ids = [result['video'] for result in results]
+        videos = {}
+        for start in range(0, len(video_ids), 500):
+            chunk = video_ids[start:start + 500]
+            videos.update((video_id, (bvid, title, author)) for video_id, bvid, title, author in self._conn.execute(
+                f"SELECT id, bvid, title, author FROM videos WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+        for rank, result in enumerate(results, 1):
+            bvid, title, author = videos[result.pop('video')]
+            result.update(rank=rank, bvid=bvid, title=title, author=author, url=VIDEO_URL.format(bvid),
+                          source=names.get(result['source']), tname=names.get(result['tname']))
+        return results
+
+    def close(self):
+        self._reset_cache()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
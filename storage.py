@@ -0,0 +1,325 @@
+"""
+输出存储后端
+
+功能：
+1. 统一两种爬虫的输出格式选择（--format csv / parquet / sqlite）
+2. Parquet 列式存储：整数列用 int64，作者列字典编码，
+   按 date=YYYY-MM-DD/category=分类 分区，下游可以只读需要的列和分区
+3. pyarrow 为可选依赖，只有选择 parquet 格式时才导入
+4. SQLite 时序库：videos 维度表 + 只追加的 stats_snapshots 快照表，
+   每次爬取在一个事务内批量 upsert，记录每个 bvid 的数据变化历史
+5. 从时序库读出每个视频的最新快照，供 cli.py export 导出
+6. 详情补充（--enrich）的分区、分P数和标签写入 Parquet 的同名列和时序库的 videos 表，
+   旧的时序库打开时自动加上这几列
+"""
+
+import os
+import sqlite3
+import time
+import uuid
+
+from config import PARQUET_DIR, PARQUET_ROW_GROUP_ROWS, SQLITE_DB
+from video_record import records_to_columns, records_to_tuples
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'sqlite')
+
+# 统一的列定义（两种爬虫共用），按列类型分组
+INT_FIELDS = ['rank', 'view', 'like', 'coin', 'favorite', 'share', 'reply',
+              'danmaku', 'duration', 'pubdate', 'tid', 'parts']
+FLOAT_FIELDS = ['like_rate']
+DICT_FIELDS = ['author', 'tname']
+STR_FIELDS = ['bvid', 'title', 'url', 'pic', 'desc', 'tags']
+PARQUET_COLUMNS = ['rank', 'bvid', 'title', 'author', 'view', 'like', 'like_rate',
+                   'coin', 'favorite', 'share', 'reply', 'danmaku',
+                   'duration', 'pubdate', 'url', 'pic', 'desc', 'tid', 'tname', 'parts', 'tags']
+
+# 分类排行榜CSV中文列名 -> VideoRecord 字段
+RANKING_FIELD_MAP = {
+    '视频标题': 'title',
+    '视频地址': 'url',
+    '作者': 'author',
+    '播放数': 'view',
+    '弹幕数': 'danmaku',
+    '投币数': 'coin',
+    '点赞数': 'like',
+    '分享数': 'share',
+    '收藏数': 'favorite',
+    '点赞率': 'like_rate',
+    '分区': 'tname',
+    '分P数': 'parts',
+    '标签': 'tags',
+}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet 输出需要安装 pyarrow: pip install pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+
+def parquet_schema():
+    """Parquet 表结构"""
+    pa, _ = _require_pyarrow()
+    fields = []
+    for name in PARQUET_COLUMNS:
+        if name in INT_FIELDS:
+            fields.append(pa.field(name, pa.int64()))
+        elif name in FLOAT_FIELDS:
+            fields.append(pa.field(name, pa.float64()))
+        elif name in DICT_FIELDS:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _coerce(value, name):
+    """CSV 中间文件里的值都是字符串，按列类型转换；空值转为 None"""
+    if value is None or value == '':
+        return None
+    if name in INT_FIELDS:
+        return int(float(value))
+    if name in FLOAT_FIELDS:
+        return float(value)
+    return str(value)
+
+
+def partition_dir(category, date=None, root=PARQUET_DIR):
+    """分区目录：root/date=YYYY-MM-DD/category=分类"""
+    date = date or time.strftime("%Y-%m-%d")
+    return os.path.join(root, f"date={date}", f"category={category}")
+
+
+class ParquetWriter:
+    """按行组写入 Parquet 文件，接口与 StreamingCSVWriter 一致"""
+
+    def __init__(self, category, date=None, root=PARQUET_DIR, row_group_rows=PARQUET_ROW_GROUP_ROWS):
+        """
+        Args:
+            category: 分类名，热门页面为 'popular'
+            date: 分区日期（YYYY-MM-DD），默认今天
+            root: 数据集根目录
+            row_group_rows: 每个行组的行数
+        """
+        pa, pq = _require_pyarrow()
+        self._pa = pa
+        self.schema = parquet_schema()
+        directory = partition_dir(category, date, root)
+        os.makedirs(directory, exist_ok=True)
+        self.filepath = os.path.join(directory, f"part-{time.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+        self.row_group_rows = row_group_rows
+        self.rows_written = 0
+        self._buffer = []
+        self._writer = pq.ParquetWriter(self.filepath, self.schema, compression='zstd')
+
+    def write_rows(self, rows):
+        """写入一批数据，攒满一个行组再落盘"""
+        self._buffer.extend(rows)
+        self.rows_written += len(rows)
+        if len(self._buffer) >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if isinstance(self._buffer[0], dict):
+            # 从中间CSV文件读回的行，值都是字符串
+            columns = {name: [_coerce(row.get(name), name) for row in self._buffer]
+                       for name in PARQUET_COLUMNS}
+        else:
+            # VideoRecord 的值已是正确类型，按列一次取出；rank 等记录没有的列为空
+            columns = records_to_columns(self._buffer, PARQUET_COLUMNS)
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self.schema))
+        self._buffer = []
+
+    def close(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    bvid        TEXT PRIMARY KEY,
+    title       TEXT,
+    author      TEXT,
+    url         TEXT,
+    duration    INTEGER,
+    pubdate     INTEGER,
+    tid         INTEGER,
+    tname       TEXT,
+    parts       INTEGER,
+    tags        TEXT,
+    first_seen  INTEGER NOT NULL,
+    last_seen   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats_snapshots (
+    id          INTEGER PRIMARY KEY,
+    bvid        TEXT NOT NULL REFERENCES videos(bvid),
+    crawled_at  INTEGER NOT NULL,
+    source      TEXT NOT NULL,
+    view        INTEGER,
+    "like"      INTEGER,
+    coin        INTEGER,
+    favorite    INTEGER,
+    share       INTEGER,
+    reply       INTEGER,
+    danmaku     INTEGER,
+    like_rate   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_bvid_time ON stats_snapshots (bvid, crawled_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_time ON stats_snapshots (crawled_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_source_time ON stats_snapshots (source, crawled_at);
+"""
+
+SNAPSHOT_FIELDS = ['view', 'like', 'coin', 'favorite', 'share', 'reply', 'danmaku', 'like_rate']
+VIDEO_COLUMNS = ['bvid', 'title', 'author', 'url', 'duration', 'pubdate', 'tid', 'tname', 'parts', 'tags']
+# 后来加入 videos 表的列，打开旧库时补上
+VIDEO_ADDED_COLUMNS = [('tid', 'INTEGER'), ('tname', 'TEXT'), ('parts', 'INTEGER'), ('tags', 'TEXT')]
+
+
+class SQLiteStatsStore:
+    """
+    视频数据时序库
+
+    一个实例对应一次爬取：所有写入都在同一个事务中，close() 时提交；
+    中途出错则整次爬取回滚，不会留下半批快照。
+    分类排行榜每写完一个分类调用 commit()，即每个分类一个事务，与断点续爬的检查点保持一致；
+    出错时只回滚尚未提交的分类。
+    """
+
+    def __init__(self, db_path=SQLITE_DB, crawled_at=None):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            crawled_at: 本次爬取的时间戳（秒），默认当前时间
+        """
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.filepath = db_path
+        self.crawled_at = int(crawled_at or time.time())
+        self.rows_written = 0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(videos)")}
+        for name, column_type in VIDEO_ADDED_COLUMNS:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE videos ADD COLUMN {name} {column_type}")
+        self._conn.execute("BEGIN")
+
+    def write_rows(self, rows, source='popular'):
+        """
+        批量 upsert 视频信息并追加一批快照
+
+        Args:
+            rows: VideoRecord 列表，或统一列名的 dict 行（值可以是字符串）
+            source: 数据来源，'popular' 或分类名
+        """
+        if rows and not isinstance(rows[0], dict):
+            # VideoRecord：值已是正确类型，按列批量取出
+            videos = [(*values, self.crawled_at, self.crawled_at)
+                      for values in records_to_tuples(rows, VIDEO_COLUMNS)]
+            snapshots = [(bvid, self.crawled_at, source, *values) for bvid, *values in records_to_tuples(
+                rows, ['bvid'] + SNAPSHOT_FIELDS)]
+        else:
+            videos = []
+            snapshots = []
+            for row in rows:
+                bvid = row.get('bvid')
+                if not bvid:
+                    continue
+                videos.append((bvid, *(_coerce(row.get(name), name) for name in VIDEO_COLUMNS[1:]),
+                               self.crawled_at, self.crawled_at))
+                snapshots.append((bvid, self.crawled_at, source,
+                                  *(_coerce(row.get(name), name) for name in SNAPSHOT_FIELDS)))
+
+        # 新视频插入；已有视频更新标题等可变信息，保留 first_seen，空值（如没有补充详情）不覆盖旧值
+        self._conn.executemany(
+            f"INSERT INTO videos ({', '.join(VIDEO_COLUMNS)}, first_seen, last_seen)"
+            f" VALUES ({', '.join('?' * (len(VIDEO_COLUMNS) + 2))})"
+            " ON CONFLICT(bvid) DO UPDATE SET "
+            + ''.join(f"{name} = COALESCE(excluded.{name}, {name}), " for name in VIDEO_COLUMNS[1:])
+            + "last_seen = excluded.last_seen",
+            videos,
+        )
+        self._conn.executemany(
+            'INSERT INTO stats_snapshots (bvid, crawled_at, source, view, "like", coin,'
+            ' favorite, share, reply, danmaku, like_rate) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            snapshots,
+        )
+        self.rows_written += len(snapshots)
+
+    def clear_snapshots(self, source):
+        """删除本次爬取（同一时间戳）已写入的某来源快照，用于续爬后重新写入"""
+        self._conn.execute("DELETE FROM stats_snapshots WHERE crawled_at = ? AND source = ?",
+                           (self.crawled_at, source))
+
+    def commit(self):
+        """提交已写入的数据并开启新事务，用于需要与检查点保持一致的场景"""
+        self._conn.commit()
+        self._conn.execute("BEGIN")
+
+    def close(self):
+        """提交本次爬取的事务"""
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def rollback(self):
+        """放弃本次爬取尚未提交的写入（调用过 commit() 时只放弃之后的写入）"""
+        if self._conn is not None:
+            self._conn.rollback()
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.rollback()
+
+
+def iter_latest_rows(db_path=SQLITE_DB, source=None, since=None):
+    """
+    时序库中每个视频最近一次快照，与视频信息合并为统一列名的行，按点赞率从高到低
+
+    Args:
+        db_path: SQLite 文件路径
+        source: 只读取该来源（'popular' 或分类名）的快照，None 表示全部来源
+        since: 只读取该时间戳（秒）之后的快照
+
+    Yields:
+        dict: 统一列名的数据行，另有 source / crawled_at 列
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(
+            'SELECT v.bvid, v.title, v.author, v.url, v.duration, v.pubdate, v.tid, v.tname, v.parts, v.tags,'
+            ' s.source, s.crawled_at,'
+            ' s.view, s."like", s.coin, s.favorite, s.share, s.reply, s.danmaku, s.like_rate'
+            ' FROM stats_snapshots s JOIN videos v ON v.bvid = s.bvid'
+            ' WHERE s.id IN (SELECT MAX(id) FROM stats_snapshots'
+            '                WHERE (? IS NULL OR source = ?) AND crawled_at >= ? GROUP BY bvid)'
+            ' ORDER BY s.like_rate DESC',
+            (source, source, since or 0),
+        )
+        names = [column[0] for column in cursor.description]
+        for values in cursor:
+            yield dict(zip(names, values))
+    finally:
+        conn.close()
@@ -0,0 +1,42 @@
+"""断点续爬：预取窗口中失败的页在续爬时补上"""
+
+import pytest
+
+from bili_client import BilibiliClient
+from checkpoint import CrawlCheckpoint
+from mock_server import MockBilibiliServer
+from popular_crawler import BilibiliPopularCrawler
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'checkpoint.json'), 'popular')
+    for page in (1, 2, 3, 5):
+        checkpoint.mark_page(page, rows=1)
+    checkpoint.mark_page(4, ok=False)  # 预取窗口中失败，后面的页把 last_pn 推到了 5
+    return checkpoint
+
+
+def test_failed_page_below_last_pn_is_reported(checkpoint):
+    assert checkpoint.state['last_pn'] == 5
+    assert checkpoint.retry_pages == [4]
+    assert checkpoint.stopped_on_errors
+
+
+def test_retried_page_clears_the_failure(checkpoint):
+    checkpoint.mark_page(4, rows=1)
+    assert checkpoint.retry_pages == []
+    assert not checkpoint.stopped_on_errors
+
+
+def test_resume_fetches_failed_pages_first(checkpoint, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with MockBilibiliServer(page_size=20, pages=8) as server:
+        client = BilibiliClient(pool_size=2, max_retries=0, base_url=server.url, homepage_url=server.url + '/')
+        crawler = BilibiliPopularCrawler(client=client)
+        fetched = []
+        fetch_page = crawler.fetch_page
+        monkeypatch.setattr(crawler, 'fetch_page', lambda page: fetched.append(page) or fetch_page(page))
+        crawler.get_popular_videos(target_count=10_000, max_pages=7, window=2, checkpoint=checkpoint)
+    assert fetched == [4, 6, 7]
+    assert not checkpoint.stopped_on_errors
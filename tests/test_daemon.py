@@ -0,0 +1,81 @@
+"""常驻模式调度：写同一个 SQLite 库时两种爬取依次进行"""
+
+import threading
+import time
+
+import pytest
+
+import daemon
+from daemon import CrawlerDaemon, SweepJob
+
+
+@pytest.fixture(autouse=True)
+def short_tick(monkeypatch):
+    monkeypatch.setattr(daemon, 'TICK_SECONDS', 0.05)
+
+
+class OverlapProbe:
+    """记录同时进行的爬取数"""
+
+    def __init__(self, duration=0.3):
+        self.duration = duration
+        self.active = 0
+        self.peak = 0
+        self.order = []
+        self._lock = threading.Lock()
+
+    def sweep(self, name):
+        def target(stop_event):
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                self.order.append(name)
+            time.sleep(self.duration)
+            with self._lock:
+                self.active -= 1
+        return target
+
+
+def run_once(serial):
+    probe = OverlapProbe()
+    jobs = [SweepJob(name, probe.sweep(name), 'DAEMON_RANKING_INTERVAL', interval=60)
+            for name in ("分类排行榜", "热门页面")]
+    start = time.monotonic()
+    CrawlerDaemon(jobs, threading.Event(), jitter=0, once=True, serial=serial).run()
+    return probe, jobs, time.monotonic() - start
+
+
+def test_serial_sweeps_do_not_overlap():
+    probe, jobs, elapsed = run_once(serial=True)
+    assert probe.peak == 1
+    assert probe.order == ["分类排行榜", "热门页面"]
+    assert [job.runs for job in jobs] == [1, 1]
+    assert [job.skipped for job in jobs] == [0, 0]
+    assert elapsed == pytest.approx(0.6, abs=0.3)
+
+
+def test_sweeps_overlap_by_default():
+    probe, jobs, elapsed = run_once(serial=False)
+    assert probe.peak == 2
+    assert [job.runs for job in jobs] == [1, 1]
+
+
+def test_restart_warning_is_logged_once_per_edit(tmp_path, caplog):
+    import config
+
+    path = tmp_path / 'config.py'
+    watcher = daemon.ConfigWatcher(str(path))
+
+    def reload_with(value):
+        path.write_text(f"REQUESTS_PER_SECOND = {value!r}\n", encoding='utf-8')
+        caplog.clear()
+        watcher.reload()
+        return [r.message for r in caplog.records if '需要重启' in r.message]
+
+    changed = config.REQUESTS_PER_SECOND + 1
+    assert len(reload_with(changed)) == 1
+    assert reload_with(changed) == []  # 同一次修改不再重复提示
+    assert len(reload_with(changed + 1)) == 1
+    assert reload_with(config.REQUESTS_PER_SECOND) == []  # 改回运行中的值
+    assert len(reload_with(changed)) == 1
+    assert config.REQUESTS_PER_SECOND == changed - 1  # 需要重启的设置不会被修改
@@ -0,0 +1,158 @@
+"""详情补充：对本地模拟服务器测试缓存命中 / 未命中、请求失败、重新筛选和有界并发"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from bili_client import BilibiliClient
+from bilibili_crawler import is_high_quality
+from enrichment import EnrichmentCache, VideoEnricher
+from mock_server import MockBilibiliServer
+from video_record import VideoRecord
+
+
+@pytest.fixture
+def server():
+    with MockBilibiliServer(page_size=20, pages=5) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return BilibiliClient(pool_size=16, base_url=server.url, homepage_url=server.url + '/')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EnrichmentCache(str(tmp_path / 'enrich.sqlite3'))
+    yield cache
+    cache.close()
+
+
+def listed_videos(server, page=1):
+    """热门第 page 页的视频（请求一次列表，模拟服务器才能查到它们的详情）"""
+    return json.loads(server.popular_body(page, server.page_size))['data']['list']
+
+
+def to_record(video):
+    stat = video['stat']
+    return VideoRecord(bvid=video['bvid'], title=video['title'], view=stat['view'], like=stat['like'],
+                       coin=stat['coin'], favorite=stat['favorite'], like_rate=round(stat['like'] / stat['view'], 4))
+
+
+class CountingClient:
+    """记录同时在途的请求数"""
+
+    def __init__(self, client, delay=0.02):
+        self.client = client
+        self.delay = delay
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get_json(self, path, params=None):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            return self.client.get_json(path, params=params)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_fetch_applies_details_and_fresh_stats(server, client, cache):
+    video = listed_videos(server)[0]
+    record = to_record(video)
+    with VideoEnricher(client, cache) as enricher:
+        kept = enricher.enrich([record])
+    assert kept == [record]
+    assert (record.tid, record.tname, record.parts) == (video['tid'], video['tname'], video['videos'])
+    assert record.tags.split(',')[0] == video['tname']
+    # 模拟服务器的详情统计比列表多约 2%
+    assert record.view == video['stat']['view'] + video['stat']['view'] // 50
+    assert (enricher.fetched, enricher.cached, enricher.failed) == (1, 0, 0)
+
+
+def test_cache_hit_skips_requests_and_keeps_list_stats(server, client, cache):
+    videos = listed_videos(server)[:5]
+    with VideoEnricher(client, cache) as enricher:
+        enricher.enrich([to_record(video) for video in videos])
+
+    counting = CountingClient(client)
+    fresh = [to_record(video) for video in videos]
+    for record in fresh:
+        record.view += 1000  # 列表页比缓存时更新的统计
+    expected_views = [record.view for record in fresh]
+    with VideoEnricher(counting, cache) as enricher:
+        kept = enricher.enrich(fresh)
+    assert counting.requests == 0
+    assert (enricher.fetched, enricher.cached) == (0, 5)
+    assert [record.view for record in kept] == expected_views
+    assert all(record.tname for record in kept)
+
+
+def test_cache_never_stores_stats(server, client, cache):
+    video = listed_videos(server)[0]
+    with VideoEnricher(client, cache) as enricher:
+        enricher.enrich([to_record(video)])
+    details = cache.get_many([video['bvid']])[video['bvid']]
+    assert 'stat' not in details
+
+
+def test_expired_cache_entry_is_fetched_again(server, client, tmp_path):
+    cache = EnrichmentCache(str(tmp_path / 'enrich.sqlite3'), ttl=60)
+    video = listed_videos(server)[0]
+    cache.put_many({video['bvid']: {'tid': 1, 'tname': '旧分区'}}, now=time.time() - 120)
+    record = to_record(video)
+    with VideoEnricher(client, cache) as enricher:
+        enricher.enrich([record])
+    cache.close()
+    assert enricher.fetched == 1
+    assert record.tname == video['tname']
+
+
+def test_failed_fetch_keeps_list_data(server, client, cache):
+    record = VideoRecord(bvid='BVnotlisted', view=1000, like=300, like_rate=0.3)
+    with VideoEnricher(client, cache) as enricher:
+        kept = enricher.enrich([record], keep=is_high_quality)
+    assert kept == [record]
+    assert (record.view, record.tid, record.tags) == (1000, None, None)
+    assert enricher.failed == 1
+    assert cache.get_many(['BVnotlisted']) == {}
+
+
+def test_refilter_drops_rows_failing_on_fresh_stats(server, client, cache):
+    videos = listed_videos(server)
+    low = next(video for video in videos if video['stat']['like'] / video['stat']['view'] < 0.05)
+    high = next(video for video in videos if video['stat']['like'] / video['stat']['view'] > 0.2)
+    stale = to_record(low)
+    stale.like = stale.view // 2  # 列表页的数据看起来是高质量视频
+    with VideoEnricher(client, cache) as enricher:
+        kept = enricher.enrich([stale, to_record(high)], keep=is_high_quality)
+    assert [record.bvid for record in kept] == [high['bvid']]
+    assert enricher.dropped == 1
+
+
+def test_cached_rows_are_not_refiltered_on_old_stats(server, client, cache):
+    video = listed_videos(server)[0]
+    cache.put_many({video['bvid']: {'tid': 1, 'tname': '知识', 'stat': {'view': 10**9, 'like': 0}}})
+    record = to_record(video)
+    with VideoEnricher(client, cache) as enricher:
+        kept = enricher.enrich([record], keep=lambda record: record.like > 0)
+    assert kept == [record]
+    assert record.view == video['stat']['view']
+
+
+def test_concurrency_is_bounded(server, client, cache):
+    videos = listed_videos(server, 1) + listed_videos(server, 2)
+    counting = CountingClient(client)
+    with VideoEnricher(counting, cache, concurrency=3) as enricher:
+        enricher.enrich([to_record(video) for video in videos])
+    assert counting.requests == 2 * len(videos)
+    assert 1 < counting.peak <= 3
@@ -0,0 +1,95 @@
+"""多身份调度：用本地模拟服务器充当各身份的出口代理"""
+
+import time
+
+import pytest
+
+import bili_client
+from bili_client import BilibiliClient
+from config import POPULAR_API
+from identity_pool import Identity, IdentityScheduler
+from mock_server import MockBilibiliServer
+from rate_limiter import HostRateLimiter
+
+API_URL = 'http://api.bilibili.test'  # 不会被解析：请求经代理发出，代理（模拟服务器）按路径应答
+
+
+@pytest.fixture
+def proxies():
+    """启动模拟服务器作为出口代理，参数为每个代理返回 -352 的概率"""
+    servers = []
+
+    def start(*risk_rates):
+        for risk_rate in risk_rates:
+            servers.append(MockBilibiliServer(risk_rate=risk_rate).start())
+        return servers
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def make_identity(name, server, rate_limiter=None):
+    client = BilibiliClient(rate_limiter, pool_size=2, proxy=server.url, max_retries=0,
+                            base_url=API_URL, homepage_url=API_URL + '/')
+    return Identity(name, client)
+
+
+def test_requests_rotate_across_identities(proxies):
+    servers = proxies(0.0, 0.0)
+    scheduler = IdentityScheduler([make_identity(f"proxy-{index}", server, HostRateLimiter(rate=50, burst=1))
+                                   for index, server in enumerate(servers)])
+    for page in range(1, 11):
+        status_code, data = scheduler.get_json(POPULAR_API, {'pn': page})
+        assert status_code == 200 and data['code'] == 0
+    counts = [server.requests for server in servers]
+    assert sum(counts) == 10
+    assert min(counts) >= 3  # 有令牌的身份优先，两个出口交替承担请求
+    metrics = scheduler.rate_metrics()
+    assert sum(m['successes'] for m in metrics.values()) == 10
+
+
+def test_quarantine_doubles_while_identity_keeps_failing(proxies):
+    risky, healthy = proxies(1.0, 0.0)
+    bad, good = make_identity('bad', risky), make_identity('good', healthy)
+    scheduler = IdentityScheduler([bad, good], quarantine_seconds=0.2, quarantine_max=10)
+
+    durations = []
+    for _ in range(3):
+        status_code, data = scheduler.get_json(POPULAR_API, {'pn': 1})
+        assert data['code'] == 0  # 被限流后换到健康的身份
+        durations.append(bad.quarantined_until - time.monotonic())
+        time.sleep(durations[-1] + 0.02)
+
+    assert bad.throttles == 3 and bad.consecutive == 3
+    assert good.successes == 3 and good.consecutive == 0
+    assert durations[0] == pytest.approx(0.2, abs=0.05)
+    assert durations[1] == pytest.approx(0.4, abs=0.05)
+    assert durations[2] == pytest.approx(0.8, abs=0.05)
+
+
+def test_all_identities_quarantined_waits_for_earliest(proxies):
+    servers = proxies(1.0, 1.0)
+    identities = [make_identity('a', servers[0]), make_identity('b', servers[1])]
+    scheduler = IdentityScheduler(identities, quarantine_seconds=0.3)
+
+    status_code, data = scheduler.get_json(POPULAR_API, {'pn': 1})
+    assert data['code'] == -352
+    # 每个身份在一次请求中只尝试一次（模拟服务器只统计 API 请求，不含 cookie 预热）
+    assert [server.requests for server in servers] == [1, 1]
+    assert all(not identity.is_healthy(time.monotonic()) for identity in identities)
+
+    start = time.monotonic()
+    scheduler.get_json(POPULAR_API, {'pn': 1})
+    assert time.monotonic() - start >= 0.25
+    assert [identity.throttles for identity in identities] == [2, 2]
+
+
+def test_duplicate_identity_names_are_rejected(proxies, monkeypatch):
+    server, = proxies(0.0)
+    with pytest.raises(ValueError):
+        IdentityScheduler([make_identity('same', server), make_identity('same', server)])
+    # 没有 name 时用 proxy 作名称，两个相同的代理同样被拒绝
+    monkeypatch.setattr(bili_client, 'create_rate_limiter', lambda **kwargs: None)
+    with pytest.raises(ValueError):
+        bili_client.create_client(identities=[{'proxy': server.url}, {'proxy': server.url}])
@@ -0,0 +1,63 @@
+"""逐条筛选与向量化筛选（--batch-filter）的结果必须相同"""
+
+import random
+
+import pytest
+
+import bilibili_crawler
+import popular_crawler
+from mock_server import make_video
+
+
+def sample_videos():
+    """模拟服务器的视频，加上播放数为0、点赞率恰好等于阈值等边界情况"""
+    rng = random.Random(9)
+    videos = [make_video(rng, 1, index) for index in range(400)]
+    edges = [(0, 0), (0, 5), (1000, 100), (1000, 101), (1000, 99), (3, 1)]
+    for index, (view, like) in enumerate(edges):
+        video = make_video(rng, 2, index)
+        video['stat'].update(view=view, like=like)
+        videos.append(video)
+    return videos
+
+
+@pytest.fixture(params=[None, 0.09, 0.12], ids=['no-score', 'score-0.09', 'score-0.12'])
+def min_score(request, monkeypatch):
+    monkeypatch.setattr(popular_crawler, 'MIN_QUALITY_SCORE', request.param)
+    monkeypatch.setattr(bilibili_crawler, 'MIN_QUALITY_SCORE', request.param)
+    return request.param
+
+
+def test_popular_paths_match(min_score, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    videos = sample_videos()
+    crawler = popular_crawler.BilibiliPopularCrawler(client=object())
+    scalar = [row for row in map(crawler.process_video_data, videos) if row is not None]
+    batch = crawler.process_page_batch(videos)
+    assert [row.to_dict() for row in scalar] == [row.to_dict() for row in batch]
+    assert scalar
+
+
+def test_ranking_paths_match(min_score):
+    videos = sample_videos()
+    scalar = bilibili_crawler.parse_ranking_videos(videos, '测试', len(videos))
+    batch = bilibili_crawler.parse_ranking_videos_batch(videos, '测试', len(videos))
+    assert [row.to_dict() for row in scalar] == [row.to_dict() for row in batch]
+    assert scalar
+
+
+def test_min_score_filters_scalar_path(monkeypatch):
+    videos = sample_videos()
+    everything = bilibili_crawler.parse_ranking_videos(videos, '测试', len(videos))
+    monkeypatch.setattr(bilibili_crawler, 'MIN_QUALITY_SCORE', 0.12)
+    scored = bilibili_crawler.parse_ranking_videos(videos, '测试', len(videos))
+    assert 0 < len(scored) < len(everything)
+
+
+def test_threshold_edges(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    videos = sample_videos()
+    popular = {row.bvid for row in popular_crawler.BilibiliPopularCrawler(client=object()).process_page_batch(videos)}
+    ranking = {row.bvid for row in bilibili_crawler.parse_ranking_videos(videos, '测试', len(videos))}
+    exact = videos[-4]['bvid']  # 点赞率恰好为 0.1
+    assert exact in popular and exact not in ranking
@@ -0,0 +1,45 @@
+"""分类排行榜写入时序库：每个分类一个事务，出错时关闭连接并保留已提交的分类"""
+
+import sqlite3
+import time
+
+import pytest
+
+import bilibili_crawler
+from storage import SQLiteStatsStore
+from video_record import VideoRecord
+
+CATEGORIES = [{'name': '知识', 'tid': 36}, {'name': '科技', 'tid': 188}]
+
+
+class TrackedStore(SQLiteStatsStore):
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instances.append(self)
+
+
+def fake_ranking(tid, name, *args):
+    if name == '科技':
+        time.sleep(0.2)  # 让“知识”先写入并提交
+        raise RuntimeError("boom")
+    return [VideoRecord(bvid=f"BV{tid}x{i}", title=f"{name}{i}", view=1000, like=300, like_rate=0.3)
+            for i in range(3)]
+
+
+def test_error_closes_store_and_keeps_committed_categories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bilibili_crawler, 'CATEGORIES', CATEGORIES)
+    monkeypatch.setattr(bilibili_crawler, 'get_bilibili_ranking_data', fake_ranking)
+    monkeypatch.setattr(bilibili_crawler, 'SQLiteStatsStore', TrackedStore)
+    TrackedStore.instances.clear()
+
+    with pytest.raises(RuntimeError):
+        bilibili_crawler.main(output_format='sqlite')
+
+    store, = TrackedStore.instances
+    assert store._conn is None
+    with sqlite3.connect(store.filepath) as conn:
+        sources = conn.execute("SELECT source, COUNT(*) FROM stats_snapshots GROUP BY source").fetchall()
+    assert sources == [('知识', 3)]
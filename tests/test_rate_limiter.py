@@ -0,0 +1,51 @@
+"""自适应限速：并发调整速率时不丢失更新"""
+
+import threading
+import time
+
+from rate_limiter import AdaptiveRateController, TokenBucket
+
+URL = 'http://api.bilibili.test/x/web-interface/popular'
+
+
+class SlowBucket(TokenBucket):
+    """写回速率前稍作停顿，放大读取与写回之间的竞争窗口"""
+
+    def set_rate(self, rate):
+        time.sleep(0.001)
+        super().set_rate(rate)
+
+
+def make_controller(**kwargs):
+    controller = AdaptiveRateController(**kwargs)
+    controller._buckets['api.bilibili.test'] = SlowBucket(controller.rate, controller.burst)
+    return controller
+
+
+def run_concurrently(func, threads=8, calls=20):
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        for _ in range(calls):
+            func()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * calls
+
+
+def test_concurrent_successes_are_all_applied():
+    controller = make_controller(rate=1, max_rate=10_000, increase=0.5)
+    calls = run_concurrently(lambda: controller.on_success(URL))
+    assert controller.bucket_for(URL).rate == 1 + calls * 0.5
+    assert controller.metrics()['api.bilibili.test']['successes'] == calls
+
+
+def test_concurrent_throttles_are_all_applied():
+    controller = make_controller(rate=2 ** 20, min_rate=0, decrease_factor=0.5, backoff_base=0)
+    run_concurrently(lambda: controller.on_throttle(URL, 'code -352'), threads=4, calls=5)
+    assert controller.bucket_for(URL).rate == 1.0
@@ -0,0 +1,59 @@
+"""分区深度翻页（--deep）：失败页重试、出错时保留已筛选的数据"""
+
+import pytest
+
+import bilibili_crawler
+from bili_client import BilibiliClient
+from mock_server import MockBilibiliServer
+
+
+def make_client(server):
+    return BilibiliClient(pool_size=4, max_retries=0, base_url=server.url, homepage_url=server.url + '/')
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(bilibili_crawler, 'DEEP_RETRY_DELAY', 0)
+
+
+def test_reaches_target_with_transient_errors():
+    with MockBilibiliServer(error_rate=0.3, seed=3, region_videos=1000) as server:
+        rows = bilibili_crawler.get_region_videos(36, '知识', 300, make_client(server))
+    assert len(rows) == 300
+    assert len({row.bvid for row in rows}) == 300
+    assert server.errors > 0
+
+
+def test_gives_up_on_feed_after_bounded_retries(monkeypatch):
+    monkeypatch.setattr(bilibili_crawler, 'DEEP_PAGE_RETRIES', 2)
+    with MockBilibiliServer(error_rate=1.0) as server:
+        rows = bilibili_crawler.get_region_videos(36, '知识', 300, make_client(server))
+        requests = server.requests
+    assert rows is None
+    assert requests == 2 * 3  # 两个列表的第一页各请求 1 + 2 次
+
+
+def test_stops_at_end_of_feeds():
+    with MockBilibiliServer(region_videos=200) as server:
+        rows = bilibili_crawler.get_region_videos(36, '知识', 10_000, make_client(server))
+    # 最新投稿列表包含分区的全部视频，大约三分之二高于阈值
+    assert 100 < len(rows) < 200
+
+
+class FailingEnricher:
+    """第二次补充时抛出异常"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def enrich(self, records, keep=None):
+        self.calls += 1
+        if self.calls > 1:
+            raise RuntimeError("boom")
+        return records
+
+
+def test_error_keeps_rows_collected_so_far():
+    with MockBilibiliServer(region_videos=1000) as server:
+        rows = bilibili_crawler.get_region_videos(36, '知识', 300, make_client(server), enricher=FailingEnricher())
+    assert rows and len(rows) < 300
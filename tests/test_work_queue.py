@@ -0,0 +1,44 @@
+"""共享令牌桶：多个进程加起来不超过同一份速率"""
+
+import multiprocessing
+import time
+
+import pytest
+
+from work_queue import SharedTokenBucket
+
+
+def take_tokens(db_path, count, times):
+    bucket = SharedTokenBucket('job|api.bilibili.test', 20, 1, db_path)
+    for _ in range(count):
+        bucket.acquire()
+        times.append(time.time())
+    bucket.close()
+
+
+def test_processes_share_one_rate(tmp_path):
+    db_path = str(tmp_path / 'queue.sqlite3')
+    with multiprocessing.Manager() as manager:
+        times = manager.list()
+        workers = [multiprocessing.Process(target=take_tokens, args=(db_path, 10, times)) for _ in range(4)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        times = sorted(times)
+    assert len(times) == 40
+    # 4 个进程共 40 个令牌，20 个/秒、容量 1：约 2 秒；各自限速时只需约 0.5 秒
+    assert times[-1] - times[0] >= 39 / 20 * 0.9
+
+
+def test_rate_change_is_shared(tmp_path):
+    db_path = str(tmp_path / 'queue.sqlite3')
+    first = SharedTokenBucket('job|host', 5, 1, db_path)
+    second = SharedTokenBucket('job|host', 5, 1, db_path)
+    other = SharedTokenBucket('other|host', 5, 1, db_path)
+    first.set_rate(2.5)
+    assert second.rate == 2.5 and other.rate == 5
+    assert first.try_acquire() == 0
+    assert second.try_acquire() == pytest.approx(0.4, abs=0.05)
+    for bucket in (first, second, other):
+        bucket.close()
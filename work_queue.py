@@ -0,0 +1,388 @@
+"""
+持久化工作队列
+
+功能：
+1. 协调者把一次任务拆成工作单元（分类 tid、热门页码区间）写入 SQLite 队列
+2. 多个工作进程并发领取单元：领取时加租约，处理中续租；进程崩溃后租约过期，单元自动回到队列
+3. 工作进程把筛选后的数据行写回队列，由合并进程统一生成最终输出
+4. 多进程共用同一个数据库文件，所有状态变更都在 BEGIN IMMEDIATE 事务中完成
+5. 共享令牌桶（SharedTokenBucket）：同一任务的所有工作进程从数据库中的同一行取令牌，
+   N 个进程加起来仍不超过每个主机的 REQUESTS_PER_SECOND
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import WORK_QUEUE_DB, WORK_LEASE_SECONDS, WORK_MAX_ATTEMPTS
+from rate_limiter import TokenBucket
+
+WORK_QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job         TEXT PRIMARY KEY,
+    params      TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS work_units (
+    id          INTEGER PRIMARY KEY,
+    job         TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    seq         INTEGER NOT NULL,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    rows        INTEGER,
+    error       TEXT,
+    updated_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_units_job_status ON work_units (job, status, seq);
+CREATE TABLE IF NOT EXISTS work_results (
+    unit_id     INTEGER NOT NULL REFERENCES work_units(id),
+    seq         INTEGER NOT NULL,
+    row         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_unit ON work_results (unit_id, seq);
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    name        TEXT PRIMARY KEY,
+    rate        REAL NOT NULL,
+    capacity    REAL NOT NULL,
+    tokens      REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+"""
+
+# 单元状态：pending 待领取 / leased 处理中 / done 完成 / failed 重试次数用完 / skipped 不再需要
+ACTIVE_STATUSES = ('pending', 'leased')
+
+
+class WorkQueue:
+    """基于 SQLite 的工作队列，多个进程可同时打开同一个文件"""
+
+    def __init__(self, db_path=WORK_QUEUE_DB, lease_seconds=WORK_LEASE_SECONDS,
+                 max_attempts=WORK_MAX_ATTEMPTS):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            lease_seconds: 租约时长（秒），超时未续租的单元会被其他进程重新领取
+            max_attempts: 每个单元最多尝试的次数，用完后标记为 failed
+        """
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # isolation_level=None：事务由 BEGIN IMMEDIATE 显式控制，写锁在事务开始时就拿到
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(WORK_QUEUE_SCHEMA)
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._conn)
+
+    def create_job(self, job, params):
+        """
+        创建任务；同名任务已存在时报错
+
+        Args:
+            job: 任务名
+            params: 任务参数（如目标数量、输出格式），合并时使用
+        """
+        with self._transaction():
+            exists = self._conn.execute("SELECT 1 FROM jobs WHERE job = ?", (job,)).fetchone()
+            if exists:
+                raise ValueError(f"任务 {job} 已存在")
+            self._conn.execute("INSERT INTO jobs (job, params, created_at) VALUES (?, ?, ?)",
+                               (job, json.dumps(params, ensure_ascii=False), time.time()))
+
+    def job_params(self, job):
+        """任务参数，任务不存在时返回 None"""
+        row = self._conn.execute("SELECT params FROM jobs WHERE job = ?", (job,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def enqueue(self, job, kind, payloads):
+        """
+        批量加入工作单元
+
+        Args:
+            job: 任务名
+            kind: 单元类型，'ranking' 或 'popular'
+            payloads: 单元参数列表，按顺序编号（合并时按此顺序输出）
+
+        Returns:
+            int: 加入的单元数
+        """
+        now = time.time()
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT INTO work_units (job, kind, seq, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(job, kind, seq, json.dumps(payload, ensure_ascii=False), now)
+                 for seq, payload in enumerate(payloads)],
+            )
+        return len(payloads)
+
+    def claim(self, job, worker):
+        """
+        领取一个待处理的单元（包括租约已过期的单元）
+
+        Returns:
+            dict: {'id', 'kind', 'seq', 'payload', 'attempts'}，没有可领取的单元时返回 None
+        """
+        now = time.time()
+        with self._transaction():
+            # 租约过期且重试次数已用完的单元不再领取
+            self._conn.execute(
+                "UPDATE work_units SET status = 'failed', error = '租约过期', updated_at = ?"
+                " WHERE job = ? AND status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, job, now, self.max_attempts),
+            )
+            row = self._conn.execute(
+                "SELECT id, kind, seq, payload, attempts FROM work_units"
+                " WHERE job = ? AND (status = 'pending' OR (status = 'leased' AND lease_until < ?))"
+                " ORDER BY seq LIMIT 1",
+                (job, now),
+            ).fetchone()
+            if row is None:
+                return None
+            unit_id, kind, seq, payload, attempts = row
+            self._conn.execute(
+                "UPDATE work_units SET status = 'leased', worker = ?, lease_until = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker, now + self.lease_seconds, now, unit_id),
+            )
+        return {'id': unit_id, 'kind': kind, 'seq': seq, 'payload': json.loads(payload),
+                'attempts': attempts + 1}
+
+    def renew(self, unit_id, worker):
+        """
+        续租，长时间处理的单元每处理一步调用一次
+
+        Returns:
+            bool: 租约仍属于该进程时返回 True
+        """
+        now = time.time()
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE work_units SET lease_until = ?, updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, unit_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, unit_id, worker, rows):
+        """
+        提交单元结果
+
+        Args:
+            unit_id: 单元编号
+            worker: 工作进程名，租约已被其他进程接手时结果会被丢弃
+            rows: 数据行（dict 列表）
+
+        Returns:
+            bool: 是否提交成功
+        """
+        now = time.time()
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE work_units SET status = 'done', rows = ?, lease_until = NULL, updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = 'leased'",
+                (len(rows), now, unit_id, worker),
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._conn.executemany(
+                "INSERT INTO work_results (unit_id, seq, row) VALUES (?, ?, ?)",
+                [(unit_id, seq, json.dumps(row, ensure_ascii=False)) for seq, row in enumerate(rows)],
+            )
+        return True
+
+    def fail(self, unit_id, worker, error):
+        """
+        记录单元处理失败：还有重试次数时放回队列，否则标记为 failed
+
+        Returns:
+            str: 单元的新状态；租约已被其他进程接手时返回 None
+        """
+        now = time.time()
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT attempts FROM work_units WHERE id = ? AND worker = ? AND status = 'leased'",
+                (unit_id, worker),
+            ).fetchone()
+            if row is None:
+                return None
+            status = 'failed' if row[0] >= self.max_attempts else 'pending'
+            self._conn.execute(
+                "UPDATE work_units SET status = ?, error = ?, lease_until = NULL, updated_at = ?"
+                " WHERE id = ?",
+                (status, str(error), now, unit_id),
+            )
+        return status
+
+    def skip_after(self, job, kind, seq):
+        """
+        把某类单元中编号大于 seq 的待处理单元标记为 skipped（如热门页面已经到底）
+
+        Returns:
+            int: 被跳过的单元数
+        """
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE work_units SET status = 'skipped', updated_at = ?"
+                " WHERE job = ? AND kind = ? AND seq > ? AND status = 'pending'",
+                (time.time(), job, kind, seq),
+            )
+        return cursor.rowcount
+
+    def progress(self, job):
+        """
+        Returns:
+            dict: {状态: 单元数}
+        """
+        rows = self._conn.execute(
+            "SELECT status, COUNT(*) FROM work_units WHERE job = ? GROUP BY status", (job,)
+        ).fetchall()
+        return dict(rows)
+
+    def is_finished(self, job):
+        """所有单元都已完成、失败或跳过"""
+        progress = self.progress(job)
+        return not any(progress.get(status) for status in ACTIVE_STATUSES)
+
+    def iter_results(self, job, kind):
+        """
+        按单元顺序读取已完成单元的结果
+
+        Yields:
+            tuple: (单元参数, 数据行列表)
+        """
+        units = self._conn.execute(
+            "SELECT id, payload FROM work_units WHERE job = ? AND kind = ? AND status = 'done' ORDER BY seq",
+            (job, kind),
+        ).fetchall()
+        for unit_id, payload in units:
+            rows = [json.loads(row) for (row,) in self._conn.execute(
+                "SELECT row FROM work_results WHERE unit_id = ? ORDER BY seq", (unit_id,))]
+            yield json.loads(payload), rows
+
+    def failed_units(self, job):
+        """重试次数用完的单元：[(类型, 参数, 错误)]"""
+        rows = self._conn.execute(
+            "SELECT kind, payload, error FROM work_units WHERE job = ? AND status = 'failed' ORDER BY kind, seq",
+            (job,),
+        ).fetchall()
+        return [(kind, json.loads(payload), error) for kind, payload, error in rows]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    多个进程共享的令牌桶
+
+    桶的状态（速率、令牌数、上次补充时间）保存在工作队列数据库的一行中，
+    每次取令牌或修改速率都在 BEGIN IMMEDIATE 事务中读出、补充、写回，
+    因此同一个桶名下所有进程的请求加起来不超过 rate。
+    时间用 time.time()：多台机器共享数据目录时需要时钟大致同步，时钟回拨时不补充令牌。
+    """
+
+    def __init__(self, name, rate, burst, db_path=WORK_QUEUE_DB):
+        """
+        Args:
+            name: 桶名，如 '任务名|主机'，同名的桶共享令牌
+            rate: 每秒补充的令牌数（桶已存在时沿用数据库中的速率）
+            burst: 桶容量
+            db_path: 工作队列数据库路径
+        """
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于0: {rate}")
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.name = name
+        self._lock = threading.Lock()  # 同一进程的多个线程共用一个连接
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(WORK_QUEUE_SCHEMA)
+        capacity = max(1.0, float(burst))
+        with self._lock, _ImmediateTransaction(self._conn):
+            self._conn.execute(
+                "INSERT OR IGNORE INTO rate_buckets (name, rate, capacity, tokens, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (name, float(rate), capacity, capacity, time.time()),
+            )
+
+    def _update(self, take=0, rate=None):
+        """
+        在一个事务中补充令牌，可选地取走 take 个令牌或修改速率
+
+        Returns:
+            tuple: (当前速率, 还需等待的秒数)；令牌不足时不取走，返回等待时间
+        """
+        with self._lock, _ImmediateTransaction(self._conn):
+            current_rate, capacity, tokens, updated_at = self._conn.execute(
+                "SELECT rate, capacity, tokens, updated_at FROM rate_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            tokens = min(capacity, tokens + max(0.0, now - updated_at) * current_rate)
+            wait = 0.0
+            if take:
+                if tokens >= take:
+                    tokens -= take
+                else:
+                    wait = (take - tokens) / current_rate
+            if rate is not None:
+                current_rate = float(rate)
+            self._conn.execute(
+                "UPDATE rate_buckets SET rate = ?, tokens = ?, updated_at = ? WHERE name = ?",
+                (current_rate, tokens, now, self.name),
+            )
+        return current_rate, wait
+
+    @property
+    def rate(self):
+        with self._lock:
+            return self._conn.execute("SELECT rate FROM rate_buckets WHERE name = ?", (self.name,)).fetchone()[0]
+
+    def set_rate(self, rate):
+        """修改所有进程共用的速率，已积累的令牌按旧速率结算"""
+        self._update(rate=rate)
+
+    def wait_time(self, tokens=1):
+        """获取令牌还需等待的秒数，不消耗令牌"""
+        with self._lock:
+            rate, capacity, available, updated_at = self._conn.execute(
+                "SELECT rate, capacity, tokens, updated_at FROM rate_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+        available = min(capacity, available + max(0.0, time.time() - updated_at) * rate)
+        return max(0.0, (tokens - available) / rate)
+
+    def try_acquire(self, tokens=1):
+        """
+        尝试立即获取令牌
+
+        Returns:
+            float: 0 表示获取成功，否则为还需等待的秒数
+        """
+        return self._update(take=tokens)[1]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT，出错时回滚"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("COMMIT" if exc_type is None else "ROLLBACK")